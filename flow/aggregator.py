@@ -10,8 +10,12 @@ from flow import pluginloader
 import flow.utils.commons as commons
 from flow.buildconfig import BuildConfig
 from flow.cloud.cloudfoundry.cloudfoundry import CloudFoundry
+from flow.cloud.cloudfoundry.fan_out import CloudFoundryFanOut
+from flow.cloud.cloudfoundryv3.cloudfoundryv3 import CloudFoundryV3
 from flow.cloud.gcappengine.gcappengine import GCAppEngine
 from flow.coderepo.github.github import GitHub
+from flow.coderepo.github.github_rate_limit import GitHubRateLimiter
+from flow.coderepo.githubgraphql.githubgraphql import GitHubGraphQL
 from flow.communications.slack.slack import Slack
 from flow.metrics.graphite.graphite import Graphite
 from flow.projecttracking.tracker.tracker import Tracker
@@ -83,6 +87,7 @@ def main():
 
     # TODO check if there are any registered metrics endpoints defined in settings.ini. This is optional.
     metrics = Graphite()
+    GitHubRateLimiter.metrics = metrics
 
     commons.print_msg(clazz, method, "Task {}".format(task))
 
@@ -93,7 +98,7 @@ def main():
         tasks_requiring_github.append('jira')
 
     if task != 'github' and task in tasks_requiring_github:
-        github = GitHub()
+        github = create_github()
         if 'version' in args and args.version is not None and len(args.version.strip()) > 0 and args.version.strip(
                                                                                                 ).lower() != 'latest':
             # The only time a user should be targeting a snapshot environment and specifying a version
@@ -122,7 +127,7 @@ def main():
             BuildConfig.version_number = github.get_git_last_tag()
 
     if task == 'github':
-        github = GitHub()
+        github = create_github()
         if args.action == 'version':
             if BuildConfig.project_tracker == 'tracker':
                 _tracker = Tracker()
@@ -207,7 +212,7 @@ def main():
                                                  'major}.{minor}.{bug}+{buildnumber} ', 'ERROR')
                 exit(1)
 
-        cf = CloudFoundry()
+        cf = create_cloudfoundry()
 
         is_script_run_successful = True
 
@@ -303,7 +308,7 @@ def main():
         metrics.write_metric(task, args.action)
 
     elif task == 'zipit':
-        ZipIt('artifactory', args.zipfile, args.contents)
+        ZipIt('artifactory', args.zipfile, args.contents, args.compression)
 
     else:
         for i in plugins:
@@ -416,6 +421,9 @@ def load_task_parsers(subparsers):
     zipship_parser.add_argument('-v', '--version', help='(optional) If manually versioning, this is passed in by the '
                                                         'user.  Note: versionStrategy in buildConfig should be set to '
                                                         '"manual"')
+    zipship_parser.add_argument('-x', '--compression', help='(optional) Compression of the zipfile: none, gz, xz, zst '
+                                                            '(needs the zstandard package) or auto to pick it from '
+                                                            'the zipfile name.  Default from settings.ini.')
 
     gc_appengine_parser = subparsers.add_parser('gcappengine', help='Deployment to Google Cloud App Engine',
                                                 formatter_class=RawTextHelpFormatter)
@@ -451,6 +459,30 @@ def connect_error_dispatcher():
                                          'log.', 'WARN')
 
 
+def create_github(config=BuildConfig):
+    # "apiType": "graphql" in the github section of buildConfig.json reads tags and history through graphql
+    github_config = config.json_config.get('github', {}) if config.json_config is not None else {}
+
+    if str(github_config.get('apiType', 'rest')).lower() == 'graphql':
+        return GitHubGraphQL()
+
+    return GitHub()
+
+
+def create_cloudfoundry(config=BuildConfig):
+    # "driver": "api" in the cf section of an environment changes app and route state through the cloud controller
+    # v3 api instead of the cf cli.  "targets" deploys to every target listed, each with that driver.
+    cf_config = config.build_env_info.get('cf') if config.build_env_info is not None else None
+
+    if cf_config and 'targets' in cf_config:
+        return CloudFoundryFanOut(create_driver=lambda: create_cloudfoundry(config))
+
+    if cf_config and str(cf_config.get('driver', 'cli')).lower() == 'api':
+        return CloudFoundryV3()
+
+    return CloudFoundry()
+
+
 def get_git_commit_history(git_hub_instance, args):
     if 'version' in args and args.version is not None and len(args.version.strip()) > 0 and args.version.strip(
                                                                                             ).lower() != 'latest':
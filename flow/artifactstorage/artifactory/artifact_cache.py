@@ -0,0 +1,187 @@
+#!/usr/bin/python
+# artifact_cache.py
+
+import contextlib
+import fcntl
+import os
+import shutil
+import tempfile
+
+import flow.utils.commons as commons
+
+
+class ArtifactCache:
+    """
+    On disk cache of artifacts shared by every flow run on the agent, so a deploy does not download what the
+    build on the same agent just published.
+
+    Entries are content addressed: an artifact is stored under repo/group/project/version/sha1/file name, so a
+    republished version with different content never matches a stale copy.  Each entry is filled while holding
+    an exclusive lock on it, which makes concurrent jobs wait for the one download in progress instead of all
+    fetching the same artifact.  The cache is kept under max_size bytes by evicting the least recently used
+    entries; a hit refreshes the entry's modification time.  Eviction also removes an entry's lock file and the
+    directories it leaves empty, and skips entries a job is still holding the lock on.
+    """
+    clazz = 'ArtifactCache'
+    lock_file = '.lock'
+
+    def __init__(self, cache_dir, max_size):
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.max_size = max_size
+
+    def _entry_dir(self, coordinates, sha1):
+        return os.path.join(self.cache_dir, *[str(part).replace('/', '_') for part in coordinates], sha1)
+
+    @contextlib.contextmanager
+    def _flock(self, path, mode):
+        while True:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            try:
+                lock = open(path, 'a')
+            except FileNotFoundError:
+                # eviction removed the directory after it was made
+                continue
+
+            with lock:
+                try:
+                    fcntl.flock(lock, mode)
+
+                    if not ArtifactCache._is_current(lock, path):
+                        # eviction removed the lock file while this waited on it, lock the new one instead
+                        continue
+
+                    yield
+                    return
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _is_current(lock, path):
+        try:
+            current = os.stat(path)
+        except FileNotFoundError:
+            return False
+
+        locked = os.fstat(lock.fileno())
+        return (current.st_dev, current.st_ino) == (locked.st_dev, locked.st_ino)
+
+    @contextlib.contextmanager
+    def locked(self, coordinates, sha1):
+        # exclusive while one job looks up and fills the entry; concurrent jobs wait here and then hit the cache
+        with self._flock(self._entry_dir(coordinates, sha1) + ArtifactCache.lock_file, fcntl.LOCK_EX):
+            yield
+
+    def get(self, coordinates, sha1, file_name, destination):
+        # Places the cached artifact at destination.  Returns False when it isn't cached.
+        method = 'get'
+
+        cached_file = os.path.join(self._entry_dir(coordinates, sha1), file_name)
+
+        # eviction takes this lock exclusively, so the entry can't disappear while it is being copied
+        with self._flock(os.path.join(self.cache_dir, ArtifactCache.lock_file), fcntl.LOCK_SH):
+            if not os.path.isfile(cached_file):
+                return False
+
+            os.utime(os.path.dirname(cached_file))
+
+            if os.path.exists(destination):
+                os.remove(destination)
+
+            try:
+                os.link(cached_file, destination)
+            except OSError:
+                # the destination is on another file system
+                shutil.copyfile(cached_file, destination)
+
+        commons.print_msg(ArtifactCache.clazz, method, "Found {file} in the artifact cache".format(file=file_name))
+        return True
+
+    def put(self, coordinates, sha1, file_name, source):
+        method = 'put'
+
+        entry_dir = self._entry_dir(coordinates, sha1)
+        cached_file = os.path.join(entry_dir, file_name)
+
+        if os.path.getsize(source) > self.max_size:
+            commons.print_msg(ArtifactCache.clazz, method, "{file} is larger than the artifact cache, not caching "
+                                                           "it".format(file=file_name))
+            return
+
+        with self._flock(os.path.join(self.cache_dir, ArtifactCache.lock_file), fcntl.LOCK_SH):
+            if not os.path.isfile(cached_file):
+                os.makedirs(entry_dir, exist_ok=True)
+
+                # copy to a temp file and rename so that a half written artifact is never found in the cache
+                handle, temp_file = tempfile.mkstemp(dir=entry_dir, suffix='.tmp')
+                os.close(handle)
+                try:
+                    shutil.copyfile(source, temp_file)
+                    os.replace(temp_file, cached_file)
+                finally:
+                    if os.path.exists(temp_file):
+                        os.remove(temp_file)
+
+            os.utime(entry_dir)
+
+        commons.print_msg(ArtifactCache.clazz, method, "Cached {file} as {sha1}".format(file=file_name, sha1=sha1))
+        self.evict()
+
+    def _entries(self):
+        # (last used, size, path) of every entry, entries being the directories holding the cached files
+        entries = []
+
+        for directory, _, files in os.walk(self.cache_dir):
+            cached_files = [name for name in files if not name.endswith(ArtifactCache.lock_file) and
+                            not name.endswith('.tmp')]
+            if len(cached_files) > 0:
+                size = sum(os.path.getsize(os.path.join(directory, name)) for name in cached_files)
+                entries.append((os.path.getmtime(directory), size, directory))
+
+        return entries
+
+    def _remove_entry(self, directory):
+        # Removes the entry, its lock file and the directories that leaves empty.  Returns False, leaving the entry
+        # in place, when a job holds the entry's lock.
+        lock_path = directory + ArtifactCache.lock_file
+
+        with open(lock_path, 'a') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+
+            try:
+                shutil.rmtree(directory, ignore_errors=True)
+                os.remove(lock_path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+        parent = os.path.dirname(directory)
+        while parent != self.cache_dir and parent.startswith(self.cache_dir + os.sep):
+            try:
+                os.rmdir(parent)
+            except OSError:
+                # not empty
+                break
+            parent = os.path.dirname(parent)
+
+        return True
+
+    def evict(self):
+        method = 'evict'
+
+        # nothing is put or read while this holds the cache lock exclusively
+        with self._flock(os.path.join(self.cache_dir, ArtifactCache.lock_file), fcntl.LOCK_EX):
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+
+            for _, size, directory in entries:
+                if total <= self.max_size:
+                    break
+
+                commons.print_msg(ArtifactCache.clazz, method, "Evicting {} from the artifact cache".format(directory))
+                if self._remove_entry(directory):
+                    total -= size
+                else:
+                    commons.print_msg(ArtifactCache.clazz, method, "{} is in use, not evicting it".format(directory))
@@ -1,17 +1,28 @@
 #!/usr/bin/python
 # artifactory.py
 
+import hashlib
 import json
+import mmap
 import os
 import os.path
 import tarfile
+import tempfile
+import threading
+import time
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
 
 import requests
+import urllib3
 from flow.artifactstorage.artifact_storage_abc import Artifact_Storage
+from flow.artifactstorage.artifactory.artifact_cache import ArtifactCache
 from flow.buildconfig import BuildConfig
+from flow.utils.versions import parse_version
 
 import flow.utils.commons as commons
+import flow.utils.transport as transport
 
 
 class ArtifactDownloadException(Exception):
@@ -22,6 +33,95 @@ class ArtifactException(Exception):
     pass
 
 
+class ArtifactChunks:
+    """
+    Read-only view of an open file as an iterable of fixed size chunks backed by mmap, with a length so
+    that requests sends a Content-Length instead of a chunked transfer encoding.
+    """
+    chunk_size = 8 * 1024 * 1024
+
+    def __init__(self, file, size):
+        self.size = size
+        self.mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size > 0 else None
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for offset in range(0, self.size, ArtifactChunks.chunk_size):
+            yield self.mapped[offset:offset + ArtifactChunks.chunk_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        if self.mapped is not None:
+            self.mapped.close()
+
+
+class ArtifactStream:
+    """
+    Read only file object over an artifact download for consumers that read it once, front to back (tarfile in
+    stream mode).  When the connection drops the download is reopened with a Range request at the current
+    position, so a long extraction picks up where it stopped instead of starting over.
+    """
+
+    def __init__(self, url, headers, auth, timeout, retries):
+        self.url = url
+        self.headers = headers
+        self.auth = auth
+        self.timeout = timeout
+        self.retries = retries
+        self.position = 0
+        self.response = None
+
+    def _open(self):
+        headers = dict(self.headers)
+        if self.position > 0:
+            headers['Range'] = 'bytes={}-'.format(self.position)
+
+        self.response = transport.get(self.url, auth=self.auth, headers=headers, stream=True, timeout=self.timeout)
+        self.response.raise_for_status()
+
+        if self.position > 0 and self.response.status_code != 206:
+            raise ArtifactDownloadException("{} does not support range requests".format(self.url))
+
+        self.response.raw.decode_content = True
+
+    def read(self, size=-1):
+        attempt = 0
+
+        while True:
+            try:
+                if self.response is None:
+                    self._open()
+
+                data = self.response.raw.read(None if size is None or size < 0 else size)
+                self.position += len(data)
+                return data
+            except (requests.ConnectionError, requests.Timeout, urllib3.exceptions.HTTPError) as e:
+                attempt += 1
+                if attempt > self.retries:
+                    raise
+
+                commons.print_msg(Artifactory.clazz, 'read', "Download of {url} interrupted at byte {pos}, resuming. "
+                                                             "{err}".format(url=self.url, pos=self.position, err=e),
+                                  'WARN')
+                self.close()
+                time.sleep(min(2 ** attempt, 30))
+
+    def close(self):
+        if self.response is not None:
+            self.response.close()
+            self.response = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
 class Artifactory(Artifact_Storage):
     clazz = 'Artifactory'
 
@@ -34,6 +134,13 @@ class Artifactory(Artifact_Storage):
     pom_file = None
     config = BuildConfig
     http_timeout = 60
+    download_chunk_size = 1024 * 1024
+    artifact_cache = None
+    # set once an aql search fails, e.g. for a user without aql access, so later lookups go straight to storage
+    aql_unavailable = False
+    tar_extensions = ['tar.gz', 'tar', 'tgz']
+    zip_extensions = ['zip']
+    zip_spool_in_memory = 8 * 1024 * 1024
 
     def __init__(self, config_override=None):
         method = '__init__'
@@ -42,6 +149,12 @@ class Artifactory(Artifact_Storage):
         if config_override is not None:
             self.config = config_override
 
+        # storage listing of each version folder, indexed by extension
+        self.version_listings = {}
+        self.version_listings_lock = threading.Lock()
+        # sha1 of artifacts listed through aql, by url, so the artifact cache doesn't have to ask for it
+        self.artifact_checksums = {}
+
         try:
             # below line is to maintain backwards compatibility since stanza was renamed
             if 'artifactoryConfig' in self.config.json_config:
@@ -105,49 +218,140 @@ class Artifactory(Artifact_Storage):
                               'WARN')
         return headers, auth
 
+    def _use_checksum_publish(self):
+        checksum_publish = commons.get_setting(self.config.settings, 'artifactory', 'checksum_publish',
+                                               'ARTIFACTORY_CHECKSUM_PUBLISH')
+
+        return checksum_publish is not None and checksum_publish.lower() in ['yes', 'true', 'y']
+
+    def _get_artifact_cache(self):
+        method = '_get_artifact_cache'
+
+        cache_dir = commons.get_setting(self.config.settings, 'artifactory', 'cache_dir', 'ARTIFACTORY_CACHE_DIR')
+
+        if cache_dir is None:
+            return None
+
+        max_size_mb = commons.get_int_setting(self.config.settings, 'artifactory', 'cache_max_size_mb',
+                                              'ARTIFACTORY_CACHE_MAX_SIZE_MB', 2048)
+
+        if Artifactory.artifact_cache is None or Artifactory.artifact_cache.cache_dir != os.path.expanduser(cache_dir):
+            commons.print_msg(Artifactory.clazz, method, "Caching artifacts in {}".format(cache_dir))
+            Artifactory.artifact_cache = ArtifactCache(cache_dir, max_size_mb * 1024 * 1024)
+
+        return Artifactory.artifact_cache
+
+    def _get_cache_coordinates(self):
+        return [self.repo_key, self.artifactory_group, self.config.project_name, self.config.version_number]
+
+    def _cache_artifact(self, file, file_name, checksums=None):
+        method = '_cache_artifact'
+
+        cache = self._get_artifact_cache()
+
+        if cache is None:
+            return
+
+        try:
+            sha1 = checksums['sha1'] if checksums is not None else Artifactory._get_file_checksums(file)['sha1']
+            coordinates = self._get_cache_coordinates()
+
+            with cache.locked(coordinates, sha1):
+                cache.put(coordinates, sha1, file_name, file)
+        except Exception as e:
+            # the cache only ever saves work, failing to fill it is not a reason to fail the build
+            commons.print_msg(Artifactory.clazz, method, "Failed caching {file}. {err}".format(file=file_name, err=e),
+                              'WARN')
+
+    @staticmethod
+    def _get_file_checksums(file):
+        # one streaming pass over the file for every checksum artifactory keeps
+        sha1 = hashlib.sha1()  # nosec
+        sha256 = hashlib.sha256()
+        md5 = hashlib.md5()  # nosec
+
+        with open(file, 'rb') as artifact:
+            for block in iter(lambda: artifact.read(1024 * 1024), b''):
+                sha1.update(block)
+                sha256.update(block)
+                md5.update(block)
+
+        return {'sha1': sha1.hexdigest(), 'sha256': sha256.hexdigest(), 'md5': md5.hexdigest()}
+
     def publish(self, file, file_name):
         method = 'publish'
         commons.print_msg(Artifactory.clazz, method, 'begin')
 
         try:
-            with open(file, 'rb') as zip_file:
-                file_url = "{artifact_home}/{file}".format(artifact_home=self.get_artifact_home_url(), file=file_name)
-                commons.print_msg(Artifactory.clazz, method, "Checking url {} for existing artifact.".format(file_url))
-
-                headers, auth = self._get_artifactory_headers_and_auth(True)
-
-                # Check first if the artifact exists already.
-                # Normally a PUT would override the existing artifact,
-                # but instead we DELETE and then upload a new one to work around a
-                # broken pipe error when Artifactory terminates early on a larger payload
-                # if Artifactory user does not have DELETE permission
-                artifact_exist_check_resp = requests.get(file_url,
-                                            auth=auth,
-                                            headers=headers,
-                                            timeout=self.http_timeout)
-                if artifact_exist_check_resp.status_code == 200:
-                    commons.print_msg(Artifactory.clazz, method, "Artifact with version {} already exists. "
-                                                                 "Removing and attempting to publish."
-                                      .format(self.config.version_number),
-                                      "WARN")
-                    # Try to delete the existing file
-                    remove_resp = requests.delete(file_url,
-                                                  auth=auth,
-                                                  headers=headers,
-                                                  timeout=self.http_timeout)
-
-                    # Stop processing if we didn't have permission,
-                    # since the PUT we're about to do will fail
-                    self._check_artifact_permissions(remove_resp, method)
-
+            file_url = "{artifact_home}/{file}".format(artifact_home=self.get_artifact_home_url(), file=file_name)
+
+            checksums = None
+            if self._use_checksum_publish():
+                checksums = Artifactory._get_file_checksums(file)
+                commons.print_msg(Artifactory.clazz, method, "sha1 {sha1} sha256 {sha256}".format(**checksums))
+
+            commons.print_msg(Artifactory.clazz, method, "Checking url {} for existing artifact.".format(file_url))
+
+            headers, auth = self._get_artifactory_headers_and_auth(True)
+
+            # Check first if the artifact exists already.
+            # Normally a PUT would override the existing artifact,
+            # but instead we DELETE and then upload a new one to work around a
+            # broken pipe error when Artifactory terminates early on a larger payload
+            # if Artifactory user does not have DELETE permission
+            artifact_exist_check_resp = transport.head(file_url,
+                                                       auth=auth,
+                                                       headers=headers,
+                                                       timeout=self.http_timeout)
+            if artifact_exist_check_resp.status_code == 200:
+                if checksums is not None and \
+                        artifact_exist_check_resp.headers.get('X-Checksum-Sha1') == checksums['sha1']:
+                    commons.print_msg(Artifactory.clazz, method, "Artifact {} is already published with the same "
+                                                                 "content, skipping upload.".format(file_url))
+                    self._cache_artifact(file, file_name, checksums)
+                    commons.print_msg(Artifactory.clazz, method, 'end')
+                    return
+
+                commons.print_msg(Artifactory.clazz, method, "Artifact with version {} already exists. "
+                                                             "Removing and attempting to publish."
+                                  .format(self.config.version_number),
+                                  "WARN")
+                # Try to delete the existing file
+                remove_resp = transport.delete(file_url,
+                                               auth=auth,
+                                               headers=headers,
+                                               timeout=self.http_timeout)
+
+                # Stop processing if we didn't have permission,
+                # since the PUT we're about to do will fail
+                self._check_artifact_permissions(remove_resp, method)
+
+            resp = None
+
+            if checksums is not None:
+                headers['X-Checksum-Sha1'] = checksums['sha1']
+                headers['X-Checksum-Sha256'] = checksums['sha256']
+                headers['X-Checksum'] = checksums['md5']
+
+                # if artifactory already stores this content (under any path) it links it without an upload
+                commons.print_msg(Artifactory.clazz, method, "Attempting checksum deploy to {}".format(file_url))
+                checksum_headers = dict(headers)
+                checksum_headers['X-Checksum-Deploy'] = 'true'
+                resp = transport.put(file_url,
+                                     auth=auth,
+                                     headers=checksum_headers,
+                                     timeout=self.http_timeout)
+
+                if resp.status_code == 201:
+                    commons.print_msg(Artifactory.clazz, method, 'Checksum deploy succeeded, nothing was uploaded.')
+                else:
+                    commons.print_msg(Artifactory.clazz, method, "Checksum deploy not possible ({}), uploading."
+                                      .format(resp.status_code))
+
+            if resp is None or resp.status_code != 201:
                 commons.print_msg(Artifactory.clazz, method, "Publishing to {}".format(file_url))
 
-                # Upload our file
-                resp = requests.put(file_url,
-                                    auth=auth,
-                                    headers=headers,
-                                    data=zip_file,
-                                    timeout=self.http_timeout)
+                resp = self._upload(file_url, file, headers, auth, checksums)
         except requests.ConnectionError as e:
             error = str(e)
             commons.print_msg(Artifactory.clazz, method, "Request to Artifactory raised a ConnectionError: {}"
@@ -159,31 +363,93 @@ class Artifactory(Artifact_Storage):
             exit(1)
 
         # noinspection PyUnboundLocalVariable
-        commons.print_msg(Artifactory.clazz, method, "resp status code: {}".format(resp.status_code))
-        commons.print_msg(Artifactory.clazz, method, "response: {}".format(resp.text))
-
-        if resp.status_code != 201:
-            commons.print_msg(Artifactory.clazz,
-                              method,
-                              "Publish to Artifactory failed to {home}{fwdslash}{file} Response: {response}"
-                              .format(home=self.get_artifact_home_url(),
-                                      fwdslash=commons.forward_slash,
-                                      file=file_name,
-                                      response=resp.text),
-                              'ERROR')
-            exit(1)
+        if resp is None:
+            # an interrupted upload that completed on the server anyway, there is no PUT response to check
+            commons.print_msg(Artifactory.clazz, method, "Published {} by an interrupted upload".format(file_url))
         else:
-            commons.print_msg(Artifactory.clazz, method, resp.text)
+            commons.print_msg(Artifactory.clazz, method, "resp status code: {}".format(resp.status_code))
+            commons.print_msg(Artifactory.clazz, method, "response: {}".format(resp.text))
+
+            if resp.status_code != 201:
+                commons.print_msg(Artifactory.clazz,
+                                  method,
+                                  "Publish to Artifactory failed to {home}{fwdslash}{file} Response: {response}"
+                                  .format(home=self.get_artifact_home_url(),
+                                          fwdslash=commons.forward_slash,
+                                          file=file_name,
+                                          response=resp.text),
+                                  'ERROR')
+                exit(1)
+            else:
+                commons.print_msg(Artifactory.clazz, method, resp.text)
+
+        # the version folder changed, list it again on the next lookup
+        self.version_listings.clear()
+        self._cache_artifact(file, file_name, checksums)
 
         commons.print_msg(Artifactory.clazz, method, 'end')
 
+    def _upload(self, file_url, file, headers, auth, checksums=None):
+        method = '_upload'
+
+        large_upload_mb = commons.get_int_setting(self.config.settings, 'artifactory', 'large_upload_threshold_mb',
+                                                  'ARTIFACTORY_LARGE_UPLOAD_THRESHOLD_MB', None)
+        size = os.path.getsize(file)
+
+        if large_upload_mb is None or size < large_upload_mb * 1024 * 1024:
+            # Upload our file
+            with open(file, 'rb') as zip_file:
+                return transport.put(file_url,
+                                     auth=auth,
+                                     headers=headers,
+                                     data=zip_file,
+                                     timeout=self.http_timeout)
+
+        # A large upload is streamed from a memory mapped file in fixed size chunks, so it isn't read into memory.
+        # It can't be resumed: Artifactory has no ranged or multipart PUT for plain repositories, so every retry
+        # sends the whole file again from its first byte.  Before a retry, a HEAD checks whether the server ended
+        # up with the complete artifact anyway, and None is returned when it did.
+        retries = commons.get_int_setting(self.config.settings, 'artifactory', 'upload_retries',
+                                          'ARTIFACTORY_UPLOAD_RETRIES', 3)
+        attempt = 0
+
+        while True:
+            attempt += 1
+            commons.print_msg(Artifactory.clazz, method, "Uploading {size} bytes to {url}, attempt {attempt}".format(
+                size=size, url=file_url, attempt=attempt))
+
+            try:
+                with open(file, 'rb') as large_file, ArtifactChunks(large_file, size) as chunks:
+                    resp = transport.put(file_url,
+                                         auth=auth,
+                                         headers=headers,
+                                         data=chunks,
+                                         timeout=self.http_timeout)
+
+                if resp.status_code < 500 or attempt > retries:
+                    return resp
+
+                error = "{status} {text}".format(status=resp.status_code, text=resp.text)
+            except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError, requests.Timeout) as e:
+                if attempt > retries:
+                    raise
+                error = str(e)
+
+            commons.print_msg(Artifactory.clazz, method, "Upload interrupted: {}".format(error), 'WARN')
+            time.sleep(min(2 ** attempt, 60))
+
+            if checksums is not None:
+                probe = transport.head(file_url, auth=auth, headers=headers, timeout=self.http_timeout)
+                if probe.status_code == 200 and probe.headers.get('X-Checksum-Sha1') == checksums['sha1']:
+                    commons.print_msg(Artifactory.clazz, method, 'The interrupted upload completed on the server.')
+                    return None
+
     def publish_build_artifact(self):
         method = 'publish_build_artifact'
         commons.print_msg(Artifactory.clazz, method, 'begin')
 
         self._get_artifactory_files_name_from_build_dir()
-        for file in Artifactory.artifactory_files:
-            self.publish(file["artifactory_file"], file["artifactory_filename"])
+        files = [(file["artifactory_file"], file["artifactory_filename"]) for file in Artifactory.artifactory_files]
 
         if 'artifactoryConfig' in self.config.json_config:
             artifactory_json_config = self.config.json_config['artifactoryConfig']
@@ -192,10 +458,60 @@ class Artifactory(Artifact_Storage):
 
         if 'includePom' in artifactory_json_config:
             commons.print_msg(Artifactory.clazz, method, 'POM needed, publishing to artifactory')
-            self.publish(Artifactory.pom_file, Artifactory.pom_filename)
+            files.append((Artifactory.pom_file, Artifactory.pom_filename))
+
+        self._publish_files(files)
 
         commons.print_msg(Artifactory.clazz, method, 'end')
 
+    def _get_publish_workers(self):
+        return max(1, commons.get_int_setting(self.config.settings, 'artifactory', 'publish_workers',
+                                              'ARTIFACTORY_PUBLISH_WORKERS', 4))
+
+    def _publish_and_time(self, file, file_name):
+        # publish() exits on failure, so catch that here to let the other uploads finish
+        started = time.time()
+        try:
+            self.publish(file, file_name)
+            error = None
+        except (Exception, SystemExit) as e:
+            error = e
+
+        return {'file_name': file_name, 'size': os.path.getsize(file) if os.path.isfile(file) else 0,
+                'seconds': time.time() - started, 'error': error}
+
+    def _publish_files(self, files):
+        # Publishes all files at the same time (up to publish_workers), reports how each one went and only
+        # fails once every upload has finished.
+        method = '_publish_files'
+
+        workers = min(self._get_publish_workers(), max(len(files), 1))
+        commons.print_msg(Artifactory.clazz, method, "Publishing {count} files, {workers} at a time".format(
+            count=len(files), workers=workers))
+
+        started = time.time()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(lambda file: self._publish_and_time(*file), files))
+        elapsed = time.time() - started
+
+        failed = [result for result in results if result['error'] is not None]
+
+        for result in results:
+            status = 'failed' if result['error'] is not None else 'published'
+            commons.print_msg(Artifactory.clazz, method, "{name}: {status}, {size} bytes in {seconds:.1f}s".format(
+                name=result['file_name'], status=status, size=result['size'], seconds=result['seconds']))
+
+        total_size = sum(result['size'] for result in results)
+        commons.print_msg(Artifactory.clazz, method, "{count} files, {size} bytes in {seconds:.1f}s ({rate:.1f} "
+                                                     "MB/s)".format(count=len(results), size=total_size,
+                                                                    seconds=elapsed,
+                                                                    rate=total_size / max(elapsed, 0.001) / 1e6))
+
+        if len(failed) > 0:
+            commons.print_msg(Artifactory.clazz, method, "Failed publishing {}".format(
+                ', '.join(result['file_name'] for result in failed)), 'ERROR')
+            exit(1)
+
     def _get_artifactory_files_name_from_build_dir(self):
         method = '_get_artifactory_files_name_from_build_dir'
         commons.print_msg(Artifactory.clazz, method, 'begin')
@@ -283,13 +599,59 @@ class Artifactory(Artifact_Storage):
                        "/" + self.config.project_name + \
                        "/" + self.config.version_number
 
+        with self.version_listings_lock:
+            if arti_api_url not in self.version_listings:
+                self.version_listings[arti_api_url] = self._get_version_listing(arti_api_url)
+
+        matches = self.version_listings[arti_api_url].get(extension, [])
+        matching_file_count = len(matches)
+
+        for match in matches:
+            commons.print_msg(Artifactory.clazz, method, ("Found match ", match))
+
+        if matching_file_count == 1:
+            artifact_to_deploy = matches[0]
+            return "%s/%s/%s/%s/%s%s" % (self.artifactory_domain,
+                                         self.repo_key,
+                                         self.artifactory_group,
+                                         self.config.project_name,
+                                         self.config.version_number,
+                                         artifact_to_deploy)
+        elif matching_file_count > 1:
+            commons.print_msg(Artifactory.clazz, method, "Found more than 1 artifact in {}".format(arti_api_url), 'ERROR')
+            raise ArtifactException("Found more than 1 artifact in {}".format(arti_api_url))
+
+        else:
+            commons.print_msg(Artifactory.clazz,
+                              method,
+                             "Could not locate artifact {}".format(extension),
+                             "ERROR")
+            raise ArtifactException("Could not locate artifact {}".format(extension))
+
+    @staticmethod
+    def _add_to_listing(listing, child_uri):
+        # a child is indexed under every extension it ends with (tar.gz and gz for a .tar.gz) so a lookup matches
+        # exactly what endswith would
+        parts = child_uri.split('.')
+        for position in range(1, len(parts)):
+            listing.setdefault('.'.join(parts[position:]), []).append(child_uri)
+
+    def _get_version_listing(self, arti_api_url):
+        # Lists a version folder once for all the extensions looked up in it.  One aql search also returns each
+        # artifact's checksum, the storage listing at arti_api_url is used when aql finds nothing or isn't
+        # available.
+        method = "get_artifact_url"
+
+        listing = self._get_version_listing_from_aql()
+        if listing:
+            return listing
+
         try:
             headers, auth = self._get_artifactory_headers_and_auth()
-            resp = requests.get(arti_api_url,
-                                    auth=auth,
-                                    headers=headers,
-                                    timeout=self.http_timeout
-                                )
+            resp = transport.get(arti_api_url,
+                                 auth=auth,
+                                 headers=headers,
+                                 timeout=self.http_timeout)
         except requests.ConnectionError as e:
             commons.print_msg(Artifactory.clazz, method, "Request to Artifactory timed out.", "ERROR")
             raise ArtifactException(e)
@@ -309,76 +671,411 @@ class Artifactory(Artifact_Storage):
 
         json_data = json.loads(resp.text)
 
-        matching_file_count = 0
+        listing = {}
 
         for child in json_data['children']:
-            child_uri = child['uri']
-            if child_uri.endswith("." + extension):
-                matching_file_count += 1
-                artifact_to_deploy = child['uri']
-                commons.print_msg(Artifactory.clazz, method, ("Found match ", artifact_to_deploy))
+            Artifactory._add_to_listing(listing, child['uri'])
 
-        if matching_file_count == 1:
-            # noinspection PyUnboundLocalVariable
-            return "%s/%s/%s/%s/%s%s" % (self.artifactory_domain,
-                                         self.repo_key,
-                                         self.artifactory_group,
-                                         self.config.project_name,
-                                         self.config.version_number,
-                                         artifact_to_deploy)
-        elif matching_file_count > 1:
-            commons.print_msg(Artifactory.clazz, method, "Found more than 1 artifact in {}".format(arti_api_url), 'ERROR')
-            raise ArtifactException("Found more than 1 artifact in {}".format(arti_api_url))
+        return listing
 
-        else:
-            commons.print_msg(Artifactory.clazz,
-                              method,
-                             "Could not locate artifact {}".format(extension),
-                             "ERROR")
-            raise ArtifactException("Could not locate artifact {}".format(extension))
+    def _get_version_listing_from_aql(self):
+        # None when aql isn't available
+        if Artifactory.aql_unavailable:
+            return None
+
+        try:
+            artifacts = self.find_artifact_versions(version_pattern=self.config.version_number)
+        except ArtifactException:
+            Artifactory.aql_unavailable = True
+            return None
+
+        listing = {}
+
+        for artifact in artifacts:
+            Artifactory._add_to_listing(listing, '/' + artifact['name'])
+            if artifact['sha1'] is not None:
+                self.artifact_checksums[artifact['url']] = artifact['sha1']
+
+        return listing
+
+    def _aql_search(self, query):
+        # Runs an artifactory query language search and returns its results.  One request answers what would
+        # otherwise take a storage listing per folder.
+        method = '_aql_search'
+
+        aql_url = self.artifactory_domain + "/api/search/aql"
+        commons.print_msg(Artifactory.clazz, method, "Searching {url} with {query}".format(url=aql_url, query=query))
+
+        try:
+            headers, auth = self._get_artifactory_headers_and_auth()
+            headers['Content-type'] = 'text/plain'
+            resp = transport.post(aql_url, data=query, auth=auth, headers=headers, timeout=self.http_timeout)
+        except requests.ConnectionError as e:
+            commons.print_msg(Artifactory.clazz, method, "AQL search timed out. {}".format(e), 'WARN')
+            raise ArtifactException(e)
+
+        if resp.status_code != 200:
+            # not an error yet, version lookups fall back to storage listings
+            commons.print_msg(Artifactory.clazz, method, "AQL search failed.\r\n Response: {}".format(resp.text),
+                              'WARN')
+            raise ArtifactException("AQL search failed.\r\n Response: {}".format(resp.text))
+
+        return json.loads(resp.text).get('results', [])
+
+    def find_artifact_versions(self, name_pattern='*', modified_since=None, version_pattern='*'):
+        """
+        Every artifact of this project in one AQL search, newest first.
+        :param name_pattern: AQL wildcard the file name must match, e.g. '*.tar.gz'
+        :param modified_since: only artifacts modified after this datetime or ISO 8601 string
+        :param version_pattern: AQL wildcard the version folder must match, e.g. 'v1.2.0*'
+        :return: list of dicts with version, name, url, size, sha1, sha256 and modified
+        """
+        criteria = {
+            'repo': self.repo_key,
+            'path': {'$match': "{group}/{project}/{version}".format(group=self.artifactory_group,
+                                                                    project=self.config.project_name,
+                                                                    version=version_pattern)},
+            'name': {'$match': name_pattern},
+            'type': 'file'
+        }
+
+        if modified_since is not None:
+            criteria['modified'] = {'$gt': modified_since.isoformat() if hasattr(modified_since, 'isoformat')
+                                    else str(modified_since)}
+
+        query = 'items.find({criteria}).include("repo","path","name","size","actual_sha1","sha256","modified")' \
+                '.sort({{"$desc":["modified"]}})'.format(criteria=json.dumps(criteria))
+
+        artifacts = []
+
+        for result in self._aql_search(query):
+            artifacts.append({
+                'version': result['path'].split('/')[-1],
+                'name': result['name'],
+                'url': "{domain}/{repo}/{path}/{name}".format(domain=self.artifactory_domain, repo=result['repo'],
+                                                              path=result['path'], name=result['name']),
+                'size': result.get('size'),
+                'sha1': result.get('actual_sha1'),
+                'sha256': result.get('sha256'),
+                'modified': result.get('modified')
+            })
+
+        return artifacts
+
+    def get_all_versions(self, name_pattern='*'):
+        # every version of the project that has an artifact matching name_pattern, highest first
+        versions = {artifact['version'] for artifact in self.find_artifact_versions(name_pattern=name_pattern)}
+
+        return sorted(versions, key=lambda version: parse_version(version) or (-1,), reverse=True)
+
+    def get_latest_version_from_base(self, base_version, name_pattern='*'):
+        # highest release or snapshot (v1.2.0+5) published for base_version (v1.2.0), None when there is none
+        base = parse_version(base_version)
+
+        if base is None:
+            return None
+
+        candidates = [version for version in self.get_all_versions(name_pattern)
+                      if (parse_version(version) or ())[:3] == base[:3]]
+
+        return candidates[0] if len(candidates) > 0 else None
 
     def download_artifact(self, artifact_url, download_path):
         """
         Download the artifact from artifactory. Really just a save a url to a file method.
+        Interrupted downloads are resumed with range requests, and large files are fetched as several byte
+        ranges at the same time.
         :param artifact_url: obviously, the artifact url
         :param download_path: Where you want the file to go
         :return: nothing, exceptions raised if it fails
         """
         method = "download_artifact"
         try:
-            with open(download_path, 'wb') as handle:
-                headers, auth = self._get_artifactory_headers_and_auth()
-                response = requests.get(artifact_url,
-                                        auth=auth,
-                                        headers=headers,
-                                        stream=True)
-                if not response.ok:
-                    response.raise_for_status()
-
-                for block in response.iter_content(1024):
-                    handle.write(block)
+            headers, auth = self._get_artifactory_headers_and_auth()
+            size, accepts_ranges = self._probe_download(artifact_url, headers, auth)
+
+            segments = self._get_download_segments()
+            threshold_mb = commons.get_int_setting(self.config.settings, 'artifactory', 'parallel_download_threshold_mb',
+                                                   'ARTIFACTORY_PARALLEL_DOWNLOAD_THRESHOLD_MB', 256)
+
+            if segments > 1 and accepts_ranges and size is not None and size >= threshold_mb * 1024 * 1024:
+                self._download_segments(artifact_url, download_path, headers, auth, size, segments)
+            else:
+                with open(download_path, 'wb') as handle:
+                    self._download_range(artifact_url, handle, headers, auth, resumable=accepts_ranges)
+                    handle.truncate()
 
         except Exception as e:
             commons.print_msg(Artifactory.clazz, method, 'Failed to download {}'.format(artifact_url), 'ERROR')
             commons.print_msg(Artifactory.clazz, method, "URLError is {msg}".format(msg=e))
             raise ArtifactDownloadException(e)
 
+    def _probe_download(self, artifact_url, headers, auth):
+        # size of the artifact and whether the server accepts range requests for it, if it tells us
+        try:
+            probe = transport.head(artifact_url, auth=auth, headers=headers, allow_redirects=True,
+                                   timeout=self.http_timeout)
+        except requests.RequestException:
+            return None, False
+
+        if probe.status_code != 200 or probe.headers.get('Content-Length') is None:
+            return None, False
+
+        return int(probe.headers['Content-Length']), probe.headers.get('Accept-Ranges') == 'bytes'
+
+    def _get_download_segments(self):
+        return commons.get_int_setting(self.config.settings, 'artifactory', 'download_segments',
+                                       'ARTIFACTORY_DOWNLOAD_SEGMENTS', 4)
+
+    def _download_segments(self, artifact_url, download_path, headers, auth, size, segments):
+        method = '_download_segments'
+
+        segment_size = -(-size // segments)
+        ranges = [(start, min(start + segment_size, size) - 1) for start in range(0, size, segment_size)]
+
+        commons.print_msg(Artifactory.clazz, method, "Downloading {size} bytes as {count} ranges".format(
+            size=size, count=len(ranges)))
+
+        # preallocate so that every range can be written in place
+        with open(download_path, 'wb') as handle:
+            handle.truncate(size)
+
+        def download_segment(byte_range):
+            with open(download_path, 'r+b') as segment_handle:
+                self._download_range(artifact_url, segment_handle, headers, auth, byte_range[0], byte_range[1])
+
+        with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+            for future in [executor.submit(download_segment, byte_range) for byte_range in ranges]:
+                future.result()
+
+    def _download_range(self, artifact_url, handle, headers, auth, start=0, end=None, resumable=True):
+        # Writes bytes start through end (the rest of the file when None) of the artifact into handle at the same
+        # offset, picking up where it left off when the connection drops.
+        method = '_download_range'
+
+        retries = commons.get_int_setting(self.config.settings, 'artifactory', 'download_retries',
+                                          'ARTIFACTORY_DOWNLOAD_RETRIES', 3)
+        position = start
+        attempt = 0
+
+        while True:
+            request_headers = dict(headers)
+            if position > 0 or end is not None:
+                request_headers['Range'] = 'bytes={start}-{end}'.format(start=position,
+                                                                        end='' if end is None else end)
+
+            try:
+                with transport.get(artifact_url, auth=auth, headers=request_headers, stream=True,
+                                   timeout=self.http_timeout) as response:
+                    if not response.ok:
+                        response.raise_for_status()
+
+                    if 'Range' in request_headers and response.status_code != 206:
+                        if end is not None:
+                            raise ArtifactDownloadException("{} does not support range requests".format(artifact_url))
+                        # the server sent the whole file again
+                        position = 0
+
+                    handle.seek(position)
+                    for block in response.iter_content(Artifactory.download_chunk_size):
+                        handle.write(block)
+                        position += len(block)
+
+                if end is not None and position <= end:
+                    raise requests.exceptions.ChunkedEncodingError("Range ended at {pos} instead of {end}".format(
+                        pos=position, end=end))
+
+                return position
+
+            except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError, requests.Timeout) as e:
+                attempt += 1
+                if attempt > retries:
+                    raise
+
+                if not resumable:
+                    position = start
+
+                commons.print_msg(Artifactory.clazz, method, "Download of {url} interrupted at byte {pos}, resuming. "
+                                                             "{err}".format(url=artifact_url, pos=position, err=e),
+                                  'WARN')
+                time.sleep(min(2 ** attempt, 30))
+
+    def _download_artifact_through_cache(self, artifact_url, download_path, file_name):
+        method = '_download_artifact_through_cache'
+
+        cache = self._get_artifact_cache()
+        sha1 = self.artifact_checksums.get(artifact_url)
+
+        if cache is not None and sha1 is None:
+            headers, auth = self._get_artifactory_headers_and_auth()
+            try:
+                probe = transport.head(artifact_url, auth=auth, headers=headers, allow_redirects=True,
+                                       timeout=self.http_timeout)
+                if probe.status_code == 200:
+                    sha1 = probe.headers.get('X-Checksum-Sha1')
+            except requests.RequestException as e:
+                commons.print_msg(Artifactory.clazz, method, "Could not read the checksum of {url}, not using the "
+                                                             "artifact cache. {err}".format(url=artifact_url, err=e),
+                                  'WARN')
+
+        if cache is None or sha1 is None:
+            self.download_artifact(artifact_url, download_path)
+            return
+
+        coordinates = self._get_cache_coordinates()
+
+        with cache.locked(coordinates, sha1):
+            if cache.get(coordinates, sha1, file_name, download_path):
+                return
+
+            self.download_artifact(artifact_url, download_path)
+
+            if Artifactory._get_file_checksums(download_path)['sha1'] != sha1:
+                raise ArtifactDownloadException("Checksum of the downloaded {} does not match artifactory".format(
+                    file_name))
+
+            try:
+                cache.put(coordinates, sha1, file_name, download_path)
+            except Exception as e:
+                commons.print_msg(Artifactory.clazz, method, "Failed caching {file}. {err}".format(file=file_name,
+                                                                                                   err=e), 'WARN')
+
+    def _use_stream_extract(self, extension):
+        stream_extract = commons.get_setting(self.config.settings, 'artifactory', 'stream_extract',
+                                             'ARTIFACTORY_STREAM_EXTRACT')
+
+        return stream_extract is not None and stream_extract.lower() in ['yes', 'true', 'y'] and \
+            extension in Artifactory.tar_extensions + Artifactory.zip_extensions
+
+    def _stream_extract_artifact_locally(self, download_dir, extension):
+        # Extracts while downloading instead of saving the artifact first.  Tars are decompressed straight from the
+        # response; zips need random access so they are spooled to a temp file (in memory while small) that is
+        # gone after extraction.  The artifact cache is not used since the artifact never lands on disk whole.
+        method = '_stream_extract_artifact_locally'
+
+        commons.verify_version(self.config)
+
+        try:
+            artifact = self._get_artifact_url(extension)
+        except ArtifactException:
+            exit(1)
+
+        headers, auth = self._get_artifactory_headers_and_auth()
+
+        try:
+            if extension in Artifactory.tar_extensions:
+                commons.print_msg(Artifactory.clazz, method, 'Extracting tar {} as it downloads'.format(artifact))
+                retries = commons.get_int_setting(self.config.settings, 'artifactory', 'download_retries',
+                                                  'ARTIFACTORY_DOWNLOAD_RETRIES', 3)
+
+                with ArtifactStream(artifact, headers, auth, self.http_timeout, retries) as stream:
+                    commons.extract_tar_stream(stream, download_dir)
+            else:
+                commons.print_msg(Artifactory.clazz, method, "Extracting zip {} through a temp file".format(artifact))
+
+                with tempfile.SpooledTemporaryFile(max_size=Artifactory.zip_spool_in_memory, dir=download_dir) \
+                        as spool:
+                    self._download_range(artifact, spool, headers, auth)
+                    with zipfile.ZipFile(spool, "r") as z:
+                        z.extractall(download_dir)
+        except Exception as e:
+            commons.print_msg(Artifactory.clazz, method, 'Failed to download {}'.format(artifact), 'ERROR')
+            commons.print_msg(Artifactory.clazz, method, "URLError is {msg}".format(msg=e))
+            exit(1)
+
     def download_and_extract_artifacts_locally(self, download_dir, extract=True):
+        # checked once here so that a missing version isn't reported as a failed download of every artifact
+        commons.verify_version(self.config)
+
+        download_workers = self._get_download_workers()
+
+        if download_workers > 1 and len(self.artifactory_extensions) > 1:
+            self._download_and_extract_concurrently(download_dir, extract, download_workers)
+            return
+
         for extension in self.artifactory_extensions:
             self._download_and_extract_artifact_locally(download_dir, extension, extract=extract)
 
-    # noinspection PyUnboundLocalVariable
+    def _get_download_workers(self):
+        return commons.get_int_setting(self.config.settings, 'artifactory', 'download_workers',
+                                       'ARTIFACTORY_DOWNLOAD_WORKERS', 4)
+
+    def _get_extract_workers(self):
+        return max(1, commons.get_int_setting(self.config.settings, 'artifactory', 'extract_workers',
+                                              'ARTIFACTORY_EXTRACT_WORKERS', 2))
+
+    def _download_and_extract_concurrently(self, download_dir, extract, download_workers):
+        # Every extension is downloaded at the same time and each one is handed to the extraction pool as soon as
+        # its download finishes.  Failures are reported once everything has finished.
+        method = '_download_and_extract_concurrently'
+
+        extract_workers = self._get_extract_workers()
+        commons.print_msg(Artifactory.clazz, method, "Downloading {count} artifacts with {download} workers and "
+                                                     "extracting with {extract} workers".format(
+                                                      count=len(self.artifactory_extensions),
+                                                      download=download_workers, extract=extract_workers))
+
+        failed = []
+
+        def run(extension, action, step, *args):
+            try:
+                return step(*args)
+            except (Exception, SystemExit) as e:
+                commons.print_msg(Artifactory.clazz, method, "Failed {action} {extension}. {err}".format(
+                    action=action, extension=extension, err=e), 'WARN')
+                failed.append(extension)
+                return None
+
+        with ThreadPoolExecutor(max_workers=download_workers) as downloads, \
+                ThreadPoolExecutor(max_workers=extract_workers) as extractions:
+            download_futures = {}
+            for extension in self.artifactory_extensions:
+                if extract and self._use_stream_extract(extension):
+                    # extracted while it downloads, there is nothing left for the extraction pool
+                    future = downloads.submit(run, extension, 'downloading', self._stream_extract_artifact_locally,
+                                              download_dir, extension)
+                else:
+                    future = downloads.submit(run, extension, 'downloading', self._download_artifact_locally,
+                                              download_dir, extension)
+                download_futures[future] = extension
+
+            for future in as_completed(download_futures):
+                download_path = future.result()
+                if download_path is not None and extract:
+                    extension = download_futures[future]
+                    extractions.submit(run, extension, 'extracting', self._extract_artifact_locally, download_dir,
+                                       extension, download_path)
+
+        if len(failed) > 0:
+            commons.print_msg(Artifactory.clazz, method, "Failed downloading or extracting {}".format(', '.join(failed)),
+                              'ERROR')
+            exit(1)
+
     def _download_and_extract_artifact_locally(self, download_dir, extension, extract=True):
         method = "_download_and_extract_artifact_locally"
 
         commons.print_msg(Artifactory.clazz, method, 'begin')
 
+        if extract and self._use_stream_extract(extension):
+            self._stream_extract_artifact_locally(download_dir, extension)
+        else:
+            download_path = self._download_artifact_locally(download_dir, extension)
+
+            if extract:
+                self._extract_artifact_locally(download_dir, extension, download_path)
+
+        commons.print_msg(Artifactory.clazz, method, 'end')
+
+    # noinspection PyUnboundLocalVariable
+    def _download_artifact_locally(self, download_dir, extension):
+        method = "_download_artifact_locally"
+
         commons.verify_version(self.config)
 
         artifact_to_download = self.config.project_name + '-' + self.config.version_number + '.' + extension
 
         try:
-            artifact = self.get_artifact_url()
+            artifact = self._get_artifact_url(extension)
 
             download_path = download_dir + artifact_to_download
 
@@ -392,28 +1089,30 @@ class Artifactory(Artifact_Storage):
             exit(1)
 
         try:
-            self.download_artifact(artifact, download_path)
+            self._download_artifact_through_cache(artifact, download_path, artifact_to_download)
         except ArtifactDownloadException as e:
             commons.print_msg(Artifactory.clazz, method, 'Failed to download {}'.format(artifact), 'ERROR')
             commons.print_msg(Artifactory.clazz, method, "URLError is {msg}".format(msg=e))
             os.system('stty sane')
             exit(1)
 
-        if extract:
-            # Unzip/untar file downloaded from Artifactory if required
-            if extension == "tar.gz" or extension == "tar" or extension == "tgz":
-                commons.print_msg(Artifactory.clazz, method, 'Extracting tar {}'.format(download_path))
-                tar = tarfile.open(download_path)
-                tar.extractall(download_dir)
-                tar.close()
-                os.remove(download_path)
-            if extension == "zip":
-                commons.print_msg(Artifactory.clazz, method, "Extracting zip {}".format(download_path))
-                with zipfile.ZipFile(download_path, "r") as z:
-                    z.extractall(download_dir)
-                os.remove(download_path)
-
-        commons.print_msg(Artifactory.clazz, method, 'end')
+        return download_path
+
+    def _extract_artifact_locally(self, download_dir, extension, download_path):
+        method = "_extract_artifact_locally"
+
+        # Unzip/untar file downloaded from Artifactory if required
+        if extension in Artifactory.tar_extensions:
+            commons.print_msg(Artifactory.clazz, method, 'Extracting tar {}'.format(download_path))
+            tar = tarfile.open(download_path)
+            tar.extractall(download_dir)
+            tar.close()
+            os.remove(download_path)
+        if extension in Artifactory.zip_extensions:
+            commons.print_msg(Artifactory.clazz, method, "Extracting zip {}".format(download_path))
+            with zipfile.ZipFile(download_path, "r") as z:
+                z.extractall(download_dir)
+            os.remove(download_path)
 
     def _check_artifact_permissions(self, remove_resp, method):
         if remove_resp.status_code == 403:
@@ -0,0 +1,101 @@
+#!/usr/bin/python
+# app_inventory.py
+
+import re
+
+
+class AppInventory:
+    """
+    Snapshot of a project's apps in the targeted space, and of the routes mapped to them, taken once per deploy
+    or rollback.  Deciding which versions to stop, delete or map reads from it instead of listing the space again
+    for every app, and each change the deploy makes is recorded in it so that it stays current.
+
+    Apps are indexed by name.  An app whose routes are not known (one pushed after the snapshot was taken) has
+    routes of None, and callers have to ask the foundation for them.
+    """
+
+    def __init__(self, project_name):
+        self.project_name = project_name
+        # app name -> {'state': 'started' or 'stopped', 'guid': ..., 'routes': [(host, domain)] or None}
+        self.apps = {}
+        # (host, domain) -> {'guid': ..., 'destinations': {app name: destination guid}}
+        self.routes = {}
+
+    def is_project_app(self, name):
+        # the apps grep {proj}*-v\d*\.\d*\.\d* found in cf apps
+        return re.match(re.escape(self.project_name) + r'-v\d+\.\d+\.\d+', name) is not None
+
+    def add_app(self, name, state, guid=None, routes=None):
+        self.apps[name] = {'state': state.lower(), 'guid': guid, 'routes': routes}
+
+    def add_route(self, host, domain, destinations, guid=None):
+        # destinations maps the names of the apps the route is mapped to onto their destination guids (if known)
+        self.routes[(host, domain)] = {'guid': guid, 'destinations': dict(destinations)}
+
+        for name in destinations:
+            if name in self.apps:
+                if self.apps[name]['routes'] is None:
+                    self.apps[name]['routes'] = []
+                self.apps[name]['routes'].append((host, domain))
+
+    def load_cf_apps(self, cf_apps_output):
+        # rows of cf apps start with the app name followed by its requested state
+        for line in cf_apps_output.splitlines():
+            columns = line.decode('utf-8').split()
+
+            if len(columns) >= 2 and self.is_project_app(columns[0]):
+                self.add_app(columns[0], columns[1], routes=[])
+
+    def load_cf_routes(self, cf_routes_output):
+        # rows of cf routes are space, host, domain, ... and the comma separated apps the route is mapped to
+        for line in cf_routes_output.splitlines():
+            columns = line.decode('utf-8').split()
+            apps = [name for name in re.split(r'[\s,]+', line.decode('utf-8')) if name in self.apps]
+
+            if len(columns) >= 3 and len(apps) > 0:
+                self.add_route(columns[1], columns[2], {name: None for name in apps})
+
+    def has_routes(self, name):
+        return name in self.apps and self.apps[name]['routes'] is not None
+
+    def app_names(self, state):
+        return [name for name, app in self.apps.items() if app['state'] == state]
+
+    def app_lines(self, state):
+        # newline separated bytes, the format the cf apps pipelines used to produce
+        return '\n'.join(self.app_names(state)).encode('utf-8')
+
+    def route_lines(self, name):
+        # "host domain" per line, the format the cf routes pipeline used to produce
+        return '\n'.join("{host} {domain}".format(host=host, domain=domain)
+                         for host, domain in self.apps[name]['routes']).encode('utf-8')
+
+    def set_state(self, name, state):
+        if name in self.apps:
+            self.apps[name]['state'] = state
+
+    def add_pushed_app(self, name):
+        # a push starts the app and maps whatever routes its manifest names, which the snapshot doesn't know
+        guid = self.apps[name]['guid'] if name in self.apps else None
+        self.remove_app(name)
+        self.add_app(name, 'started', guid)
+
+    def remove_app(self, name):
+        self.apps.pop(name, None)
+
+        for route in self.routes.values():
+            route['destinations'].pop(name, None)
+
+    def map_route(self, name, host, domain, destination_guid=None):
+        route = self.routes.setdefault((host, domain), {'guid': None, 'destinations': {}})
+        route['destinations'][name] = destination_guid
+
+        if self.has_routes(name) and (host, domain) not in self.apps[name]['routes']:
+            self.apps[name]['routes'].append((host, domain))
+
+    def unmap_route(self, name, host, domain):
+        if (host, domain) in self.routes:
+            self.routes[(host, domain)]['destinations'].pop(name, None)
+
+        if self.has_routes(name) and (host, domain) in self.apps[name]['routes']:
+            self.apps[name]['routes'].remove((host, domain))
@@ -1,13 +1,17 @@
+import functools
 import os
 import subprocess
 import tarfile
+import threading
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 from subprocess import TimeoutExpired
 import platform
 import re
 
 from flow.buildconfig import BuildConfig
 from flow.cloud.cloud_abc import Cloud
+from flow.cloud.cloudfoundry.app_inventory import AppInventory
 
 import flow.utils.commons as commons
 
@@ -22,10 +26,20 @@ class CloudFoundry(Cloud):
     cf_user = None
     cf_pwd = None
     path_to_cf = None
+    cli_downloaded = False
     stopped_apps = None
     started_apps = None
+    inventory = None
+    inventory_lock = threading.Lock()
     config = BuildConfig
     http_timeout = 30
+    # seconds cf push may run in total, and without printing anything
+    push_timeout = 1800
+    push_inactivity_timeout = 600
+    login_timeout = 120
+    # cf cli processes share CF_HOME, whose config.json the cli rewrites (e.g. when it refreshes its token), so
+    # they run one at a time unless the parallel_operations setting says otherwise
+    parallel_operations = 1
 
     def __init__(self, config_override=None):
         method = '__init__'
@@ -41,10 +55,33 @@ class CloudFoundry(Cloud):
 
         commons.print_msg(CloudFoundry.clazz, method, 'end')
 
+    def _get_parallel_operations(self):
+        return max(1, commons.get_int_setting(self.config.settings, 'cloudfoundry', 'parallel_operations',
+                                              'CF_PARALLEL_OPERATIONS', self.parallel_operations))
+
+    def _run_concurrently(self, tasks):
+        # Runs (name, task) pairs, at most parallel_operations at a time, where a task returns whether it failed.
+        # Returns the names of the tasks that failed.
+        workers = min(self._get_parallel_operations(), len(tasks))
+
+        if workers <= 1:
+            return [name for name, task in tasks if task()]
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [(name, executor.submit(task)) for name, task in tasks]
+
+        return [name for name, future in futures if future.result()]
+
     def download_cf_cli(self):
         method = '_download_cf_cli'
         commons.print_msg(CloudFoundry.clazz, method, 'begin')
 
+        if CloudFoundry.cli_downloaded:
+            # by an earlier call in this run, e.g. before deploying to several targets
+            CloudFoundry.path_to_cf = "./"
+            commons.print_msg(CloudFoundry.clazz, method, 'cf cli already downloaded')
+            return
+
         cmd = "where" if platform.system() == "Windows" else "which"
         rtn = subprocess.call([cmd, 'cf'])
 
@@ -61,6 +98,7 @@ class CloudFoundry(Cloud):
             CloudFoundry.path_to_cf = "./"
             tar.extractall()
             tar.close()
+            CloudFoundry.cli_downloaded = True
 
         commons.print_msg(CloudFoundry.clazz, method, 'end')
 
@@ -138,6 +176,15 @@ class CloudFoundry(Cloud):
         method = '_fetch_app_routes'
         commons.print_msg(CloudFoundry.clazz, method, 'begin')
 
+        if CloudFoundry.inventory is not None and CloudFoundry.inventory.has_routes(appName):
+            existing_routes_domains_output = CloudFoundry.inventory.route_lines(appName)
+        else:
+            existing_routes_domains_output = self._fetch_app_routes_from_cf(method, appName)
+
+        commons.print_msg(CloudFoundry.clazz, method, 'end')
+        return existing_routes_domains_output
+
+    def _fetch_app_routes_from_cf(self, method, appName):
         cmd1 = "{}cf routes".format(CloudFoundry.path_to_cf)
         cmd2 = "grep {}".format(appName)
         cmd3 = ["awk", "{{print $2,$3}}"]
@@ -169,7 +216,6 @@ class CloudFoundry(Cloud):
             # existing_routes.communicate()
             os.system('stty sane')
 
-        commons.print_msg(CloudFoundry.clazz, method, 'end')
         return existing_routes_domains_output
 
     def _split_app_routes_to_list(self, routes_domains_output):
@@ -262,6 +308,8 @@ class CloudFoundry(Cloud):
             modify_route.kill()
             # existing_routes.communicate()
             os.system('stty sane')
+        else:
+            self._record_route_action(route, app, domain, route_action)
 
         commons.print_msg(CloudFoundry.clazz, method, 'end')
 
@@ -302,7 +350,8 @@ class CloudFoundry(Cloud):
                                             rtn=perform_app_action.returncode),
                                     'ERROR')
                 start_stop_delete_app_failed = True
-
+            else:
+                self._record_app_action(app, app_action)
 
             for affected_app in perform_app_action_output.splitlines():
                 commons.print_msg(CloudFoundry.clazz, method, affected_app.decode("utf-8"))
@@ -316,91 +365,122 @@ class CloudFoundry(Cloud):
         commons.print_msg(CloudFoundry.clazz, method, 'end')
         return start_stop_delete_app_failed
 
-    def _get_stopped_apps(self):
-        method = '_get_stopped_apps'
+    def _load_inventory(self):
+        # lists the space's apps and routes once; every later decision in the deploy reads from the inventory
+        method = '_load_inventory'
         commons.print_msg(CloudFoundry.clazz, method, 'begin')
 
-        cmd = "{path}cf apps | grep {proj}*-v\d*\.\d*\.\d* | grep stopped | awk '{{print $1}}'".format(
-            path=CloudFoundry.path_to_cf,
-            proj=self.config.project_name)
+        inventory = AppInventory(self.config.project_name)
+        inventory.load_cf_apps(self._list_space(method, 'apps'))
+        inventory.load_cf_routes(self._list_space(method, 'routes'))
+        CloudFoundry.inventory = inventory
 
-        stopped_apps = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT) # nosec
+        commons.print_msg(CloudFoundry.clazz, method, "Found {count} versions of {proj}".format(
+            count=len(inventory.apps), proj=self.config.project_name))
 
-        get_stopped_apps_failed = False
+        commons.print_msg(CloudFoundry.clazz, method, 'end')
 
-        try:
-            CloudFoundry.stopped_apps, errs = stopped_apps.communicate(timeout=60)
+    def _list_space(self, method, listing):
+        cmd = "{path}cf {listing}".format(path=CloudFoundry.path_to_cf, listing=listing)
 
-            for line in CloudFoundry.stopped_apps.splitlines():
-                commons.print_msg(CloudFoundry.clazz, method, "App Already Stopped: {}".format(line.decode('utf-8')))
+        cf_list = subprocess.Popen(cmd.split(), shell=False, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+
+        list_failed = False
+
+        try:
+            cf_list_output, errs = cf_list.communicate(timeout=120)
 
-            if stopped_apps.returncode != 0:
+            if cf_list.returncode != 0:
                 commons.print_msg(CloudFoundry.clazz, method, "Failed calling {command}. Return code of {rtn}".format(
-                    command=cmd, rtn=stopped_apps.returncode), 'ERROR')
-                get_stopped_apps_failed = True
+                    command=cmd, rtn=cf_list.returncode), 'ERROR')
+                list_failed = True
 
         except TimeoutExpired:
             commons.print_msg(CloudFoundry.clazz, method, "Timed out calling {}".format(cmd), 'ERROR')
-            get_stopped_apps_failed = True
+            list_failed = True
 
-        if get_stopped_apps_failed:
-            stopped_apps.kill()
+        if list_failed:
+            cf_list.kill()
             os.system('stty sane')
             self._cf_logout()
             exit(1)
 
-        commons.print_msg(CloudFoundry.clazz, method, 'end')
+        # noinspection PyUnboundLocalVariable
+        return cf_list_output
 
-    def _get_started_apps(self, force_deploy=False, rollback=False):
-        method = '_get_started_apps'
+    def _record_app_action(self, app, app_action):
+        if CloudFoundry.inventory is None:
+            return
+
+        with CloudFoundry.inventory_lock:
+            if app_action == 'delete':
+                CloudFoundry.inventory.remove_app(app)
+            else:
+                CloudFoundry.inventory.set_state(app, 'started' if app_action == 'start' else 'stopped')
+
+    def _record_route_action(self, route, app, domain, route_action, destination_guid=None):
+        if CloudFoundry.inventory is None:
+            return
+
+        with CloudFoundry.inventory_lock:
+            if route_action == 'map':
+                CloudFoundry.inventory.map_route(app, route, domain, destination_guid)
+            else:
+                CloudFoundry.inventory.unmap_route(app, route, domain)
+
+    def _get_stopped_apps(self):
+        method = '_get_stopped_apps'
         commons.print_msg(CloudFoundry.clazz, method, 'begin')
 
-        cmd = "{path}cf apps | grep {proj}*-v\d*\.\d*\.\d* | grep started | awk '{{print $1}}'".format(
-            path=CloudFoundry.path_to_cf,
-            proj=self.config.project_name)
+        if CloudFoundry.inventory is None:
+            self._load_inventory()
 
-        started_apps = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT) # nosec
+        CloudFoundry.stopped_apps = CloudFoundry.inventory.app_lines('stopped')
 
-        get_started_apps_failed = False
+        for line in CloudFoundry.stopped_apps.splitlines():
+            commons.print_msg(CloudFoundry.clazz, method, "App Already Stopped: {}".format(line.decode('utf-8')))
 
-        try:
-            CloudFoundry.started_apps, errs = started_apps.communicate(timeout=60)
-
-            for line in CloudFoundry.started_apps.splitlines():
-                commons.print_msg(CloudFoundry.clazz, method, "Started App: {}".format(line.decode('utf-8')))
-                version_to_look_for = "{proj}-{ver}".format(proj=self.config.project_name,
-                                                            ver=self.config.version_number)
-
-                if line.decode('utf-8') == version_to_look_for and not force_deploy and not rollback:
-                    commons.print_msg(CloudFoundry.clazz, method, "App version {} already exists and is running. "
-                                                                 "Cannot perform zero-downtime deployment.  To "
-                                                                 "override, set force flag = 'true'".format(
-                        version_to_look_for), 'ERROR')
-                    get_started_apps_failed = True
-
-                elif line.decode('utf-8') == version_to_look_for and force_deploy:
-                    commons.print_msg(CloudFoundry.clazz, method, "Already found {} but force_deploy turned on. "
-                                                                 "Continuing with deployment.  Downtime will occur "
-                                                                 "during deployment.".format(version_to_look_for))
-            if started_apps.returncode != 0:
-                commons.print_msg(CloudFoundry.clazz, method, "Failed calling {command}. Return code of {rtn}".format(
-                    command=cmd, rtn=started_apps.returncode), 'ERROR')
+        commons.print_msg(CloudFoundry.clazz, method, 'end')
 
-                get_started_apps_failed = True
+    def _get_started_apps(self, force_deploy=False, rollback=False):
+        method = '_get_started_apps'
+        commons.print_msg(CloudFoundry.clazz, method, 'begin')
 
-        except TimeoutExpired:
-            commons.print_msg(CloudFoundry.clazz, method, "Timed out calling {}".format(cmd), 'ERROR')
-            get_started_apps_failed = True
+        if CloudFoundry.inventory is None:
+            self._load_inventory()
 
-        if get_started_apps_failed:
-            started_apps.kill()
-            # started_apps.communicate()
+        CloudFoundry.started_apps = CloudFoundry.inventory.app_lines('started')
+
+        if self._check_started_apps(method, force_deploy, rollback):
             os.system('stty sane')
             self._cf_logout()
             exit(1)
 
         commons.print_msg(CloudFoundry.clazz, method, 'end')
 
+    def _check_started_apps(self, method, force_deploy, rollback):
+        # whether the version being deployed is already running, which rules out a zero-downtime deploy
+        already_started = False
+
+        for line in CloudFoundry.started_apps.splitlines():
+            commons.print_msg(CloudFoundry.clazz, method, "Started App: {}".format(line.decode('utf-8')))
+            version_to_look_for = "{proj}-{ver}".format(proj=self.config.project_name,
+                                                        ver=self.config.version_number)
+
+            if line.decode('utf-8') == version_to_look_for and not force_deploy and not rollback:
+                commons.print_msg(CloudFoundry.clazz, method, "App version {} already exists and is running. "
+                                                             "Cannot perform zero-downtime deployment.  To "
+                                                             "override, set force flag = 'true'".format(
+                    version_to_look_for), 'ERROR')
+                already_started = True
+
+            elif line.decode('utf-8') == version_to_look_for and force_deploy:
+                commons.print_msg(CloudFoundry.clazz, method, "Already found {} but force_deploy turned on. "
+                                                             "Continuing with deployment.  Downtime will occur "
+                                                             "during deployment.".format(version_to_look_for))
+
+        return already_started
+
     def _determine_manifests(self):
         method = '_determine_manifests'
         commons.print_msg(CloudFoundry.clazz, method, 'begin')
@@ -458,30 +538,25 @@ class CloudFoundry(Cloud):
                                             varsfile=varsfile)
 
         commons.print_msg(CloudFoundry.clazz, method, cmd.split())
-        cf_push = subprocess.Popen(cmd.split(), shell=False, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        cf_push = commons.run_command(cmd.split(), CloudFoundry.clazz, method, timeout=CloudFoundry.push_timeout,
+                                      inactivity_timeout=CloudFoundry.push_inactivity_timeout)
 
         push_failed = False
 
-        while cf_push.poll() is None:
-            line = cf_push.stdout.readline().decode('utf-8').strip(' \r\n')
-            commons.print_msg(CloudFoundry.clazz, method, line)
-
-        try:
-            cf_push.communicate(timeout=300)
-
-            if cf_push.returncode != 0:
-                commons.print_msg(CloudFoundry.clazz, method, "Failed calling {command}.  Return code of {rtn}."
-                                  .format(command=cmd,
-                                         rtn=cf_push.returncode),
-                                  'ERROR')
-                push_failed = True
-
-        except TimeoutExpired:
+        if cf_push.timed_out is not None:
             commons.print_msg(CloudFoundry.clazz, method, "Timed out calling {}".format(cmd), 'ERROR')
             push_failed = True
+        elif cf_push.returncode != 0:
+            commons.print_msg(CloudFoundry.clazz, method, "Failed calling {command}.  Return code of {rtn}."
+                              .format(command=cmd,
+                                      rtn=cf_push.returncode),
+                              'ERROR')
+            push_failed = True
+
+        if CloudFoundry.inventory is not None:
+            CloudFoundry.inventory.add_pushed_app(new_app_name)
 
         if push_failed:
-            os.system('stty sane')
             if delete_on_fail:
                 commons.print_msg(CloudFoundry.clazz, method, 'Deleting failed deployment {app}'.format(app=new_app_name))
                 self._start_stop_delete_app(new_app_name, 'delete')
@@ -490,103 +565,120 @@ class CloudFoundry(Cloud):
 
         commons.print_msg(CloudFoundry.clazz, method, 'end')
 
-    # noinspection PyUnboundLocalVariable
     def _stop_old_app_servers(self):
         method = '_stop_old_app_servers'
         commons.print_msg(CloudFoundry.clazz, method, 'begin')
 
-        stop_old_apps_failed = False
+        version_to_look_for = self.config.project_name + '-' + self.config.version_number
+        tasks = []
 
         for line in CloudFoundry.started_apps.splitlines():
-            version_to_look_for = self.config.project_name+'-'+self.config.version_number
-
             if line.decode("utf-8") != version_to_look_for:
-                commons.print_msg(CloudFoundry.clazz, method, "Scaling down {}".format(line.decode("utf-8")))
+                tasks.append((line.decode("utf-8"), functools.partial(self._scale_down_and_stop_app,
+                                                                      line.decode("utf-8"))))
+            else:
+                commons.print_msg(CloudFoundry.clazz, method, "Skipping scale down for {}".format(line.decode("utf-8")))
+
+        failed_apps = self._run_concurrently(tasks)
+
+        if len(failed_apps) > 0:
+            commons.print_msg(CloudFoundry.clazz, method, "Failed scaling down or stopping {}".format(
+                ', '.join(failed_apps)), 'WARN')
+            self._cf_logout()
+
+        commons.print_msg(CloudFoundry.clazz, method, 'end')
+
+    def _scale_down_and_stop_app(self, app):
+        # Returns whether scaling down or stopping app failed.
+        method = '_stop_old_app_servers'
 
-                cmd = "{path}cf scale {app} -i 1".format(path=CloudFoundry.path_to_cf,
-                                                         app=line.decode("utf-8"))
+        stop_app_failed = False
 
-                cf_scale = subprocess.Popen(cmd.split(), shell=False, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        commons.print_msg(CloudFoundry.clazz, method, "Scaling down {}".format(app))
 
-                try:
-                    cf_scale_output, errs = cf_scale.communicate(timeout=60)
+        cmd = "{path}cf scale {app} -i 1".format(path=CloudFoundry.path_to_cf, app=app)
 
-                    for scale_line in cf_scale_output.splitlines():
-                        commons.print_msg(CloudFoundry.clazz, method, scale_line.decode('utf-8'))
+        cf_scale = subprocess.Popen(cmd.split(), shell=False, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
 
-                    if cf_scale.returncode != 0:
-                        commons.print_msg(CloudFoundry.clazz, method, "Failed calling {command}. Return code of {rtn}"
-                                                                     "".format(command=cmd, rtn=cf_scale.returncode),
-                                         'WARN')
-                        stop_old_apps_failed = True
+        try:
+            cf_scale_output, errs = cf_scale.communicate(timeout=60)
 
-                except TimeoutExpired:
-                    commons.print_msg(CloudFoundry.clazz, method, "Timed out calling {}".format(cmd), 'WARN')
-                    stop_old_apps_failed = True
+            for scale_line in cf_scale_output.splitlines():
+                commons.print_msg(CloudFoundry.clazz, method, scale_line.decode('utf-8'))
 
-                stop_cmd = "{path}cf stop {project}".format(path=CloudFoundry.path_to_cf,
-                                                            project=line.decode("utf-8"))
+            if cf_scale.returncode != 0:
+                commons.print_msg(CloudFoundry.clazz, method, "Failed calling {command}. Return code of {rtn}"
+                                                             "".format(command=cmd, rtn=cf_scale.returncode),
+                                  'WARN')
+                stop_app_failed = True
+
+        except TimeoutExpired:
+            commons.print_msg(CloudFoundry.clazz, method, "Timed out calling {}".format(cmd), 'WARN')
+            cf_scale.kill()
+            stop_app_failed = True
 
-                commons.print_msg(CloudFoundry.clazz, method, stop_cmd)
-                cf_stop = subprocess.Popen(stop_cmd.split(), shell=False, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        stop_cmd = "{path}cf stop {project}".format(path=CloudFoundry.path_to_cf, project=app)
 
-                try:
-                    cf_stop_output, errs = cf_stop.communicate(timeout=60)
+        commons.print_msg(CloudFoundry.clazz, method, stop_cmd)
+        cf_stop = subprocess.Popen(stop_cmd.split(), shell=False, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
 
-                    for stop_line in cf_stop_output.splitlines():
-                        commons.print_msg(CloudFoundry.clazz, method, stop_line.decode("utf-8"))
+        try:
+            cf_stop_output, errs = cf_stop.communicate(timeout=60)
 
-                    if cf_scale.returncode != 0:
-                        commons.print_msg(CloudFoundry.clazz, method, "Failed calling {command}. Return code of {rtn}"
-                                                                     "".format(command=cmd, rtn=cf_stop.returncode),
-                                         'WARN')
-                        stop_old_apps_failed = True
+            for stop_line in cf_stop_output.splitlines():
+                commons.print_msg(CloudFoundry.clazz, method, stop_line.decode("utf-8"))
 
-                except TimeoutExpired:
-                    commons.print_msg(CloudFoundry.clazz, method, "Timed out calling".format(cmd), 'WARN')
-                    stop_old_apps_failed = True
+            if cf_stop.returncode != 0:
+                commons.print_msg(CloudFoundry.clazz, method, "Failed calling {command}. Return code of {rtn}"
+                                                             "".format(command=stop_cmd, rtn=cf_stop.returncode),
+                                  'WARN')
+                stop_app_failed = True
             else:
-                commons.print_msg(CloudFoundry.clazz, method, "Skipping scale down for {}".format(line.decode("utf-8")))
+                self._record_app_action(app, 'stop')
 
-        if stop_old_apps_failed:
+        except TimeoutExpired:
+            commons.print_msg(CloudFoundry.clazz, method, "Timed out calling {}".format(stop_cmd), 'WARN')
             cf_stop.kill()
-            # cf_stop.communicate()
-            os.system('stty sane')
-            self._cf_logout()
+            stop_app_failed = True
 
-        commons.print_msg(CloudFoundry.clazz, method, 'end')
+        return stop_app_failed
 
     def _unmap_modify_app_state_versions(self, versions_to_update, app_action):
+        # each version's routes come off before it is stopped or deleted; the versions are handled concurrently
         method = '_unmap_modify_app_state_versions'
         commons.print_msg(CloudFoundry.clazz, method, 'begin')
 
-        unmap_modify_app_state_versions = False
+        failed_versions = self._run_concurrently([(version, functools.partial(self._unmap_modify_app_state_version,
+                                                                              version, app_action))
+                                                  for version in versions_to_update])
 
-        for idx, line in enumerate(versions_to_update):
-            if CloudFoundry.cf_domain is not None:
-                existing_routes_domains_output = self._fetch_app_routes(line)
+        if len(failed_versions) > 0:
+            commons.print_msg(CloudFoundry.clazz, method, "Failed unmapping routes from {}".format(
+                ', '.join(failed_versions)), 'ERROR')
+            self._cf_logout()
+            exit(1)
 
-                if existing_routes_domains_output is not None:
-                    routes, domains = self._split_app_routes_to_list(existing_routes_domains_output)
-                    for idx, route in enumerate(routes):
+        commons.print_msg(CloudFoundry.clazz, method, 'end')
 
-                        modify_route_failed = self._modify_route_for_app(route, line, domains[idx], 'unmap')
-                        unmap_modify_app_state_versions = unmap_modify_app_state_versions or modify_route_failed
+    def _unmap_modify_app_state_version(self, version, app_action):
+        # Returns whether unmapping the routes of version failed, in which case its state is left alone.
+        unmap_failed = False
 
-                else:
-                    unmap_modify_app_state_versions = True
+        if CloudFoundry.cf_domain is not None:
+            existing_routes_domains_output = self._fetch_app_routes(version)
 
-            if unmap_modify_app_state_versions is False:
-                self._start_stop_delete_app(line, app_action)
+            if existing_routes_domains_output is None:
+                return True
 
-            if unmap_modify_app_state_versions:
-                existing_routes_domains.kill()
-                # existing_routes.communicate()
-                os.system('stty sane')
-                self._cf_logout()
-                exit(1)
+            routes, domains = self._split_app_routes_to_list(existing_routes_domains_output)
+            for idx, route in enumerate(routes):
+                modify_route_failed = self._modify_route_for_app(route, version, domains[idx], 'unmap')
+                unmap_failed = unmap_failed or modify_route_failed
 
-        commons.print_msg(CloudFoundry.clazz, method, 'end')
+        if unmap_failed is False:
+            self._start_stop_delete_app(version, app_action)
+
+        return unmap_failed
 
     def _map_and_start_stopped_server(self):
         method = '_map_and_start_stopped_server'
@@ -603,18 +695,18 @@ class CloudFoundry(Cloud):
             previous_app, previous_routes, previous_domains = self._get_routes_domains_for_latest_in_app_list(CloudFoundry.stopped_apps.splitlines())
 
             if previous_app is not None:
-                #if no route just map a route
-                if len(previous_routes) == 0:
-                    for idx, current_route in enumerate(current_routes):
-                        modify_route_failed = self._modify_route_for_app(current_route, previous_app, current_domains[idx], 'map')
-                        map_and_start_stopped_server_failed = map_and_start_stopped_server_failed or modify_route_failed
-                        
-                else:
-                    #There may be new routes on the current version that should be added to rollback version
-                    for idx, current_route in enumerate(current_routes):
-                        if current_route not in previous_routes:
-                            modify_route_failed = self._modify_route_for_app(current_route, previous_app, current_domains[idx], 'map')
-                            map_and_start_stopped_server_failed = map_and_start_stopped_server_failed or modify_route_failed
+                #map the current version's routes the rollback version doesn't have yet (all of them if it has none)
+                tasks = [("{route}.{domain}".format(route=current_route, domain=current_domains[idx]),
+                          functools.partial(self._modify_route_for_app, current_route, previous_app,
+                                            current_domains[idx], 'map'))
+                         for idx, current_route in enumerate(current_routes) if current_route not in previous_routes]
+
+                failed_routes = self._run_concurrently(tasks)
+
+                if len(failed_routes) > 0:
+                    commons.print_msg(CloudFoundry.clazz, method, "Failed mapping {routes} to {app}".format(
+                        routes=', '.join(failed_routes), app=previous_app), 'ERROR')
+                    map_and_start_stopped_server_failed = True
             else:
                 commons.print_msg(CloudFoundry.clazz, method, 'No previous versions found, cannot roll back.', 'ERROR')
                 map_and_start_stopped_server_failed = True
@@ -686,41 +778,28 @@ class CloudFoundry(Cloud):
         cmd_array.append(CloudFoundry.cf_space)
         cmd_array.append("--skip-ssl-validation")
 
-        cf_login = subprocess.Popen(cmd_array, shell=False, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        cf_login = commons.run_command(cmd_array, CloudFoundry.clazz, method, timeout=CloudFoundry.login_timeout)
 
         login_failed = False
 
-        while cf_login.poll() is None:
-            line = cf_login.stdout.readline().decode('utf-8').strip(' \r\n')
-
-            commons.print_msg(CloudFoundry.clazz, method, line)
-
-            if 'credentials were rejected' in line.lower():
-                commons.print_msg(CloudFoundry.clazz, method, "Make sure that your credentials are correct for {}"
-                                  .format(CloudFoundry.cf_user), 'ERROR')
-                login_failed = True
-
-        try:
-            cf_login_output, errs = cf_login.communicate(timeout=120)
-
-            for line in cf_login_output.splitlines():
-                commons.print_msg(CloudFoundry.clazz, method, line.decode('utf-8'))
-
-            if cf_login.returncode != 0:
-                commons.print_msg(CloudFoundry.clazz, method, "Failed calling cf login. Return code of {rtn}. Make "
-                                                             "sure the user {usr} has proper permission to deploy.",
-                                 'ERROR')
-                login_failed = True
+        if any('credentials were rejected' in line.lower() for line in cf_login.output):
+            commons.print_msg(CloudFoundry.clazz, method, "Make sure that your credentials are correct for {}"
+                              .format(CloudFoundry.cf_user), 'ERROR')
+            login_failed = True
 
-        except TimeoutExpired:
+        if cf_login.timed_out is not None:
             commons.print_msg(CloudFoundry.clazz, method, "Timed out calling CF LOGIN.  Make sure that your "
                                                          "credentials are correct for {}".format(CloudFoundry.cf_user),
                              'ERROR')
             login_failed = True
+        elif cf_login.returncode != 0:
+            commons.print_msg(CloudFoundry.clazz, method, "Failed calling cf login. Return code of {rtn}. Make "
+                                                         "sure the user {usr} has proper permission to deploy.".format(
+                                                          rtn=cf_login.returncode, usr=CloudFoundry.cf_user),
+                             'ERROR')
+            login_failed = True
 
         if login_failed:
-            cf_login.kill()
-            os.system('stty sane')
             exit(1)
 
         commons.print_msg(CloudFoundry.clazz, method, 'end')
@@ -811,6 +890,8 @@ class CloudFoundry(Cloud):
 
         self._check_cf_version()
 
+        self._load_inventory()
+
         self._get_stopped_apps()
 
         #rollback should always be false for deployment
@@ -858,6 +939,8 @@ class CloudFoundry(Cloud):
 
         self._check_cf_version()
 
+        self._load_inventory()
+
         self._get_stopped_apps()
 
         rollback=True
@@ -0,0 +1,160 @@
+#!/usr/bin/python
+# fan_out.py
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+from flow.buildconfig import BuildConfig
+from flow.cloud.cloud_abc import Cloud
+from flow.cloud.cloudfoundry.cloudfoundry import CloudFoundry
+
+import flow.utils.commons as commons
+import flow.utils.transport as transport
+
+
+class CloudFoundryFanOut(Cloud):
+    """
+    Deploys (or rolls back) the same version to every Cloud Foundry target an environment lists, at the same time.
+
+        "cf": {
+            "policy": "quorum",
+            "domain": "apps.fake.com",
+            "targets": [
+                {"name": "east", "apiEndpoint": "api.east.fake.com", "org": "ci", "space": "production"},
+                {"name": "west", "apiEndpoint": "api.west.fake.com", "org": "ci", "space": "production"}
+            ]
+        }
+
+    Keys outside of targets are shared by every target.  The artifact is downloaded once, by the caller, into the
+    push location every target deploys from.  Each target is deployed by its own process, with its own CF_HOME so
+    the cf cli logins don't overwrite each other, by the driver create_driver returns.  A policy of "all" (the
+    default) fails the deploy when any target fails, "quorum" only when half or more of them do.
+    """
+    clazz = 'CloudFoundryFanOut'
+    policies = ['all', 'quorum']
+    config = BuildConfig
+
+    def __init__(self, create_driver=CloudFoundry, config_override=None):
+        method = '__init__'
+        commons.print_msg(CloudFoundryFanOut.clazz, method, 'begin')
+
+        if config_override is not None:
+            self.config = config_override
+
+        self.create_driver = create_driver
+
+        commons.print_msg(CloudFoundryFanOut.clazz, method, 'end')
+
+    def _get_targets(self):
+        # (name, cf config) of every target, the shared keys overlaid with the target's own
+        method = '_get_targets'
+
+        cf_config = self.config.build_env_info['cf']
+        shared = {key: value for key, value in cf_config.items() if key not in ['targets', 'policy']}
+        targets = []
+
+        for target in cf_config['targets']:
+            target_config = dict(shared, **target)
+            name = target_config.pop('name', None) or "{api}/{org}/{space}".format(
+                api=target_config.get('apiEndpoint'), org=target_config.get('org'), space=target_config.get('space'))
+
+            if name in [existing for existing, _ in targets]:
+                commons.print_msg(CloudFoundryFanOut.clazz, method, "Cloud Foundry target {} is listed more than "
+                                                                    "once".format(name), 'ERROR')
+                exit(1)
+
+            targets.append((name, target_config))
+
+        if len(targets) == 0:
+            commons.print_msg(CloudFoundryFanOut.clazz, method, 'The cf targets list is empty', 'ERROR')
+            exit(1)
+
+        return targets
+
+    def _get_policy(self):
+        method = '_get_policy'
+
+        policy = str(self.config.build_env_info['cf'].get('policy', 'all')).lower()
+
+        if policy not in CloudFoundryFanOut.policies:
+            commons.print_msg(CloudFoundryFanOut.clazz, method, "Cloud Foundry target policy was {policy}: it must "
+                                                                "be one of {policies}".format(
+                                                                 policy=policy,
+                                                                 policies=', '.join(CloudFoundryFanOut.policies)),
+                              'ERROR')
+            exit(1)
+
+        return policy
+
+    def _run_target(self, name, target_config, cf_home, action, kwargs):
+        # runs in the target's own process, so the class level state of the driver is the target's alone
+        os.environ['CF_HOME'] = cf_home
+        transport.forget_sessions()
+        self.config.build_env_info = dict(self.config.build_env_info, cf=target_config)
+
+        commons.print_msg(CloudFoundryFanOut.clazz, action, "Starting {action} to {name}".format(action=action,
+                                                                                                name=name))
+        getattr(self.create_driver(), action)(**kwargs)
+
+    def _fan_out(self, action, **kwargs):
+        method = action
+        commons.print_msg(CloudFoundryFanOut.clazz, method, 'begin')
+
+        targets = self._get_targets()
+        policy = self._get_policy()
+
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            commons.print_msg(CloudFoundryFanOut.clazz, method, 'Deploying to multiple Cloud Foundry targets needs '
+                                                                'a platform that can fork', 'ERROR')
+            exit(1)
+
+        # every target pushes with the same cli, so it is downloaded once before the targets start
+        self.download_cf_cli()
+
+        context = multiprocessing.get_context('fork')
+        processes = []
+
+        for name, target_config in targets:
+            cf_home = tempfile.mkdtemp(prefix='cf-home-')
+            process = context.Process(target=self._run_target, args=(name, target_config, cf_home, action, kwargs),
+                                      name=name)
+            process.start()
+            processes.append((name, process, cf_home))
+
+        failed_targets = []
+
+        for name, process, cf_home in processes:
+            process.join()
+            shutil.rmtree(cf_home, ignore_errors=True)
+
+            if process.exitcode == 0:
+                commons.print_msg(CloudFoundryFanOut.clazz, method, "{name}: SUCCEEDED".format(name=name))
+            else:
+                commons.print_msg(CloudFoundryFanOut.clazz, method, "{name}: FAILED with exit code {rtn}".format(
+                    name=name, rtn=process.exitcode), 'WARN')
+                failed_targets.append(name)
+
+        succeeded = len(targets) - len(failed_targets)
+        commons.print_msg(CloudFoundryFanOut.clazz, method, "{succeeded} of {total} Cloud Foundry targets "
+                                                            "succeeded".format(succeeded=succeeded,
+                                                                               total=len(targets)))
+
+        if (policy == 'all' and len(failed_targets) > 0) or (policy == 'quorum' and succeeded * 2 <= len(targets)):
+            commons.print_msg(CloudFoundryFanOut.clazz, method, "Failed the {policy} policy. Failed targets: "
+                                                                "{targets}".format(policy=policy,
+                                                                                   targets=', '.join(failed_targets)),
+                              'ERROR')
+            exit(1)
+
+        commons.print_msg(CloudFoundryFanOut.clazz, method, 'end')
+
+    def download_cf_cli(self):
+        CloudFoundry(self.config).download_cf_cli()
+
+    def deploy(self, force_deploy=False, manifest=None, delete_on_fail=False):
+        self._fan_out('deploy', force_deploy=force_deploy, manifest=manifest, delete_on_fail=delete_on_fail)
+
+    def rollback_to_previous(self):
+        self._fan_out('rollback_to_previous')
@@ -0,0 +1,198 @@
+#!/usr/bin/python
+# cloud_controller.py
+
+import threading
+import time
+
+import requests
+
+import flow.utils.commons as commons
+import flow.utils.transport as transport
+
+
+class CloudControllerException(Exception):
+    pass
+
+
+class CloudControllerClient:
+    """
+    Client for the Cloud Foundry cloud controller v3 api.
+
+    Requests go through the shared pooled transport.  The UAA access token is fetched with the password grant
+    the cf cli uses, cached per api endpoint and user for every client in the process, refreshed shortly before
+    it expires and once more if the cloud controller rejects it anyway.
+    """
+    clazz = 'CloudControllerClient'
+    tokens = {}
+    tokens_lock = threading.Lock()
+    token_margin = 60
+    job_poll_interval = 1
+
+    def __init__(self, api_endpoint, user, password, timeout=30, verify=True):
+        if not api_endpoint.startswith('http://') and not api_endpoint.startswith('https://'):
+            api_endpoint = 'https://' + api_endpoint
+
+        self.api_url = api_endpoint.rstrip('/')
+        self.user = user
+        self.password = password
+        self.timeout = timeout
+        self.verify = verify
+        self.root = None
+
+    def _get_root(self):
+        if self.root is None:
+            resp = transport.get(self.api_url + '/', timeout=self.timeout, verify=self.verify)
+            if resp.status_code != 200:
+                raise CloudControllerException("Could not read {url}. {status} {text}".format(
+                    url=self.api_url, status=resp.status_code, text=resp.text))
+            self.root = resp.json()
+
+        return self.root
+
+    def get_api_version(self):
+        return self._get_root()['links']['cloud_controller_v3']['meta']['version']
+
+    def _get_token(self, refresh=False):
+        method = '_get_token'
+        key = (self.api_url, self.user)
+
+        with CloudControllerClient.tokens_lock:
+            token = CloudControllerClient.tokens.get(key)
+
+            if token is not None and not refresh and token['expires'] > time.time():
+                return token['access_token']
+
+            links = self._get_root()['links']
+            uaa_url = (links.get('login') or links['uaa'])['href'].rstrip('/')
+
+            commons.print_msg(CloudControllerClient.clazz, method, "Requesting a token from {}".format(uaa_url))
+
+            # the cf cli's public client
+            resp = transport.post(uaa_url + '/oauth/token',
+                                  data={'grant_type': 'password', 'username': self.user, 'password': self.password},
+                                  auth=('cf', ''),
+                                  headers={'Accept': 'application/json'},
+                                  timeout=self.timeout,
+                                  verify=self.verify)
+
+            if resp.status_code != 200:
+                raise CloudControllerException("Make sure that your credentials are correct for {usr}. {status} "
+                                               "{text}".format(usr=self.user, status=resp.status_code, text=resp.text))
+
+            token = resp.json()
+            CloudControllerClient.tokens[key] = {
+                'access_token': token['access_token'],
+                'expires': time.time() + int(token.get('expires_in', 0)) - CloudControllerClient.token_margin
+            }
+
+            return token['access_token']
+
+    def request(self, http_method, path, **kwargs):
+        # path is either relative to the api url or a full url, like the pagination and job links
+        url = path if path.startswith('http') else self.api_url + path
+
+        for refresh in (False, True):
+            headers = {'Authorization': 'bearer ' + self._get_token(refresh), 'Accept': 'application/json'}
+
+            try:
+                resp = transport.request(http_method, url, headers=headers, timeout=self.timeout, verify=self.verify,
+                                         **kwargs)
+            except requests.ConnectionError as e:
+                raise CloudControllerException("Request to {url} failed. {err}".format(url=url, err=e))
+
+            if resp.status_code != 401:
+                break
+
+        # noinspection PyUnboundLocalVariable
+        if resp.status_code >= 400:
+            raise CloudControllerException("{method} {url} failed. {status} {text}".format(
+                method=http_method, url=url, status=resp.status_code, text=resp.text))
+
+        return resp
+
+    def get_all(self, path, params=None):
+        # every resource of a paginated listing, plus anything it included (by type, then guid)
+        resources = []
+        included = {}
+        params = dict(params or {})
+        params.setdefault('per_page', 5000)
+
+        while path is not None:
+            page = self.request('GET', path, params=params).json()
+            resources.extend(page.get('resources', []))
+
+            for resource_type, items in page.get('included', {}).items():
+                included.setdefault(resource_type, {}).update({item['guid']: item for item in items})
+
+            next_page = page.get('pagination', {}).get('next')
+            path = next_page['href'] if next_page else None
+            # the next link already carries the query
+            params = None
+
+        return resources, included
+
+    def wait_for_job(self, resp, max_wait=300):
+        # asynchronous operations answer 202 with the job in the Location header
+        if resp.status_code != 202 or resp.headers.get('Location') is None:
+            return
+
+        deadline = time.time() + max_wait
+
+        while time.time() < deadline:
+            job = self.request('GET', resp.headers['Location']).json()
+
+            if job['state'] == 'COMPLETE':
+                return
+            if job['state'] == 'FAILED':
+                raise CloudControllerException("Job {op} failed. {errors}".format(op=job.get('operation'),
+                                                                                 errors=job.get('errors')))
+
+            time.sleep(CloudControllerClient.job_poll_interval)
+
+        raise CloudControllerException("Timed out waiting for job {}".format(resp.headers['Location']))
+
+    def get_space_guid(self, org, space):
+        orgs, _ = self.get_all('/v3/organizations', {'names': org})
+        if len(orgs) == 0:
+            raise CloudControllerException("Org {} not found".format(org))
+
+        spaces, _ = self.get_all('/v3/spaces', {'names': space, 'organization_guids': orgs[0]['guid']})
+        if len(spaces) == 0:
+            raise CloudControllerException("Space {space} not found in org {org}".format(space=space, org=org))
+
+        return spaces[0]['guid']
+
+    def list_apps(self, space_guid):
+        apps, _ = self.get_all('/v3/apps', {'space_guids': space_guid})
+
+        return apps
+
+    def list_routes(self, space_guid):
+        # routes with their domain name filled in as route['domain_name']
+        routes, included = self.get_all('/v3/routes', {'space_guids': space_guid, 'include': 'domain'})
+        domains = included.get('domains', {})
+
+        for route in routes:
+            domain_guid = route['relationships']['domain']['data']['guid']
+            route['domain_name'] = domains.get(domain_guid, {}).get('name')
+
+        return routes
+
+    def scale_app(self, app_guid, instances):
+        self.request('POST', "/v3/apps/{}/processes/web/actions/scale".format(app_guid),
+                     json={'instances': instances})
+
+    def app_action(self, app_guid, action):
+        # start or stop
+        return self.request('POST', "/v3/apps/{guid}/actions/{action}".format(guid=app_guid, action=action)).json()
+
+    def delete_app(self, app_guid):
+        self.wait_for_job(self.request('DELETE', "/v3/apps/{}".format(app_guid)))
+
+    def map_route(self, route_guid, app_guid):
+        return self.request('POST', "/v3/routes/{}/destinations".format(route_guid),
+                            json={'destinations': [{'app': {'guid': app_guid}}]}).json()
+
+    def unmap_route(self, route_guid, destination_guid):
+        self.request('DELETE', "/v3/routes/{route}/destinations/{destination}".format(route=route_guid,
+                                                                                       destination=destination_guid))
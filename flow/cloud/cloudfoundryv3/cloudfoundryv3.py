@@ -0,0 +1,269 @@
+#!/usr/bin/python
+# cloudfoundryv3.py
+
+from flow.cloud.cloudfoundry.app_inventory import AppInventory
+from flow.cloud.cloudfoundry.cloudfoundry import CloudFoundry
+from flow.cloud.cloudfoundryv3.cloud_controller import CloudControllerClient
+from flow.cloud.cloudfoundryv3.cloud_controller import CloudControllerException
+
+import flow.utils.commons as commons
+
+
+class CloudFoundryV3(CloudFoundry):
+    """
+    Cloud Foundry deployments that read and change app and route state through the cloud controller v3 api
+    instead of a cf cli process (and grep/awk pipeline) per step.  Only cf push, which stages the app from the
+    manifest, still goes through the cli, so a rollback never needs the cli at all.
+    """
+    clazz = 'CloudFoundryV3'
+    client = None
+    space_guid = None
+    cli_logged_in = False
+    # the concurrent steps are api calls, which share no cli state
+    parallel_operations = 4
+
+    def _exit_on_api_error(self, method, error):
+        commons.print_msg(CloudFoundryV3.clazz, method, "Cloud controller request failed. {}".format(error), 'ERROR')
+        self._cf_logout()
+        exit(1)
+
+    def _cf_login_check(self):
+        method = '_cf_login_check'
+        commons.print_msg(CloudFoundryV3.clazz, method, 'begin')
+
+        skip_ssl_validation = commons.get_setting(self.config.settings, 'cloudfoundry', 'skip_ssl_validation',
+                                                  'CF_SKIP_SSL_VALIDATION')
+        verify = skip_ssl_validation is None or skip_ssl_validation.lower() not in ['yes', 'true', 'y']
+
+        CloudFoundryV3.client = CloudControllerClient(CloudFoundry.cf_api_endpoint, CloudFoundry.cf_user,
+                                                      CloudFoundry.cf_pwd, timeout=self.http_timeout, verify=verify)
+
+        try:
+            CloudFoundryV3.space_guid = CloudFoundryV3.client.get_space_guid(CloudFoundry.cf_org,
+                                                                             CloudFoundry.cf_space)
+        except CloudControllerException as e:
+            self._exit_on_api_error(method, e)
+
+        commons.print_msg(CloudFoundryV3.clazz, method, "Targeting org {org} space {space} ({guid})".format(
+            org=CloudFoundry.cf_org, space=CloudFoundry.cf_space, guid=CloudFoundryV3.space_guid))
+
+        commons.print_msg(CloudFoundryV3.clazz, method, 'end')
+
+    def _cf_login(self):
+        # the cli is only logged in for cf push
+        super()._cf_login()
+        CloudFoundryV3.cli_logged_in = True
+
+    def _cf_logout(self):
+        if CloudFoundryV3.cli_logged_in:
+            CloudFoundryV3.cli_logged_in = False
+            super()._cf_logout()
+
+    def _check_cf_version(self):
+        method = '_check_cf_version'
+
+        try:
+            commons.print_msg(CloudFoundryV3.clazz, method, "Cloud controller v3 api version {}".format(
+                CloudFoundryV3.client.get_api_version()))
+        except (CloudControllerException, KeyError) as e:
+            commons.print_msg(CloudFoundryV3.clazz, method, "Could not read the cloud controller version. {}".format(
+                e), 'WARN')
+
+    def _load_inventory(self):
+        method = '_load_inventory'
+        commons.print_msg(CloudFoundryV3.clazz, method, 'begin')
+
+        try:
+            apps = CloudFoundryV3.client.list_apps(CloudFoundryV3.space_guid)
+            routes = CloudFoundryV3.client.list_routes(CloudFoundryV3.space_guid)
+        except CloudControllerException as e:
+            self._exit_on_api_error(method, e)
+
+        inventory = AppInventory(self.config.project_name)
+        names = {}
+
+        # noinspection PyUnboundLocalVariable
+        for app in apps:
+            if inventory.is_project_app(app['name']):
+                inventory.add_app(app['name'], app['state'], guid=app['guid'], routes=[])
+                names[app['guid']] = app['name']
+
+        # every route is kept, including the ones no version is mapped to yet, so mapping them needs no lookup
+        # noinspection PyUnboundLocalVariable
+        for route in routes:
+            inventory.add_route(route['host'], route['domain_name'],
+                                {names[destination['app']['guid']]: destination['guid']
+                                 for destination in route['destinations'] if destination['app']['guid'] in names},
+                                guid=route['guid'])
+
+        CloudFoundry.inventory = inventory
+
+        commons.print_msg(CloudFoundryV3.clazz, method, "Found {count} versions of {proj}".format(
+            count=len(inventory.apps), proj=self.config.project_name))
+
+        commons.print_msg(CloudFoundryV3.clazz, method, 'end')
+
+    def _get_app_guid(self, name):
+        if CloudFoundry.inventory is not None and CloudFoundry.inventory.apps.get(name, {}).get('guid') is not None:
+            return CloudFoundry.inventory.apps[name]['guid']
+
+        apps, _ = CloudFoundryV3.client.get_all('/v3/apps', {'names': name, 'space_guids': CloudFoundryV3.space_guid})
+
+        if len(apps) == 0:
+            raise CloudControllerException("App {} not found".format(name))
+
+        if CloudFoundry.inventory is not None and name in CloudFoundry.inventory.apps:
+            CloudFoundry.inventory.apps[name]['guid'] = apps[0]['guid']
+
+        return apps[0]['guid']
+
+    def _get_route(self, host, domain, cached=True):
+        # guid of host.domain and its destinations, as app guid -> destination guid
+        inventory = CloudFoundry.inventory
+
+        if cached and inventory is not None and inventory.routes.get((host, domain), {}).get('guid') is not None:
+            route = inventory.routes[(host, domain)]
+            return route['guid'], {inventory.apps[name]['guid']: destination
+                                   for name, destination in route['destinations'].items() if name in inventory.apps}
+
+        routes = [candidate for candidate in CloudFoundryV3.client.list_routes(CloudFoundryV3.space_guid)
+                  if candidate['host'] == host and candidate['domain_name'] == domain]
+
+        if len(routes) == 0:
+            raise CloudControllerException("Route {route}.{domain} not found".format(route=host, domain=domain))
+
+        return routes[0]['guid'], {destination['app']['guid']: destination['guid']
+                                   for destination in routes[0]['destinations']}
+
+    def _fetch_app_routes_from_cf(self, method, appName):
+        try:
+            app_guid = self._get_app_guid(appName)
+            routes, included = CloudFoundryV3.client.get_all('/v3/routes', {'app_guids': app_guid,
+                                                                            'include': 'domain'})
+        except CloudControllerException as e:
+            commons.print_msg(CloudFoundryV3.clazz, method, "Failed reading routes of {app}. {err}".format(
+                app=appName, err=e), 'ERROR')
+            return None
+
+        domains = included.get('domains', {})
+        lines = ["{host} {domain}".format(host=route['host'],
+                                          domain=domains[route['relationships']['domain']['data']['guid']]['name'])
+                 for route in routes]
+
+        return '\n'.join(lines).encode('utf-8')
+
+    def _modify_route_for_app(self, route, app, domain, route_action):
+        method = '_modify_route_for_app'
+        commons.print_msg(CloudFoundryV3.clazz, method, 'begin')
+
+        if route_action != 'map' and route_action != 'unmap':
+            commons.print_msg(CloudFoundryV3.clazz, method, "Modify route action was {action} it must be either "
+                                                            "\"map\" or \"unmap\"".format(action=route_action),
+                              'ERROR')
+            exit(1)
+
+        commons.print_msg(CloudFoundryV3.clazz, method, "{action}ing route {route} to {app}".format(
+            action=route_action, route=route, app=app))
+
+        try:
+            app_guid = self._get_app_guid(app)
+            route_guid, destinations = self._get_route(route, domain)
+
+            if route_action == 'map':
+                mapped = CloudFoundryV3.client.map_route(route_guid, app_guid)['destinations']
+
+                if CloudFoundry.inventory is not None:
+                    with CloudFoundry.inventory_lock:
+                        CloudFoundry.inventory.routes.setdefault((route, domain), {'guid': route_guid,
+                                                                                   'destinations': {}})
+                    self._record_route_action(route, app, domain, route_action, next(
+                        (destination['guid'] for destination in mapped if destination['app']['guid'] == app_guid),
+                        None))
+            else:
+                if destinations.get(app_guid) is None:
+                    # mapped after the inventory was taken, without the destination being known
+                    route_guid, destinations = self._get_route(route, domain, cached=False)
+
+                if destinations.get(app_guid) is not None:
+                    CloudFoundryV3.client.unmap_route(route_guid, destinations[app_guid])
+
+                self._record_route_action(route, app, domain, route_action)
+
+        except CloudControllerException as e:
+            commons.print_msg(CloudFoundryV3.clazz, method, "Failed to {action} route {route}.{domain} for {app}. "
+                                                            "{err}".format(action=route_action, route=route,
+                                                                           domain=domain, app=app, err=e), 'ERROR')
+            return True
+
+        commons.print_msg(CloudFoundryV3.clazz, method, 'end')
+        return False
+
+    def _start_stop_delete_app(self, app, app_action):
+        method = '_start_stop_delete_app'
+        commons.print_msg(CloudFoundryV3.clazz, method, 'begin')
+
+        if app_action != 'start' and app_action != 'stop' and app_action != 'delete':
+            commons.print_msg(CloudFoundryV3.clazz, method, "App action was {action}: it must be either "
+                                                            "\"start\", \"stop\" or \"delete\"".format(
+                                                             action=app_action), 'ERROR')
+            exit(1)
+
+        commons.print_msg(CloudFoundryV3.clazz, method, "{action} {app}".format(action=app_action, app=app))
+
+        try:
+            app_guid = self._get_app_guid(app)
+
+            if app_action == 'delete':
+                CloudFoundryV3.client.delete_app(app_guid)
+            else:
+                CloudFoundryV3.client.app_action(app_guid, app_action)
+
+            self._record_app_action(app, app_action)
+        except CloudControllerException as e:
+            commons.print_msg(CloudFoundryV3.clazz, method, "Failed to {action} {app}. {err}".format(
+                action=app_action, app=app, err=e), 'ERROR')
+            return True
+
+        commons.print_msg(CloudFoundryV3.clazz, method, 'end')
+        return False
+
+    def _scale_down_and_stop_app(self, app):
+        method = '_stop_old_app_servers'
+
+        commons.print_msg(CloudFoundryV3.clazz, method, "Scaling down and stopping {}".format(app))
+
+        try:
+            app_guid = self._get_app_guid(app)
+            CloudFoundryV3.client.scale_app(app_guid, 1)
+            CloudFoundryV3.client.app_action(app_guid, 'stop')
+        except CloudControllerException as e:
+            commons.print_msg(CloudFoundryV3.clazz, method, "Failed to stop {app}. {err}".format(app=app, err=e),
+                              'WARN')
+            return True
+
+        self._record_app_action(app, 'stop')
+        return False
+
+    def rollback_to_previous(self):
+        method = 'rollback_to_previous'
+        commons.print_msg(CloudFoundryV3.clazz, method, 'begin')
+
+        self._verify_required_attributes()
+
+        self._cf_login_check()
+
+        self._check_cf_version()
+
+        self._load_inventory()
+
+        self._get_stopped_apps()
+
+        self._get_started_apps(force_deploy=False, rollback=True)
+
+        self._map_and_start_stopped_server()
+        started_versions = [line.decode("utf-8") for line in CloudFoundry.started_apps.splitlines()]
+        self._unmap_modify_app_state_versions(started_versions, 'stop')
+
+        commons.print_msg(CloudFoundryV3.clazz, method, 'DEPLOYMENT SUCCESSFUL')
+
+        commons.print_msg(CloudFoundryV3.clazz, method, 'end')
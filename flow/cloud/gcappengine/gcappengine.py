@@ -5,8 +5,6 @@ import tarfile
 import urllib.request
 import ssl
 
-from subprocess import TimeoutExpired
-
 from flow.buildconfig import BuildConfig
 from flow.cloud.cloud_abc import Cloud
 
@@ -18,6 +16,10 @@ class GCAppEngine(Cloud):
     clazz = 'GCAppEngine'
     config = BuildConfig
     path_to_google_sdk = None
+    login_timeout = 120
+    # seconds gcloud app deploy may run in total, and without printing anything
+    deploy_timeout = 1800
+    deploy_inactivity_timeout = 600
 
     def __init__(self, config_override=None):
         method = '__init__'
@@ -96,39 +98,20 @@ class GCAppEngine(Cloud):
             path=GCAppEngine.path_to_google_sdk,
             keyfile='gcloud.json')
 
-        gcloud_login = subprocess.Popen(cmd.split(), shell=False, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        gcloud_login = commons.run_command(cmd.split(), GCAppEngine.clazz, method, timeout=GCAppEngine.login_timeout)
 
         login_failed = False
 
-        while gcloud_login.poll() is None:
-            line = gcloud_login.stdout.readline().decode('utf-8').strip(' \r\n')
-
-            commons.print_msg(GCAppEngine.clazz, method, line)
-
-            # if 'credentials were rejected' in line.lower():
-            #     commons.print_msg(GCAppEngine.clazz, method, "Make sure that your credentials are correct for {"
-            #                                                  "}".format(CloudFoundry.cf_user), 'ERROR')
-            #     login_failed = True
-
-        try:
-            gcloud_login_output, errs = gcloud_login.communicate(timeout=120)
-
-            for line in gcloud_login_output.splitlines():
-                commons.print_msg(GCAppEngine.clazz, method, line.decode('utf-8'))
-
-            if gcloud_login.returncode != 0:
-                commons.print_msg(GCAppEngine.clazz, method, "Failed calling cloud auth. Return code of {}. Make "
-                                                             "sure the user has proper permission to deploy.".format(
-                                                                gcloud_login.returncode), 'ERROR')
-                login_failed = True
-
-        except TimeoutExpired:
+        if gcloud_login.timed_out is not None:
             commons.print_msg(GCAppEngine.clazz, method, "Timed out calling GCLOUD AUTH.", 'ERROR')
             login_failed = True
+        elif gcloud_login.returncode != 0:
+            commons.print_msg(GCAppEngine.clazz, method, "Failed calling cloud auth. Return code of {}. Make "
+                                                         "sure the user has proper permission to deploy.".format(
+                                                            gcloud_login.returncode), 'ERROR')
+            login_failed = True
 
         if login_failed:
-            gcloud_login.kill()
-            os.system('stty sane')
             exit(1)
 
         commons.print_msg(GCAppEngine.clazz, method, 'end')
@@ -172,31 +155,23 @@ class GCAppEngine(Cloud):
 
         commons.print_msg(GCAppEngine.clazz, method, cmd)
 
-        gcloud_app_deploy = subprocess.Popen(cmd.split(), shell=False, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        gcloud_app_deploy = commons.run_command(cmd.split(), GCAppEngine.clazz, method,
+                                                timeout=GCAppEngine.deploy_timeout,
+                                                inactivity_timeout=GCAppEngine.deploy_inactivity_timeout)
 
         deploy_failed = False
 
-        while gcloud_app_deploy.poll() is None:
-            line = gcloud_app_deploy.stdout.readline().decode('utf-8').strip(' \r\n')
-            commons.print_msg(GCAppEngine.clazz, method, line)
-
-        try:
-            gcloud_app_deploy.communicate(timeout=300)
-
-            if gcloud_app_deploy.returncode != 0:
-                commons.print_msg(GCAppEngine.clazz, method, "Failed calling {command}.  Return code of {rtn}."
-                                  .format(command=cmd,
-                                         rtn=gcloud_app_deploy.returncode),
-                                 'ERROR')
-                deploy_failed = True
-
-        except TimeoutExpired:
+        if gcloud_app_deploy.timed_out is not None:
             commons.print_msg(GCAppEngine.clazz, method, "Timed out calling {}".format(cmd), 'ERROR')
             deploy_failed = True
+        elif gcloud_app_deploy.returncode != 0:
+            commons.print_msg(GCAppEngine.clazz, method, "Failed calling {command}.  Return code of {rtn}."
+                              .format(command=cmd,
+                                      rtn=gcloud_app_deploy.returncode),
+                              'ERROR')
+            deploy_failed = True
 
         if deploy_failed:
-            os.system('stty sane')
-            # self._cf_logout()
             exit(1)
 
         commons.print_msg(GCAppEngine.clazz, method, 'end')
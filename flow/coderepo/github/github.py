@@ -9,13 +9,21 @@ import subprocess
 import tarfile
 import time
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
 from flow.buildconfig import BuildConfig
 from flow.coderepo.code_repo_abc import Code_Repo
+from flow.coderepo.github.github_cache import GitHubCache
+from flow.coderepo.github.github_rate_limit import GitHubRateLimiter
+from flow.coderepo.github.indexes import CommitIndex
+from flow.coderepo.github.indexes import TagIndex
+from flow.coderepo.github.indexes import VersionIndex
+from flow.coderepo.localgit.localgit import LocalGit
 
 import flow.utils.commons as cicommons
 import flow.utils.commons as commons
+import flow.utils.transport as transport
 from flow.utils.commons import Object
 
 
@@ -31,6 +39,14 @@ class GitHub(Code_Repo):
     all_tags_and_shas = []
     all_commits = []
     found_all_commits = False
+    found_all_tags = False
+    page_cache = None
+    local_git = None
+    local_git_checked = False
+    rate_limiters = {}
+    version_index = None
+    tag_index = None
+    commit_index = None
 
     def __init__(self, config_override=None, verify_repo=True):
         method = '__init__'
@@ -111,7 +127,7 @@ class GitHub(Code_Repo):
         finished = False
         while not finished:
             try:
-                resp = requests.get(repo_url, headers=headers, timeout=self.http_timeout)
+                resp = self._github_request('GET', repo_url, headers=headers, timeout=self.http_timeout)
                 finished = True
             except requests.ConnectionError:
                 commons.print_msg(GitHub.clazz, method, "Request to GitHub timed out, retrying...")
@@ -192,7 +208,7 @@ class GitHub(Code_Repo):
             headers = {'Content-type': cicommons.content_json, 'Accept': cicommons.content_json}
 
         try:
-            resp = requests.post(release_url, tag_and_release_note_payload, headers=headers, params=url_params, timeout=self.http_timeout)
+            resp = self._github_request('POST', release_url, data=tag_and_release_note_payload, headers=headers, params=url_params, timeout=self.http_timeout)
         except requests.ConnectionError:
             commons.print_msg(GitHub.clazz, method, 'Request to GitHub timed out.', 'ERROR')
             exit(1)
@@ -253,7 +269,7 @@ class GitHub(Code_Repo):
         headers = {'Content-type': cicommons.content_json, 'Accept': cicommons.content_json, 'Authorization': ('token ' + self.token)}
 
         try:
-            resp = requests.get(release_url_api, headers=headers, timeout=self.http_timeout)
+            resp = self._github_request('GET', release_url_api, headers=headers, timeout=self.http_timeout)
         except requests.ConnectionError:
             commons.print_msg(GitHub.clazz, method, 'Request to GitHub timed out.', 'ERROR')
             exit(1)
@@ -273,7 +289,7 @@ class GitHub(Code_Repo):
         }
         release_url_api = self.url + '/' + self.org + '/' + self.repo + '/releases/' + str(git_release_id)
         try:
-            requests.patch(release_url_api, json=jsonMessage, headers=headers, timeout=self.http_timeout)
+            self._github_request('PATCH', release_url_api, json=jsonMessage, headers=headers, timeout=self.http_timeout)
         except requests.ConnectionError:
             commons.print_msg(GitHub.clazz, method, 'Request to GitHub timed out.', 'ERROR')
             exit(1)
@@ -429,19 +445,12 @@ class GitHub(Code_Repo):
         if start_from_version is not None:
             return start_from_version
 
-        last_tag = None
         if self.config.artifact_category.lower() == 'release':
             tags = self.get_all_tags_and_shas_from_github(need_release=1)
-            for name, _ in tags:
-                if '+' not in name:
-                    last_tag = name
-                    break
+            last_tag = self._get_tag_index(tags).first(snapshot=False)
         else:
             tags = self.get_all_tags_and_shas_from_github(need_snapshot=1)
-            for name, _ in tags:
-                if '+' in name:
-                    last_tag = name
-                    break
+            last_tag = self._get_tag_index(tags).first(snapshot=True)
 
         commons.print_msg(GitHub.clazz, method, "last_tag is: {}".format(last_tag))
         return last_tag
@@ -450,40 +459,28 @@ class GitHub(Code_Repo):
         method = "get_git_previous_tag"
         commons.print_msg(GitHub.clazz, method, 'begin')
 
-        beginning_tag = None
+        snapshot = self.config.artifact_category.lower() != 'release'
 
-        
-        if self.config.artifact_category.lower() == 'release':
-            tags = self.get_all_tags_and_shas_from_github(need_release=2)
-        else:
+        if snapshot:
             tags = self.get_all_tags_and_shas_from_github(need_snapshot=2)
+        else:
+            tags = self.get_all_tags_and_shas_from_github(need_release=2)
+
+        tag_index = self._get_tag_index(tags)
+
         if start_from_version is None:
-            for name, _ in tags:
-                if self.config.artifact_category.lower() == 'release' and '+' not in name:
-                    beginning_tag = name
-                    break
-                elif self.config.artifact_category.lower() != 'release' and '+' in name:
-                    beginning_tag = name
-                    break
+            beginning_tag = tag_index.first(snapshot)
         else:
             beginning_tag = start_from_version
         
         commons.print_msg(GitHub.clazz, method, "starting with {}".format(beginning_tag))
         commons.print_msg(GitHub.clazz, method, "Category: " + self.config.artifact_category.lower())  
-        found_tag = False
-        for name, _ in tags:
-            if found_tag:
-                out_name = None
-                if self.config.artifact_category.lower() == 'release' and '+' not in name:
-                    out_name = name
-                elif self.config.artifact_category.lower() != 'release' and '+' in name:
-                    out_name = name
-                if out_name is not None:
-                    commons.print_msg(GitHub.clazz, method, name)
-                    commons.print_msg(GitHub.clazz, method, 'end')
-                    return out_name
-            if name == beginning_tag:
-                found_tag = True
+
+        previous_tag = tag_index.next_after(beginning_tag, snapshot)
+        if previous_tag is not None:
+            commons.print_msg(GitHub.clazz, method, previous_tag)
+            commons.print_msg(GitHub.clazz, method, 'end')
+            return previous_tag
         commons.print_msg(GitHub.clazz, method, 'tag not found, or was the first tag')
         return None
 
@@ -496,38 +493,160 @@ class GitHub(Code_Repo):
                 commons.print_msg(GitHub.clazz, method, 'All commits pulled, returning cached results')
                 return GitHub.all_commits
 
-            foundSha = False
-            for commit in GitHub.all_commits:
-                if commit['sha'] == start_from_sha:
-                    foundSha = True
-                    commons.print_msg(GitHub.clazz, method, 'The beginning sha is in our cached list')
-            if foundSha:
+            if self._get_commit_index(GitHub.all_commits).contains(start_from_sha):
+                commons.print_msg(GitHub.clazz, method, 'The beginning sha is in our cached list')
                 commons.print_msg(GitHub.clazz, method, 'Returning cached results')
                 return GitHub.all_commits
             commons.print_msg(GitHub.clazz, method, 'Beginning sha is not in our cached list, pulling more commits')
 
+        branch = self.config.build_env_info['associatedBranchName']
+
+        local_git = self._get_local_git()
+        if local_git is not None:
+            branch_sha = local_git.resolve_branch(branch)
+            local_commits = local_git.get_commits(branch_sha) if branch_sha is not None else None
+            if local_commits is not None:
+                commons.print_msg(GitHub.clazz, method, '{} total commits'.format(len(local_commits)))
+                commons.print_msg(GitHub.clazz, method, 'end')
+                GitHub.all_commits = local_commits
+                GitHub.found_all_commits = True
+                return local_commits
+            commons.print_msg(GitHub.clazz, method, 'Failed reading local history, pulling commits from github')
+
         per_page = 100
         start_page = (len(GitHub.all_commits)//per_page)+1
-        finished = False
         output = GitHub.all_commits
-        branch = self.config.build_env_info['associatedBranchName']
-            
+
         repo_url = GitHub.url + '/' + GitHub.org + '/' + GitHub.repo + '/commits?per_page=' + str(per_page) + '&page=' + str(start_page) + '&sha=' + str(branch)
-        token = GitHub.token
-        if token is not None:
+
+        def found_start_sha(_, page):
+            for commit in page:
+                if commit['sha'] == start_from_sha:
+                    commons.print_msg(GitHub.clazz, method, 'Found the beginning sha, stopping lookup')
+                    return True
+            return False
+
+        if self._get_github_pages(method, repo_url, self._simplify_commits, output, found_start_sha):
+            GitHub.found_all_commits = True
+
+        self._save_page_cache()
+
+        commons.print_msg(GitHub.clazz, method, '{} total commits'.format(len(output)))
+        commons.print_msg(GitHub.clazz, method, 'end')
+
+        GitHub.all_commits = output
+
+        
+
+        return output
+
+    def _get_page_cache(self):
+        method = '_get_page_cache'
+
+        cache_dir = commons.get_setting(self.config.settings, 'github', 'cache_dir', 'GITHUB_CACHE_DIR')
+
+        if cache_dir is None:
+            return None
+
+        if GitHub.page_cache is None or GitHub.page_cache.key != GitHubCache.cache_key(GitHub.url, GitHub.org,
+                                                                                        GitHub.repo):
+            commons.print_msg(GitHub.clazz, method, "Caching github listings in {}".format(cache_dir))
+            max_entries = commons.get_int_setting(self.config.settings, 'github', 'cache_max_entries',
+                                                  'GITHUB_CACHE_MAX_ENTRIES', 1000)
+            max_age_days = commons.get_int_setting(self.config.settings, 'github', 'cache_max_age_days',
+                                                   'GITHUB_CACHE_MAX_AGE_DAYS', 30)
+            GitHub.page_cache = GitHubCache(cache_dir, GitHub.url, GitHub.org, GitHub.repo, max_entries=max_entries,
+                                            max_age_days=max_age_days)
+
+        return GitHub.page_cache
+
+    def _get_local_git(self):
+        method = '_get_local_git'
+
+        if not GitHub.local_git_checked:
+            GitHub.local_git_checked = True
+
+            use_local_git = commons.get_setting(self.config.settings, 'github', 'use_local_git', 'GITHUB_USE_LOCAL_GIT')
+
+            if use_local_git is not None and use_local_git.lower() in ['yes', 'true', 'y']:
+                local_git = LocalGit()
+                if local_git.is_clone_of(GitHub.org, GitHub.repo) and local_git.fetch_tags():
+                    commons.print_msg(GitHub.clazz, method, 'Reading tags and commit history from the local checkout')
+                    GitHub.local_git = local_git
+                else:
+                    commons.print_msg(GitHub.clazz, method, 'No usable local checkout, falling back to the github api')
+
+        return GitHub.local_git
+
+    def _get_rate_limiter(self, resource='core'):
+        # one limiter per rate limit resource, github keeps a separate budget for each
+        if resource not in GitHub.rate_limiters:
+            pace_below = commons.get_int_setting(self.config.settings, 'github', 'rate_limit_pace_below',
+                                                 'GITHUB_RATE_LIMIT_PACE_BELOW', 100)
+            max_wait = commons.get_int_setting(self.config.settings, 'github', 'rate_limit_max_wait_seconds',
+                                               'GITHUB_RATE_LIMIT_MAX_WAIT_SECONDS', 3600)
+
+            GitHub.rate_limiters[resource] = GitHubRateLimiter(resource=resource, pace_below=pace_below,
+                                                               max_wait=max_wait)
+
+        return GitHub.rate_limiters[resource]
+
+    def _github_request(self, http_method, url, resource='core', **kwargs):
+        # Every github api call goes through here so that it is paced by, and retried after, the github rate limit
+        # of the resource it is counted against.  Connection errors are left to the callers' own retry handling.
+        method = '_github_request'
+
+        attempts = 0
+
+        while True:
+            self._get_rate_limiter(resource).before_request()
+            resp = transport.request(http_method, url, **kwargs)
+            # the response names the budget it was counted against
+            resource = resp.headers.get('X-RateLimit-Resource') or resource
+            retry_wait = self._get_rate_limiter(resource).after_response(resp)
+
+            if retry_wait is None or attempts >= 3:
+                return resp
+
+            attempts += 1
+            commons.print_msg(GitHub.clazz, method, "Rate limited by GitHub, retrying {url} in {wait} seconds".format(
+                url=url, wait=retry_wait), 'WARN')
+
+    def _save_page_cache(self):
+        if GitHub.page_cache is not None:
+            GitHub.page_cache.save()
+
+    @staticmethod
+    def _simplify_tags(tags_json):
+        return list(map(lambda obj: (obj['name'], obj['commit']['sha']), tags_json))
+
+    @staticmethod
+    def _simplify_commits(commits_json):
+        return list(map(lambda commit: {'sha': commit['sha'], 'commit': {'message': commit['commit']['message']}},
+                        commits_json))
+
+    def _get_github_page(self, method, page_url, simplify):
+        # Fetches one page of a github listing.  Returns the simplified page contents and the pagination links.
+        # If the page is in the github cache, the request is made conditional on the cached ETag so that
+        # an unchanged page comes back as a 304 and the cached copy is used without parsing anything.
+        if GitHub.token is not None:
             headers = {'Content-type': cicommons.content_json, 'Accept': cicommons.content_json,
-                        'Authorization': ('token ' + token)}
+                       'Authorization': ('token ' + GitHub.token)}
         else:
             headers = {'Content-type': cicommons.content_json, 'Accept': cicommons.content_json}
-        
-        retries = 0
 
-        while not finished:
+        page_cache = self._get_page_cache()
+        if page_cache is not None:
+            headers.update(page_cache.conditional_headers(page_url))
 
-            commons.print_msg(GitHub.clazz, method, repo_url)
+        retries = 0
+
+        while True:
+            commons.print_msg(GitHub.clazz, method, page_url)
 
             try:
-                resp = requests.get(repo_url, headers=headers, timeout=self.http_timeout)
+                resp = self._github_request('GET', page_url, headers=headers, timeout=self.http_timeout)
+                break
             except Exception as e:
                 commons.print_msg(GitHub.clazz, method, "Failed to access github location {}".format(e))
                 if retries < 2:
@@ -537,123 +656,155 @@ class GitHub(Code_Repo):
                 commons.print_msg(GitHub.clazz, method, "Failed to access github location {}".format(e), "ERROR")
                 exit(1)
 
-            retries = 0
+        if resp.status_code == 304 and page_cache is not None and page_cache.get(page_url) is not None:
+            commons.print_msg(GitHub.clazz, method, 'Page not modified, using cached results')
+            cached_page = page_cache.get(page_url)
+            # json has no tuples, so (name, sha) tag pairs come back from the cache as lists
+            simplified = [tuple(item) if isinstance(item, list) else item for item in cached_page['data']]
+            return simplified, cached_page['links']
 
-            if 'next' in resp.links:
-                repo_url = resp.links['next']['url']
-            else:
-                GitHub.found_all_commits = True
-                finished = True
+        if resp.status_code != 200:
+            commons.print_msg(GitHub.clazz, method, "Failed to access github location {url}\r\n Response: {rsp}"
+                              .format(url=page_url,
+                                      rsp=resp.text),
+                              "ERROR")
+            exit(1)
 
-            if resp.status_code != 200:
-                commons.print_msg(GitHub.clazz, method, "Failed to access github location {url}\r\n Response: {rsp}"
-                                  .format(url=repo_url,
-                                         rsp=resp.text),
-                                 "ERROR")
-                exit(1)
-            else:
-                #commons.print_msg(GitHub.clazz, method, resp.text)
-                #commons.print_msg(GitHub.clazz, method, resp.json())
-                simplified = []
-                for commit in resp.json():
-                    simplified.append({'sha': commit['sha'], 'commit': { 'message': commit['commit']['message'] } })
-                    if commit['sha'] == start_from_sha:
-                        commons.print_msg(GitHub.clazz, method, 'Found the beginning sha, stopping lookup')
-                        finished = True
+        simplified = simplify(resp.json())
+        links = {rel: link['url'] for rel, link in resp.links.items()}
+
+        if page_cache is not None:
+            page_cache.put(page_url, resp.headers.get('ETag'), resp.headers.get('Last-Modified'), links, simplified)
+
+        return simplified, links
+
+    def _get_page_concurrency(self):
+        return max(1, commons.get_int_setting(self.config.settings, 'github', 'page_concurrency',
+                                              'GITHUB_PAGE_CONCURRENCY', 4))
+
+    def _get_github_pages(self, method, page_url, simplify, output, stop_when):
+        # Walks a paged github listing starting at page_url, extending output with every page in order until
+        # stop_when(output, page) is true.  Returns True if the last page was read.
+        #
+        # Once the first response tells us which page is the last one, the remaining pages are requested
+        # page_concurrency at a time.  They are still added to output in page order, and nothing past the
+        # page that satisfied stop_when is kept.  Up to page_concurrency - 1 pages past it may already have been
+        # requested by then, and count against the rate limit, cancelling only skips the ones not started yet.
+        simplified, links = self._get_github_page(method, page_url, simplify)
+        output.extend(simplified)
+
+        if stop_when(output, simplified):
+            return 'next' not in links
+
+        page_concurrency = self._get_page_concurrency()
+        last_page = self._get_page_number(links.get('last'))
+        next_page = self._get_page_number(links.get('next'))
+
+        if page_concurrency == 1 or last_page is None or next_page is None:
+            while 'next' in links:
+                simplified, links = self._get_github_page(method, links['next'], simplify)
                 output.extend(simplified)
 
-        commons.print_msg(GitHub.clazz, method, '{} total commits'.format(len(output)))
-        commons.print_msg(GitHub.clazz, method, 'end')
+                if stop_when(output, simplified):
+                    return 'next' not in links
 
-        GitHub.all_commits = output
+            return True
 
-        
+        commons.print_msg(GitHub.clazz, method, "Fetching pages {first} to {last}, {concurrency} at a time".format(
+            first=next_page, last=last_page, concurrency=page_concurrency))
 
-        return output
+        def page_url_for(page):
+            return re.sub(r'([?&]page=)\d+', r'\g<1>' + str(page), links['last'])
+
+        with ThreadPoolExecutor(max_workers=page_concurrency) as executor:
+            pending = {}
+            page_to_submit = next_page
+
+            for page in range(next_page, last_page + 1):
+                # keep at most page_concurrency requests in flight ahead of the page being processed
+                while page_to_submit <= last_page and page_to_submit < page + page_concurrency:
+                    pending[page_to_submit] = executor.submit(self._get_github_page, method,
+                                                              page_url_for(page_to_submit), simplify)
+                    page_to_submit += 1
+
+                simplified, _ = pending.pop(page).result()
+                output.extend(simplified)
+
+                if stop_when(output, simplified):
+                    for future in pending.values():
+                        future.cancel()
+                    return page == last_page
+
+        return True
+
+    @staticmethod
+    def _get_page_number(page_url):
+        if page_url is None:
+            return None
+
+        page = re.search(r'[?&]page=(\d+)', page_url)
+
+        return int(page.group(1)) if page else None
 
     def _verify_tags_found(self, tag_list, need_snapshot, need_release, need_tag, need_base):
-        found_snapshot = 0
-        found_release = 0
-        found_tag = need_tag is None
-        
-        for name, _ in tag_list:
-            if need_snapshot > found_snapshot:
-                if '+' in name:
-                    found_snapshot += 1
-            if need_release > found_release:
-                if '+' not in name:
-                    found_release += 1
-            if not found_tag:
-                if need_base:
-                    if name.split("+")[0] == need_tag:
-                        found_tag = True
-                elif name == need_tag:
-                    found_tag = True
-            if found_snapshot >= need_snapshot and found_release >= need_release and found_tag:
-                return True
-        return False
+        return self._get_tag_index(tag_list).has_tags(need_snapshot, need_release, need_tag, need_base)
+
+    def _get_tag_index(self, tag_list):
+        if GitHub.tag_index is None:
+            GitHub.tag_index = TagIndex()
+
+        GitHub.tag_index.update(tag_list)
+        return GitHub.tag_index
+
+    def _get_commit_index(self, commits):
+        if GitHub.commit_index is None:
+            GitHub.commit_index = CommitIndex()
+
+        GitHub.commit_index.update(commits)
+        return GitHub.commit_index
     
     # if need_snapshot, need_release, and need_tag are all left as defaults,
     # this method will only pull one page of results.
     def get_all_tags_and_shas_from_github(self, need_snapshot=0, need_release=0, need_tag=None, need_base=False):
         method = "get_all_tags_and_shas_from_github"
 
+        if GitHub.found_all_tags:
+            commons.print_msg(GitHub.clazz, method, 'All tags pulled, returning cached results')
+            return GitHub.all_tags_and_shas
+
         if len(GitHub.all_tags_and_shas) > 0:
             if self._verify_tags_found(GitHub.all_tags_and_shas, need_snapshot, need_release, need_tag, need_base):
                 commons.print_msg(GitHub.clazz, method, 'Already pulled necessary tags, returning cached results')
                 return GitHub.all_tags_and_shas
             commons.print_msg(GitHub.clazz, method, 'Necessary tags are not in our cached list, pulling more tags')
-       
+
+        local_git = self._get_local_git()
+        if local_git is not None:
+            local_tags = local_git.get_all_tags_and_shas()
+            # no tags at all is more likely a checkout without them than a repo without them
+            if local_tags:
+                return self._set_all_tags_and_shas(local_tags, found_all_tags=True)
+            commons.print_msg(GitHub.clazz, method, 'No local tags found, pulling tags from github')
+
         per_page = 100
         start_page = (len(GitHub.all_tags_and_shas)//per_page)+1
-        finished = False
         output = GitHub.all_tags_and_shas
         repo_url = GitHub.url + '/' + GitHub.org + '/' + GitHub.repo + '/tags?per_page=' + str(per_page) + '&page=' + str(start_page)
-        token = GitHub.token
-
-        if token is not None:
-            headers = {'Content-type': cicommons.content_json, 'Accept': cicommons.content_json,
-                       'Authorization': ('token ' + token)}
-        else:
-            headers = {'Content-type': cicommons.content_json, 'Accept': cicommons.content_json}
-
-        retries = 0
 
-        while not finished:
-            commons.print_msg(GitHub.clazz, method, repo_url)
+        def found_necessary_tags(tags, _):
+            if self._verify_tags_found(tags, need_snapshot, need_release, need_tag, need_base):
+                commons.print_msg(GitHub.clazz, method, 'Found necessary tags, stopping lookup')
+                return True
+            return False
 
-            try:
-                resp = requests.get(repo_url, headers=headers, timeout=self.http_timeout)
-            except Exception as e:
-                commons.print_msg(GitHub.clazz, method, "Failed to access github location {}".format(e))
-                if retries < 2:
-                    time.sleep(retries * 5)
-                    retries += 1
-                    continue
-                commons.print_msg(GitHub.clazz, method, "Failed to access github location {}".format(e), "ERROR")
-                exit(1)
+        found_all_tags = self._get_github_pages(method, repo_url, self._simplify_tags, output, found_necessary_tags)
 
-            retries = 0
+        self._save_page_cache()
 
-            if 'next' in resp.links:
-                repo_url = resp.links['next']['url']
-            else:
-                finished = True
+        return self._set_all_tags_and_shas(output, found_all_tags)
 
-            if resp.status_code != 200:
-                commons.print_msg(GitHub.clazz, method, "Failed to access github location {url}\r\n Response: {rsp}"
-                                  .format(url=repo_url,
-                                         rsp=resp.text),
-                                 "ERROR")
-                exit(1)
-            else:
-                #commons.print_msg(GitHub.clazz, method, resp.text)
-                #commons.print_msg(GitHub.clazz, method, resp.json())
-                simplified = list(map(lambda obj: (obj['name'], obj['commit']['sha']), resp.json()))
-                output.extend(simplified)
-                if self._verify_tags_found(output, need_snapshot, need_release, need_tag, need_base):
-                    commons.print_msg(GitHub.clazz, method, 'Found necessary tags, stopping lookup')
-                    finished = True
+    def _set_all_tags_and_shas(self, output, found_all_tags):
+        method = "get_all_tags_and_shas_from_github"
 
         #commons.print_msg(GitHub.clazz, method, output)
         # if using cal_ver and short_year format filter output to remove long_year format
@@ -663,92 +814,54 @@ class GitHub(Code_Repo):
         commons.print_msg(GitHub.clazz, method, '{} total tags'.format(len(output)))
         commons.print_msg(GitHub.clazz, method, 'end')
         GitHub.all_tags_and_shas = output
+        GitHub.found_all_tags = found_all_tags
 
         return output
 
-    def get_all_semver_tags(self, need_snapshot=0, need_release=0, need_tag=None, need_base=False):
-        method = "get_all_semver_tags"
-        all_tags_output = self.get_all_tags_and_shas_from_github(need_snapshot=need_snapshot, need_release=need_release, need_tag=need_tag, need_base=need_base)
+    def _get_version_index(self, all_tags):
+        method = "_get_version_index"
 
-        all_tags = all_tags_output#.splitlines()
-        tag_data = []
+        short_year_only = self.config.version_strategy == 'calver_year' and self.config.calver_year_format == 'short'
 
-        for tag, _ in all_tags:
-            try:
-                if self.config.version_strategy == 'calver_year' and self.config.calver_year_format == 'short':
-                    tag_array = self.convert_semver_string_to_semver_tag_array(tag)
-                    # assume short (2 digit) year will always be exactly 2 digits.
-                    if len(str(tag_array[0])) == 2:
-                        tag_data.append(tag_array)
-                else:
-                    tag_data.append(self.convert_semver_string_to_semver_tag_array(tag))
-            except Exception:
-                commons.print_msg(GitHub.clazz, method, "This tag didn't parse right skipping: {} ".format(tag))
+        if GitHub.version_index is None or GitHub.version_index.short_year_only != short_year_only:
+            GitHub.version_index = VersionIndex(short_year_only)
 
-        tag_data.sort(reverse=True)
+        for tag in GitHub.version_index.add(all_tags):
+            commons.print_msg(GitHub.clazz, method, "This tag didn't parse right skipping: {} ".format(tag))
+
+        return GitHub.version_index
+
+    def get_all_semver_tags(self, need_snapshot=0, need_release=0, need_tag=None, need_base=False):
+        all_tags = self.get_all_tags_and_shas_from_github(need_snapshot=need_snapshot, need_release=need_release, need_tag=need_tag, need_base=need_base)
+
+        tag_data = self._get_version_index(all_tags).sorted_descending()
         GitHub.all_tags_sorted = tag_data
         return tag_data
 
     def get_highest_semver_tag(self):
-        all_semver_tags = self.get_all_semver_tags()
-        # index 0 is the highest order number
-        if len(all_semver_tags) > 0:
-            return all_semver_tags[0]
-        else:
-            return None
+        all_tags = self.get_all_tags_and_shas_from_github()
+        return self._get_version_index(all_tags).highest()
 
     def get_highest_semver_release_tag(self):
-        all_semver_tags = self.get_all_semver_tags(need_release=1)
-        # index 0 is the highest order semver number
-        # since array is in order from highest version
-        # to lowest version, then start at 0
-        # and find the last release build
-        for tag in all_semver_tags:
-            if self._is_semver_tag_array_release_or_snapshot(tag) == 'release':
-                return tag
-
-        return None
+        all_tags = self.get_all_tags_and_shas_from_github(need_release=1)
+        return self._get_version_index(all_tags).highest_release()
 
     def get_highest_semver_snapshot_tag(self):
-        all_semver_tags = self.get_all_semver_tags(need_snapshot=1)
-        # index 0 is the highest order semver number
-        # since array is in order from highest version
-        # to lowest version, then start at 0
-        # and find the last snapshot build
-        for tag in all_semver_tags:
-            if self._is_semver_tag_array_release_or_snapshot(tag) == 'snapshot':
-                return tag
-
-        return None
+        all_tags = self.get_all_tags_and_shas_from_github(need_snapshot=1)
+        return self._get_version_index(all_tags).highest_snapshot()
 
     def get_highest_semver_array_snapshot_tag_from_base(self, base_release_version):
-        all_semver_tags = self.get_all_semver_tags(need_tag=self.convert_semver_tag_array_to_semver_string(base_release_version), need_base=True)
-        # index 0 is the highest order semver number
-        # since array is in order from highest version
-        # to lowest version, then start at 0
+        all_tags = self.get_all_tags_and_shas_from_github(need_tag=self.convert_semver_tag_array_to_semver_string(base_release_version), need_base=True)
 
         # There are three options to this effort:
         # Found a snapshot that matches the base, then return the highest
         # Found only a release that matches the base, no snapshots, return release
-        # no base found, return base.
-
-        found_tag = None
-        for tag in all_semver_tags:
-            if tag[0] == base_release_version[0] and tag[1] == base_release_version[1] and tag[2] == base_release_version[2]:
-                # this could be a snapshot, or release, really don't care.
-                # both are fine.
-                found_tag = tag
-                break
-
-        return found_tag
+        # no base found, return None.
+        return self._get_version_index(all_tags).highest_from_base(base_release_version)
 
     def _does_semver_tag_exist(self, tag_array):
-        all_semver_tags = self.get_all_semver_tags(need_tag=self.convert_semver_tag_array_to_semver_string(tag_array))
-        # index 0 is the highest order number
-        if tag_array in all_semver_tags:
-            return True
-        else:
-            return False
+        all_tags = self.get_all_tags_and_shas_from_github(need_tag=self.convert_semver_tag_array_to_semver_string(tag_array))
+        return self._get_version_index(all_tags).contains(tag_array)
 
     def convert_semver_tag_array_to_semver_string(self, tag_array):
         if tag_array is None:
@@ -827,61 +940,63 @@ class GitHub(Code_Repo):
 
         # get all tags to get shas
         tags = self.get_all_tags_and_shas_from_github(need_tag=semver_array_beginning_version)
+        tag_index = self._get_tag_index(tags)
         ending_sha = ''
         beginning_sha = ''
 
         if semver_array_ending_version is not None:
             commons.print_msg(GitHub.clazz, method, semver_array_ending_version)
-            filtered_tags = list(filter(lambda tag: tag[0] == semver_array_ending_version, tags))
-            if len(filtered_tags) == 0:
+            if tag_index.sha(semver_array_ending_version) is None:
                 print("Version tag not found {}".format(semver_array_ending_version))
                 commons.print_msg(GitHub.clazz, method, "Version tag not found {}".format(semver_array_ending_version),
                                  'ERROR')
                 exit(1)
             else:
-                beginning_sha = filtered_tags[0][1]
-            ending_sha = filtered_tags[0][1]
+                beginning_sha = tag_index.sha(semver_array_ending_version)
+            ending_sha = tag_index.sha(semver_array_ending_version)
         if semver_array_beginning_version is not None:
             commons.print_msg(GitHub.clazz, method, semver_array_beginning_version)
-            filtered_tags = list(filter(lambda tag: tag[0] == semver_array_beginning_version, tags))
-            if len(filtered_tags) == 0:
+            if tag_index.sha(semver_array_beginning_version) is None:
                 print("Version tag not found {}".format(semver_array_beginning_version))
                 commons.print_msg(GitHub.clazz, method, "Version tag not found {}".format(semver_array_beginning_version),
                                  'ERROR')
                 exit(1)
             else:
-                beginning_sha = filtered_tags[0][1]
+                beginning_sha = tag_index.sha(semver_array_beginning_version)
 
         commons.print_msg(GitHub.clazz, method, ending_sha + ' , ' + beginning_sha)
 
-        # get all commits here
-        commits = self.get_all_commits_from_github(beginning_sha)
-        trimmed_commits = []
-        found_beginning = False
-
-        if semver_array_beginning_version is None and semver_array_ending_version is None:  # Everything!
-            commons.print_msg(GitHub.clazz, method, "No tag present. Pulling all git commit statements instead.")
-            trimmed_commits = commits[:]
-            found_beginning = True
-        elif semver_array_ending_version is None:  # Everything since tag
-            commons.print_msg(GitHub.clazz, method, "The first tag: {}".format(semver_array_beginning_version))
-            for commit in commits:
-                if commit['sha'] == beginning_sha:
-                    found_beginning = True
-                    break
-                trimmed_commits.append(commit)
-        else:  # Between two tags.  Mostly used when re-deploying old versions to send release notes
-            commons.print_msg(GitHub.clazz, method, "The first tag: ".format(semver_array_beginning_version))
-            commons.print_msg(GitHub.clazz, method, "The last tag: ".format(semver_array_ending_version))
-            found_end = False
-            for commit in commits:
-                if commit['sha'] == ending_sha:
-                    found_end = True
-                if commit['sha'] == beginning_sha:
-                    found_beginning = True
-                    break
-                if found_end:
-                    trimmed_commits.append(commit)
+        commit_range = None
+        if semver_array_beginning_version is not None:
+            commit_range = self._get_commit_range(beginning_sha,
+                                                  ending_sha if semver_array_ending_version is not None else None)
+
+        if commit_range is not None:
+            trimmed_commits, found_beginning = commit_range
+        else:
+            # get all commits here
+            commits = self.get_all_commits_from_github(beginning_sha)
+            commit_index = self._get_commit_index(commits)
+            trimmed_commits = []
+            found_beginning = False
+
+            if semver_array_beginning_version is None and semver_array_ending_version is None:  # Everything!
+                commons.print_msg(GitHub.clazz, method, "No tag present. Pulling all git commit statements instead.")
+                trimmed_commits = commits[:]
+                found_beginning = True
+            elif semver_array_ending_version is None:  # Everything since tag
+                commons.print_msg(GitHub.clazz, method, "The first tag: {}".format(semver_array_beginning_version))
+                beginning_position = commit_index.position(beginning_sha)
+                found_beginning = beginning_position is not None
+                trimmed_commits = commits[:beginning_position] if found_beginning else commits[:]
+            else:  # Between two tags.  Mostly used when re-deploying old versions to send release notes
+                commons.print_msg(GitHub.clazz, method, "The first tag: ".format(semver_array_beginning_version))
+                commons.print_msg(GitHub.clazz, method, "The last tag: ".format(semver_array_ending_version))
+                ending_position = commit_index.position(ending_sha)
+                beginning_position = commit_index.position(beginning_sha)
+                found_beginning = beginning_position is not None
+                if ending_position is not None:
+                    trimmed_commits = commits[ending_position:beginning_position]
 
         trimmed_commits = list(map(lambda current_sommit: "{} {}".format(current_sommit['sha'][0:7], current_sommit['commit']['message']), trimmed_commits))
 
@@ -894,6 +1009,97 @@ class GitHub(Code_Repo):
         commons.print_msg(GitHub.clazz, method, 'end')
         return trimmed_commits
 
+    def _get_commit_range(self, beginning_sha, ending_sha=None):
+        # Returns the commits after beginning_sha up to ending_sha (or the head of the branch), newest first,
+        # and whether beginning_sha is part of that history at all.  Returns None when the range can't be
+        # answered directly, in which case the caller walks the branch history instead.
+        method = '_get_commit_range'
+
+        local_git = self._get_local_git()
+        if local_git is not None and local_git.has_commit(beginning_sha):
+            if ending_sha:
+                head_sha = ending_sha
+            else:
+                head_sha = local_git.resolve_branch(self.config.build_env_info['associatedBranchName'])
+
+            if head_sha is not None and local_git.has_commit(head_sha):
+                if not local_git.is_ancestor(beginning_sha, head_sha):
+                    return [], False
+
+                commits = local_git.get_commits(head_sha, beginning_sha)
+                if commits is not None:
+                    commons.print_msg(GitHub.clazz, method, "Read {count} commits {begin}..{end} from the local "
+                                                            "checkout".format(count=len(commits),
+                                                                              begin=beginning_sha,
+                                                                              end=head_sha))
+                    return commits, True
+
+        return self._get_compare_commits(beginning_sha, ending_sha)
+
+    def _get_compare_commits(self, beginning_sha, ending_sha=None):
+        # Asks github for just the commits between two shas with the compare api, rather than walking the
+        # whole branch history until beginning_sha shows up.  Returns None if compare can't answer.
+        method = '_get_compare_commits'
+
+        if GitHub.url is None or not beginning_sha:
+            return None
+
+        head = ending_sha if ending_sha else self.config.build_env_info['associatedBranchName']
+
+        compare_url = GitHub.url + '/' + GitHub.org + '/' + GitHub.repo + '/compare/' + beginning_sha + '...' + \
+                      str(head) + '?per_page=100&page=1'
+
+        if GitHub.token is not None:
+            headers = {'Content-type': cicommons.content_json, 'Accept': cicommons.content_json,
+                       'Authorization': ('token ' + GitHub.token)}
+        else:
+            headers = {'Content-type': cicommons.content_json, 'Accept': cicommons.content_json}
+
+        commits = []
+        total_commits = 0
+
+        while compare_url is not None:
+            commons.print_msg(GitHub.clazz, method, compare_url)
+
+            try:
+                resp = self._github_request('GET', compare_url, headers=headers, timeout=self.http_timeout)
+            except Exception as e:
+                commons.print_msg(GitHub.clazz, method, "Compare failed, walking the branch history instead. "
+                                                        "{}".format(e))
+                return None
+
+            if resp.status_code != 200:
+                commons.print_msg(GitHub.clazz, method, "Compare failed, walking the branch history instead. "
+                                                        "Response: {}".format(resp.text))
+                return None
+
+            compare_json = resp.json()
+
+            # behind or diverged means beginning_sha is not in the history of head
+            if compare_json.get('status') not in ['ahead', 'identical']:
+                commons.print_msg(GitHub.clazz, method, "{base} is {status} compared to {head}".format(
+                    base=beginning_sha, status=compare_json.get('status'), head=head))
+                return [], False
+
+            total_commits = compare_json.get('total_commits', 0)
+            commits.extend(self._simplify_commits(compare_json.get('commits', [])))
+
+            compare_url = resp.links['next']['url'] if 'next' in resp.links else None
+
+        if len(commits) < total_commits:
+            # older github enterprise versions cap compare at 250 commits without pagination
+            commons.print_msg(GitHub.clazz, method, "Compare returned {found} of {total} commits, walking the "
+                                                    "branch history instead".format(found=len(commits),
+                                                                                    total=total_commits))
+            return None
+
+        commons.print_msg(GitHub.clazz, method, "Compare found {} commits".format(len(commits)))
+
+        # compare lists oldest first, the commits api lists newest first
+        commits.reverse()
+
+        return commits, True
+
     def _is_semver_tag_array_release_or_snapshot(self, semver_array):
         # check the 0.0.0.x position.
         # if x == 0 then it is release
@@ -906,7 +1112,7 @@ class GitHub(Code_Repo):
         else:
             return None
 
-    def download_code_at_version(self):
+    def download_code_at_version(self, stream=True):
         method = "download_code_at_version"
         commons.print_msg(GitHub.clazz, method, "begin")
 
@@ -916,18 +1122,34 @@ class GitHub(Code_Repo):
 
         commons.print_msg(GitHub.clazz, method, ("Attempting to download from github: {}".format(artifact_to_download)))
 
-        if not os.path.exists(os.path.join(self.config.push_location, 'unzipped')):
-            os.makedirs(os.path.join(self.config.push_location, 'unzipped'))
-
-        download_path = self.config.push_location + "/" + artifact
-
         if GitHub.token is not None:
             headers = {'Content-type': cicommons.content_json, 'Accept': cicommons.content_json, 'Authorization': ('token ' + GitHub.token)}
         else:
             headers = {'Content-type': cicommons.content_json, 'Accept': cicommons.content_json}
 
+        if stream:
+            try:
+                # the tarball is extracted as it downloads, dropping the org-repo-sha parent directory github adds
+                download_resp = self._github_request('GET', artifact_to_download, headers=headers, stream=True)
+                download_resp.raise_for_status()
+                download_resp.raw.decode_content = True
+
+                cicommons.extract_tar_stream(download_resp.raw, self.config.push_location, strip_components=1)
+            except Exception as ex:
+                commons.print_msg(GitHub.clazz, method, "Failed to download {art}.  Error: {e}".format(art=artifact, e=ex),
+                                  'ERROR')
+                exit(1)
+
+            commons.print_msg(GitHub.clazz, method, "end")
+            return
+
+        if not os.path.exists(os.path.join(self.config.push_location, 'unzipped')):
+            os.makedirs(os.path.join(self.config.push_location, 'unzipped'))
+
+        download_path = self.config.push_location + "/" + artifact
+
         try:
-            download_resp = requests.get(artifact_to_download, headers=headers)
+            download_resp = self._github_request('GET', artifact_to_download, headers=headers)
 
             with open(download_path, 'wb') as f:
                 for chunk in download_resp.iter_content(chunk_size=1024):
@@ -962,7 +1184,7 @@ class GitHub(Code_Repo):
 
         commons.print_msg(GitHub.clazz, method, ("Retrieving Github information from " + tag_information_url))
 
-        resp = requests.get(tag_information_url, headers=headers)
+        resp = self._github_request('GET', tag_information_url, headers=headers)
 
         if resp.status_code != 200:
             commons.print_msg(GitHub.clazz, method, ("Failed to access github tag information at " + tag_information_url + "\r\n Response: " + resp.text), "ERROR")
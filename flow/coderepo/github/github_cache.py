@@ -0,0 +1,160 @@
+#!/usr/bin/python
+# github_cache.py
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+import flow.utils.commons as commons
+
+
+class GitHubCache:
+    """
+    On disk cache of paged GitHub listings (tags, commits) so they survive between flow runs.
+
+    Every page is stored under the url it was requested with, together with the ETag and Last-Modified
+    headers GitHub returned for it.  Those headers are replayed as If-None-Match/If-Modified-Since on the
+    next request, so an unchanged page comes back as a 304 and the stored copy is used instead of
+    re-parsing the body.  One cache file is kept per GitHub url/org/repo; the branch is part of the
+    commit page urls.
+
+    Pages not used for max_age_days are dropped, and only the max_entries most recently used pages of a
+    repo are kept.  Cache files of repos no run has used for max_age_days are deleted.
+    """
+    clazz = 'GitHubCache'
+
+    def __init__(self, cache_dir, url, org, repo, max_entries=1000, max_age_days=30):
+        method = '__init__'
+
+        self.key = GitHubCache.cache_key(url, org, repo)
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.cache_file = os.path.join(self.cache_dir,
+                                       hashlib.sha1(self.key.encode('utf-8')).hexdigest() + '.json')  # nosec
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_days * 24 * 60 * 60
+        self.entries = None
+        self.dirty = False
+        self.lock = threading.Lock()
+
+        commons.print_msg(GitHubCache.clazz, method, "Using github cache {file} for {key}".format(
+            file=self.cache_file, key=self.key))
+
+    @staticmethod
+    def cache_key(url, org, repo):
+        return '/'.join([str(url).rstrip('/'), str(org), str(repo)])
+
+    def _load(self):
+        method = '_load'
+
+        if self.entries is not None:
+            return
+
+        self.entries = {}
+
+        if not os.path.isfile(self.cache_file):
+            return
+
+        try:
+            with open(self.cache_file, 'r') as cache:
+                cached = json.load(cache)
+
+            if cached.get('key') == self.key:
+                self.entries = cached.get('pages', {})
+                # pages cached before use was tracked count as used now
+                for entry in self.entries.values():
+                    entry.setdefault('used', time.time())
+        except Exception as e:
+            # a corrupt cache is never fatal, we just go back to the api for everything.
+            commons.print_msg(GitHubCache.clazz, method, "Ignoring unreadable github cache {file}. {err}".format(
+                file=self.cache_file, err=e), 'WARN')
+
+    def get(self, page_url):
+        with self.lock:
+            self._load()
+            entry = self.entries.get(page_url)
+
+            if entry is not None:
+                entry['used'] = time.time()
+                self.dirty = True
+
+            return entry
+
+    def conditional_headers(self, page_url):
+        entry = self.get(page_url)
+
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        return headers
+
+    def put(self, page_url, etag, last_modified, links, data):
+        if etag is None and last_modified is None:
+            # nothing to revalidate with, so there is no point in keeping it.
+            return
+
+        with self.lock:
+            self._load()
+            self.entries[page_url] = {'etag': etag, 'last_modified': last_modified, 'links': links, 'data': data,
+                                      'used': time.time()}
+            self.dirty = True
+
+    def _evict(self):
+        # drops pages not used for max_age_days, then all but the max_entries most recently used
+        cutoff = time.time() - self.max_age_seconds
+        recent = sorted(((entry['used'], page_url) for page_url, entry in self.entries.items()
+                         if entry['used'] >= cutoff), reverse=True)[:self.max_entries]
+
+        self.entries = {page_url: self.entries[page_url] for _, page_url in recent}
+
+    def _remove_stale_files(self):
+        # cache files of other repos that haven't been written for max_age_days, and temp files left behind
+        method = '_remove_stale_files'
+
+        cutoff = time.time() - self.max_age_seconds
+
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+
+            if path != self.cache_file and name.endswith(('.json', '.tmp')) and os.path.getmtime(path) < cutoff:
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    commons.print_msg(GitHubCache.clazz, method, "Failed removing stale github cache {file}. "
+                                                                 "{err}".format(file=path, err=e), 'WARN')
+
+    def save(self):
+        method = 'save'
+
+        with self.lock:
+            if not self.dirty:
+                return
+
+            temp_file = None
+
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                self._evict()
+
+                # write to a temp file and rename so that concurrent pipelines never read a half written cache
+                handle, temp_file = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+                with os.fdopen(handle, 'w') as cache:
+                    json.dump({'key': self.key, 'pages': self.entries}, cache)
+                os.replace(temp_file, self.cache_file)
+
+                self.dirty = False
+            except Exception as e:
+                commons.print_msg(GitHubCache.clazz, method, "Failed writing github cache {file}. {err}".format(
+                    file=self.cache_file, err=e), 'WARN')
+
+                if temp_file is not None and os.path.exists(temp_file):
+                    os.remove(temp_file)
+                return
+
+            self._remove_stale_files()
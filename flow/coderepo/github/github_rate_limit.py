@@ -0,0 +1,137 @@
+#!/usr/bin/python
+# github_rate_limit.py
+
+import math
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import flow.utils.commons as commons
+
+
+class GitHubRateLimiter:
+    """
+    Process wide pacing of the GitHub api calls counted against one rate limit resource (X-RateLimit-Resource,
+    e.g. core for the rest api and graphql), based on the rate limit headers GitHub returns.
+
+    Every response updates the remaining budget from X-RateLimit-Remaining/X-RateLimit-Reset.  Once the
+    budget drops below pace_below the remaining calls are spread evenly until the reset time, and when it
+    is used up (or GitHub answers with a secondary limit Retry-After) callers wait for the reset instead
+    of failing.  Waits longer than max_wait seconds are fatal.
+    """
+    clazz = 'GitHubRateLimiter'
+    metrics = None
+    metric_name = 'github.rate_limit.{resource}.remaining'
+    report_interval = 60
+
+    def __init__(self, resource='core', pace_below=100, max_wait=3600):
+        self.resource = resource
+        self.pace_below = pace_below
+        self.max_wait = max_wait
+        self.limit = None
+        self.remaining = None
+        self.reset = None
+        self.blocked_until = 0
+        self.next_slot = 0
+        self.last_report = None
+        self.lock = threading.Lock()
+
+    def before_request(self):
+        method = 'before_request'
+
+        with self.lock:
+            now = time.time()
+
+            if self.reset is not None and now >= self.reset:
+                # a new rate limit window started, the budget is unknown until the next response
+                self.remaining = None
+                self.reset = None
+
+            wait = max(self.blocked_until - now, 0)
+
+            if self.remaining is not None and self.reset is not None:
+                if self.remaining <= 0:
+                    wait = max(wait, self.reset - now + 1)
+                elif self.remaining < self.pace_below:
+                    slot = max(now, self.next_slot)
+                    self.next_slot = slot + (self.reset - now) / self.remaining
+                    wait = max(wait, slot - now)
+
+                # count this call against the budget now so that concurrent callers see it
+                self.remaining -= 1
+
+        if wait > self.max_wait:
+            commons.print_msg(GitHubRateLimiter.clazz, method, "GitHub {resource} rate limit resets in {wait} seconds "
+                                                               "which is longer than the {max} second maximum "
+                                                               "wait".format(resource=self.resource, wait=int(wait),
+                                                                             max=self.max_wait), 'ERROR')
+            exit(1)
+
+        if wait >= 1:
+            commons.print_msg(GitHubRateLimiter.clazz, method, "Waiting {wait} seconds for the GitHub {resource} rate "
+                                                               "limit".format(wait=int(wait), resource=self.resource),
+                              'WARN')
+        if wait > 0:
+            time.sleep(wait)
+
+    def after_response(self, resp):
+        # Records the rate limit headers of a response.  Returns the number of seconds to wait before
+        # retrying when the response was rejected by a rate limit, otherwise None.
+        headers = resp.headers
+        now = time.time()
+        retry_wait = None
+
+        with self.lock:
+            if headers.get('X-RateLimit-Limit') is not None:
+                self.limit = int(headers['X-RateLimit-Limit'])
+            if headers.get('X-RateLimit-Remaining') is not None:
+                self.remaining = int(headers['X-RateLimit-Remaining'])
+            if headers.get('X-RateLimit-Reset') is not None:
+                self.reset = int(headers['X-RateLimit-Reset'])
+
+            if resp.status_code in (403, 429):
+                retry_wait = GitHubRateLimiter._parse_retry_after(headers.get('Retry-After'), now)
+
+                if retry_wait is None and self.reset is not None and (self.remaining == 0 or
+                                                                      headers.get('Retry-After') is not None):
+                    retry_wait = max(self.reset - now, 0) + 1
+
+                if retry_wait is not None:
+                    self.blocked_until = max(self.blocked_until, now + retry_wait)
+
+            report = self.remaining is not None and (retry_wait is not None or self.last_report is None or
+                                                     now - self.last_report >= GitHubRateLimiter.report_interval)
+            if report:
+                self.last_report = now
+
+        if report:
+            self._report_remaining()
+
+        return retry_wait
+
+    @staticmethod
+    def _parse_retry_after(value, now):
+        # Retry-After is either a number of seconds or an http date.  None when it is missing or unreadable.
+        if value is None:
+            return None
+
+        try:
+            return max(int(value), 0)
+        except ValueError:
+            pass
+
+        try:
+            return max(math.ceil(parsedate_to_datetime(value).timestamp() - now), 0)
+        except (TypeError, ValueError):
+            return None
+
+    def _report_remaining(self):
+        method = '_report_remaining'
+
+        commons.print_msg(GitHubRateLimiter.clazz, method, "GitHub {resource} rate limit remaining {remaining} of "
+                                                           "{limit}".format(resource=self.resource,
+                                                                            remaining=self.remaining, limit=self.limit))
+
+        if GitHubRateLimiter.metrics is not None:
+            GitHubRateLimiter.metrics.write_gauge(GitHubRateLimiter.metric_name.format(resource=self.resource),
+                                                  self.remaining)
@@ -0,0 +1,199 @@
+#!/usr/bin/python
+# indexes.py
+
+import bisect
+
+from flow.utils.versions import parse_version
+
+
+class ListIndex:
+    """
+    Base for the indexes kept alongside the cached tag and commit lists.  Those lists only ever grow
+    (pages are appended as they arrive), so an index remembers the list it was built from and how much
+    of it has been indexed; update() only looks at the new entries, and starts over for a different list.
+    """
+
+    def __init__(self):
+        self.source = None
+        self.consumed = 0
+        self._reset()
+
+    def _reset(self):
+        pass
+
+    def _index(self, start, entries):
+        pass
+
+    def covers(self, source):
+        return source is self.source and len(source) >= self.consumed
+
+    def update(self, source):
+        if not self.covers(source):
+            self.consumed = 0
+            self._reset()
+            self.source = source
+
+        start = self.consumed
+        self.consumed = len(source)
+
+        return self._index(start, source[start:])
+
+
+class VersionIndex(ListIndex):
+    """
+    Parsed, sorted view of a list of (tag name, sha) pairs.
+
+    Every tag name is parsed once into a (major, minor, bug, build) tuple.  All versions, releases
+    (build 0) and snapshots (build > 0) are each kept sorted ascending, so the highest of any of them is
+    the last entry and the highest version for a base is a bisect away.
+    """
+
+    def __init__(self, short_year_only=False):
+        self.short_year_only = short_year_only
+        super().__init__()
+
+    def _reset(self):
+        self.versions = []
+        self.releases = []
+        self.snapshots = []
+        self.descending = None
+
+    def add(self, tag_list):
+        # Parses the tags of tag_list that haven't been indexed yet.  Returns the names that aren't versions.
+        return self.update(tag_list)
+
+    def _index(self, start, entries):
+        skipped = []
+        parsed = []
+
+        for name, _ in entries:
+            version = parse_version(name)
+
+            if version is None:
+                skipped.append(name)
+            elif not self.short_year_only or len(str(version[0])) == 2:
+                # short calver years are assumed to always be exactly 2 digits
+                parsed.append(version)
+
+        if len(parsed) > 0:
+            self.versions.extend(parsed)
+            self.versions.sort()
+            self.releases.extend(version for version in parsed if version[3] == 0)
+            self.releases.sort()
+            self.snapshots.extend(version for version in parsed if version[3] > 0)
+            self.snapshots.sort()
+            self.descending = None
+
+        return skipped
+
+    def sorted_descending(self):
+        if self.descending is None:
+            self.descending = [list(version) for version in reversed(self.versions)]
+
+        return self.descending
+
+    @staticmethod
+    def _last(versions):
+        return list(versions[-1]) if len(versions) > 0 else None
+
+    def highest(self):
+        return VersionIndex._last(self.versions)
+
+    def highest_release(self):
+        return VersionIndex._last(self.releases)
+
+    def highest_snapshot(self):
+        return VersionIndex._last(self.snapshots)
+
+    def highest_from_base(self, base_version):
+        # highest version (release or snapshot) with the same major.minor.bug as base_version
+        base = tuple(base_version[:3])
+        position = bisect.bisect_right(self.versions, base + (float('inf'),))
+
+        if position > 0 and self.versions[position - 1][:3] == base:
+            return list(self.versions[position - 1])
+
+        return None
+
+    def contains(self, version):
+        version = tuple(version)
+        position = bisect.bisect_left(self.versions, version)
+
+        return position < len(self.versions) and self.versions[position] == version
+
+
+class TagIndex(ListIndex):
+    """
+    Hash lookups over a list of (tag name, sha) pairs in the order GitHub returned them (newest first).
+    Tag names map to their sha and position, and the positions of release and snapshot tags are kept in
+    order so the next tag of either kind after a given tag is a bisect away.
+    """
+
+    def _reset(self):
+        self.shas = {}
+        self.positions = {}
+        self.bases = set()
+        self.release_positions = []
+        self.snapshot_positions = []
+
+    def _index(self, start, entries):
+        for position, (name, sha) in enumerate(entries, start):
+            if name not in self.positions:
+                self.positions[name] = position
+                self.shas[name] = sha
+            self.bases.add(name.split('+')[0])
+
+            if '+' in name:
+                self.snapshot_positions.append(position)
+            else:
+                self.release_positions.append(position)
+
+    def sha(self, name):
+        return self.shas.get(name)
+
+    def has_tags(self, need_snapshot=0, need_release=0, need_tag=None, need_base=False):
+        # an empty list never has what we need, even when nothing in particular is needed
+        if self.consumed == 0:
+            return False
+
+        if len(self.snapshot_positions) < need_snapshot or len(self.release_positions) < need_release:
+            return False
+
+        if need_tag is None:
+            return True
+
+        return need_tag in (self.bases if need_base else self.positions)
+
+    def first(self, snapshot):
+        positions = self.snapshot_positions if snapshot else self.release_positions
+
+        return self.source[positions[0]][0] if len(positions) > 0 else None
+
+    def next_after(self, name, snapshot):
+        # the first release (or snapshot) tag listed after name
+        if name not in self.positions:
+            return None
+
+        positions = self.snapshot_positions if snapshot else self.release_positions
+        position = bisect.bisect_right(positions, self.positions[name])
+
+        return self.source[positions[position]][0] if position < len(positions) else None
+
+
+class CommitIndex(ListIndex):
+    """
+    Maps each commit sha in a list of commits (newest first) to its position in the list.
+    """
+
+    def _reset(self):
+        self.positions = {}
+
+    def _index(self, start, entries):
+        for position, commit in enumerate(entries, start):
+            self.positions.setdefault(commit['sha'], position)
+
+    def position(self, sha):
+        return self.positions.get(sha)
+
+    def contains(self, sha):
+        return sha in self.positions
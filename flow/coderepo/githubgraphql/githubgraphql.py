@@ -0,0 +1,219 @@
+#!/usr/bin/python
+# githubgraphql.py
+
+from flow.coderepo.github.github import GitHub
+from flow.utils.versions import parse_version
+
+import flow.utils.commons as commons
+
+
+class GitHubGraphQL(GitHub):
+    """
+    GitHub code repo that reads tags and branch history through the GraphQL api.  Tags (with the commit
+    they point at) and branch history are fetched 100 at a time in the same query, asking only for the
+    tag names, shas and commit messages that flow keeps.  The first page of both is loaded while
+    verifying that the repo exists, so a version calculation usually needs a single round trip.
+
+    The last and previous tag are picked by their position in the tag list, so the tags have to be in the
+    order the rest tags listing returns them, highest version first.  GraphQL can only order refs by name
+    (v1.10.0 sorts before v1.9.0) or commit date, so every tag page is read and then sorted by version.
+    """
+    clazz = 'GitHubGraphQL'
+
+    tags_cursor = None
+    history_cursor = None
+    tags_fetched = False
+    history_fetched = False
+
+    query = """
+query($owner: String!, $name: String!, $branch: String!, $withTags: Boolean!, $tagsAfter: String,
+      $withHistory: Boolean!, $historyAfter: String) {
+  repository(owner: $owner, name: $name) {
+    refs(refPrefix: "refs/tags/", first: 100, after: $tagsAfter,
+         orderBy: {field: ALPHABETICAL, direction: DESC}) @include(if: $withTags) {
+      pageInfo { hasNextPage endCursor }
+      nodes { name target { oid ... on Tag { target { oid } } } }
+    }
+    ref(qualifiedName: $branch) @include(if: $withHistory) {
+      target {
+        ... on Commit {
+          history(first: 100, after: $historyAfter) {
+            pageInfo { hasNextPage endCursor }
+            nodes { oid message }
+          }
+        }
+      }
+    }
+  }
+}
+"""
+
+    def _use_graphql(self):
+        # graphql always needs a token, and a usable local checkout beats any api
+        return GitHub.token is not None and self._get_local_git() is None
+
+    def _get_graphql_url(self):
+        github_config = self.config.json_config['github']
+
+        if 'graphqlURL' in github_config:
+            return github_config['graphqlURL']
+
+        # https://api.github.com/repos => https://api.github.com/graphql
+        # https://github.company.com/api/v3/repos => https://github.company.com/api/graphql
+        api_url = GitHub.url.rstrip('/')
+        if api_url.endswith('/repos'):
+            api_url = api_url[:-len('/repos')]
+        if api_url.endswith('/api/v3'):
+            return api_url[:-len('/v3')] + '/graphql'
+
+        return api_url + '/graphql'
+
+    def _run_query(self, with_tags, with_history):
+        method = '_run_query'
+
+        graphql_url = self._get_graphql_url()
+
+        headers = {'Content-type': commons.content_json, 'Accept': commons.content_json,
+                   'Authorization': ('bearer ' + GitHub.token)}
+
+        variables = {
+            'owner': GitHub.org,
+            'name': GitHub.repo,
+            'branch': 'refs/heads/' + str(self.config.build_env_info['associatedBranchName']),
+            'withTags': with_tags,
+            'tagsAfter': GitHubGraphQL.tags_cursor,
+            'withHistory': with_history,
+            'historyAfter': GitHubGraphQL.history_cursor
+        }
+
+        commons.print_msg(GitHubGraphQL.clazz, method, "{url} tags: {tags} history: {history}".format(
+            url=graphql_url, tags=with_tags, history=with_history))
+
+        try:
+            resp = self._github_request('POST', graphql_url, resource='graphql',
+                                        json={'query': GitHubGraphQL.query, 'variables': variables},
+                                        headers=headers, timeout=self.http_timeout)
+        except Exception as e:
+            commons.print_msg(GitHubGraphQL.clazz, method, "Failed to access github location {}".format(e), 'ERROR')
+            exit(1)
+
+        # noinspection PyUnboundLocalVariable
+        if resp.status_code != 200:
+            commons.print_msg(GitHubGraphQL.clazz, method, "Failed to access github location {url}\r\n Response: {rsp}"
+                              .format(url=graphql_url,
+                                      rsp=resp.text),
+                              'ERROR')
+            exit(1)
+
+        resp_json = resp.json()
+
+        if resp_json.get('errors') or (resp_json.get('data') or {}).get('repository') is None:
+            commons.print_msg(GitHubGraphQL.clazz, method, "Failed to access github location {url}\r\n Response: {rsp}"
+                              .format(url=graphql_url,
+                                      rsp=resp.text),
+                              'ERROR')
+            exit(1)
+
+        repository = resp_json['data']['repository']
+
+        if with_tags:
+            self._add_tags_page(repository['refs'])
+
+        if with_history:
+            self._add_history_page(repository['ref'])
+
+    def _add_tags_page(self, refs):
+        for tag in refs['nodes']:
+            # annotated tags point at a tag object, which in turn points at the commit
+            target = tag['target']
+            sha = target['target']['oid'] if 'target' in target else target['oid']
+            GitHub.all_tags_and_shas.append((tag['name'], sha))
+
+        GitHubGraphQL.tags_fetched = True
+        GitHubGraphQL.tags_cursor = refs['pageInfo']['endCursor']
+        GitHub.found_all_tags = not refs['pageInfo']['hasNextPage']
+
+        if GitHub.found_all_tags:
+            # a new list, so indexes built over the unsorted pages are rebuilt
+            GitHub.all_tags_and_shas = GitHubGraphQL._sort_tags(GitHub.all_tags_and_shas)
+
+    @staticmethod
+    def _sort_tags(tags):
+        # highest version first like the rest tags listing, with tags that aren't versions last, by name
+        versions = sorted((tag for tag in tags if parse_version(tag[0]) is not None),
+                          key=lambda tag: parse_version(tag[0]), reverse=True)
+        others = sorted((tag for tag in tags if parse_version(tag[0]) is None), key=lambda tag: tag[0], reverse=True)
+
+        return versions + others
+
+    def _add_history_page(self, ref):
+        GitHubGraphQL.history_fetched = True
+
+        if ref is None:
+            # the branch doesn't exist (yet), so there is no history to read
+            GitHub.found_all_commits = True
+            return
+
+        history = ref['target']['history']
+
+        for commit in history['nodes']:
+            GitHub.all_commits.append({'sha': commit['oid'], 'commit': {'message': commit['message']}})
+
+        GitHubGraphQL.history_cursor = history['pageInfo']['endCursor']
+        GitHub.found_all_commits = not history['pageInfo']['hasNextPage']
+
+    def _verify_repo_existence(self, url, org, repo, token=None):
+        method = '_verify_repo_existence'
+        commons.print_msg(GitHubGraphQL.clazz, method, 'begin')
+
+        if GitHub.token is None:
+            commons.print_msg(GitHubGraphQL.clazz, method, 'The GitHub GraphQL api requires GITHUB_TOKEN, using the '
+                                                           'rest api instead', 'WARN')
+
+        if not self._use_graphql():
+            super()._verify_repo_existence(url, org, repo, token)
+            return
+
+        # the first page of tags and history comes along with the existence check
+        self._run_query(with_tags=not GitHubGraphQL.tags_fetched, with_history=not GitHubGraphQL.history_fetched)
+
+        commons.print_msg(GitHubGraphQL.clazz, method, 'end')
+
+    def get_all_tags_and_shas_from_github(self, need_snapshot=0, need_release=0, need_tag=None, need_base=False):
+        method = 'get_all_tags_and_shas_from_github'
+
+        if not self._use_graphql():
+            return super().get_all_tags_and_shas_from_github(need_snapshot, need_release, need_tag, need_base)
+
+        # the tags are only in version order once they have all been read
+        while not GitHub.found_all_tags:
+            self._run_query(with_tags=True, with_history=not GitHubGraphQL.history_fetched)
+
+        commons.print_msg(GitHubGraphQL.clazz, method, '{} total tags'.format(len(GitHub.all_tags_and_shas)))
+
+        # if using cal_ver and short_year format filter output to remove long_year format
+        if self.config.version_strategy == 'calver_year' and self.config.calver_year_format == 'short':
+            return self._filter_out_calver_long_year_tags(GitHub.all_tags_and_shas)
+
+        return GitHub.all_tags_and_shas
+
+    def get_all_commits_from_github(self, start_from_sha=None):
+        method = 'get_all_commits_from_github'
+
+        if not self._use_graphql():
+            return super().get_all_commits_from_github(start_from_sha)
+
+        while not GitHub.found_all_commits and not (GitHubGraphQL.history_fetched and self._get_commit_index(
+                GitHub.all_commits).contains(start_from_sha)):
+            self._run_query(with_tags=not GitHubGraphQL.tags_fetched, with_history=True)
+
+        commons.print_msg(GitHubGraphQL.clazz, method, '{} total commits'.format(len(GitHub.all_commits)))
+
+        return GitHub.all_commits
+
+    def _get_commit_range(self, beginning_sha, ending_sha=None):
+        if not self._use_graphql():
+            return super()._get_commit_range(beginning_sha, ending_sha)
+
+        # the history is already being paged through graphql, so walk it rather than calling the rest compare api
+        return None
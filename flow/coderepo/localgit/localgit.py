@@ -0,0 +1,128 @@
+#!/usr/bin/python
+# localgit.py
+
+import os
+import re
+import subprocess
+from subprocess import TimeoutExpired
+
+import flow.utils.commons as commons
+
+
+class LocalGit:
+    """
+    Answers tag and commit history questions from the local checkout with git plumbing commands
+    instead of paging the GitHub REST api.  Only used when the working directory is a full (not shallow)
+    clone of the configured org/repo.
+    """
+    clazz = 'LocalGit'
+    git_timeout = 120
+
+    def __init__(self, repo_path='.'):
+        self.repo_path = repo_path
+
+    def _git(self, args):
+        method = '_git'
+
+        cmd = ['git', '-C', self.repo_path] + args
+
+        try:
+            git_process = subprocess.Popen(cmd, shell=False, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError as e:
+            commons.print_msg(LocalGit.clazz, method, "Failed calling {cmd}. {err}".format(cmd=' '.join(cmd), err=e))
+            return None
+
+        try:
+            git_output, git_errors = git_process.communicate(timeout=LocalGit.git_timeout)
+        except TimeoutExpired:
+            git_process.kill()
+            git_process.communicate()
+            commons.print_msg(LocalGit.clazz, method, "Timed out calling {}".format(' '.join(cmd)), 'WARN')
+            return None
+
+        if git_process.returncode != 0:
+            return None
+
+        return git_output.decode('utf-8')
+
+    def is_clone_of(self, org, repo):
+        method = 'is_clone_of'
+
+        if (self._git(['rev-parse', '--is-inside-work-tree']) or '').strip() != 'true':
+            commons.print_msg(LocalGit.clazz, method, 'Not running inside a git checkout')
+            return False
+
+        if (self._git(['rev-parse', '--is-shallow-repository']) or '').strip() != 'false':
+            commons.print_msg(LocalGit.clazz, method, 'Local checkout is shallow, history is incomplete')
+            return False
+
+        remote_url = (self._git(['config', '--get', 'remote.origin.url']) or '').strip()
+        # matches both https://host/org/repo(.git) and git@host:org/repo(.git)
+        if not re.search(r'[/:]' + re.escape(str(org)) + '/' + re.escape(str(repo)) + r'(\.git)?/?$', remote_url,
+                         re.IGNORECASE):
+            commons.print_msg(LocalGit.clazz, method, "Local checkout origin {remote} is not {org}/{repo}".format(
+                remote=remote_url, org=org, repo=repo))
+            return False
+
+        return True
+
+    def fetch_tags(self):
+        # brings tags and branches up to date with origin, dropping tags that only exist locally, so that a stale
+        # checkout doesn't hand back a version that is already taken.  Returns False when origin can't be reached.
+        method = 'fetch_tags'
+
+        if self._git(['fetch', '--quiet', '--force', '--prune', '--prune-tags', '--tags', 'origin']) is None:
+            commons.print_msg(LocalGit.clazz, method, 'Failed fetching tags from origin', 'WARN')
+            return False
+
+        return True
+
+    def get_all_tags_and_shas(self):
+        # newest version first, like the github tags api.  Annotated tags are peeled to the commit they point at.
+        output = self._git(['for-each-ref', '--sort=-v:refname',
+                            '--format=%(refname:short)%09%(objectname)%09%(*objectname)', 'refs/tags'])
+        if output is None:
+            return None
+
+        tags = []
+        for line in output.splitlines():
+            name, sha, peeled_sha = line.split('\t')
+            tags.append((name, peeled_sha if peeled_sha else sha))
+
+        return tags
+
+    def resolve_branch(self, branch):
+        # None when the branch isn't in the checkout, HEAD could be a commit from a different branch
+        for ref in ['refs/remotes/origin/' + str(branch), 'refs/heads/' + str(branch)]:
+            sha = self._git(['rev-parse', '--verify', '--quiet', ref + '^{commit}'])
+            if sha is not None and len(sha.strip()) > 0:
+                return sha.strip()
+
+        return None
+
+    def has_commit(self, sha):
+        if sha is None or len(str(sha).strip()) == 0:
+            return False
+
+        return self._git(['cat-file', '-e', str(sha) + '^{commit}']) is not None
+
+    def is_ancestor(self, ancestor_sha, descendant_sha):
+        return self._git(['merge-base', '--is-ancestor', ancestor_sha, descendant_sha]) is not None
+
+    def get_commits(self, head, since_sha=None):
+        # same shape as the simplified github commits api, newest first
+        revision_range = head if since_sha is None else since_sha + '..' + head
+
+        output = self._git(['log', '--format=%H%x00%B%x1e', revision_range])
+        if output is None:
+            return None
+
+        commits = []
+        for record in output.split('\x1e'):
+            record = record.strip('\n')
+            if len(record) == 0:
+                continue
+            sha, message = record.split('\x00', 1)
+            commits.append({'sha': sha, 'commit': {'message': message.rstrip('\n')}})
+
+        return commits
@@ -1,6 +1,8 @@
 #!/usr/bin/python
 # graphite.py
 
+from time import time
+
 from flow.buildconfig import BuildConfig
 from flow.metrics.metrics_abc import Metrics
 
@@ -39,3 +41,9 @@ class Graphite(Metrics):
         #     commons.print_msg(self.clazz, method, "Metrics Write Failed ()".format(e), 'ERROR')
 
         commons.print_msg(self.clazz, method, 'end')
+
+    def write_gauge(self, name, value):
+        method = 'write_gauge'
+
+        message = "{0}.{1}.{2} {3} {4}\n".format(self.prefix, name, self.config.project_name, value, int(time()))
+        commons.print_msg(self.clazz, method, "Metrics Gauge {}".format(message.strip()))
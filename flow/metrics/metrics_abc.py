@@ -5,3 +5,7 @@ class Metrics(metaclass=ABCMeta):
     @abstractmethod
     def write_metric(self, task, action):
         pass
+
+    def write_gauge(self, name, value):
+        # not abstract so that existing Metrics implementations keep working, they just don't record gauges
+        pass
@@ -8,6 +8,7 @@ from flow.buildconfig import BuildConfig
 from flow.projecttracking.project_tracking_abc import Project_Tracking
 
 import flow.utils.commons as commons
+import flow.utils.transport as transport
 from flow.utils.commons import Object
 
 #https://<site-url>/rest/api/3/<resource-name>
@@ -129,7 +130,7 @@ class Jira(Project_Tracking):
 
         try:
             commons.print_msg(Jira.clazz, method, project_detail['url'])
-            resp = requests.get(project_detail['url'], headers=headers, timeout=self.http_timeout)
+            resp = transport.get(project_detail['url'], headers=headers, timeout=self.http_timeout)
         except requests.ConnectionError as e:
             commons.print_msg(Jira.clazz, method, "Failed retrieving project detail from call to {}".format(
                 project_detail.get('url', '')), 'ERROR')
@@ -162,7 +163,7 @@ class Jira(Project_Tracking):
 
         try:
             commons.print_msg(Jira.clazz, method, story_detail['url'])
-            resp = requests.get(story_detail['url'], headers=headers, timeout=self.http_timeout)
+            resp = transport.get(story_detail['url'], headers=headers, timeout=self.http_timeout)
         except requests.ConnectionError as e:
             commons.print_msg(Jira.clazz, method, "Failed retrieving story detail from call to {}".format(
                 story_detail.get('url', '')), 'ERROR')
@@ -213,7 +214,7 @@ class Jira(Project_Tracking):
                 commons.print_msg(Jira.clazz, method, 'Post body for create project version:\n{}'.format(version_to_post.to_JSON()))
 
                 try:
-                    resp = requests.post(jira_url, version_to_post.to_JSON(), headers=headers, timeout=self.http_timeout)
+                    resp = transport.post(jira_url, version_to_post.to_JSON(), headers=headers, timeout=self.http_timeout)
 
                     if resp.status_code != 201:
                         commons.print_msg(Jira.clazz, method, "Unable to create version {version} for project {project} \r\n "
@@ -241,7 +242,7 @@ class Jira(Project_Tracking):
         version_exists = False
 
         try:
-            resp = requests.get(jira_url, headers=headers, timeout=self.http_timeout)
+            resp = transport.get(jira_url, headers=headers, timeout=self.http_timeout)
             if resp.status_code != 200:
                     commons.print_msg(Jira.clazz, method, "Unable to fetch versions for project {project} \r\n "
                                                           "Response: {response}".format(project=project_id, response=resp.text), 'WARN')
@@ -285,7 +286,7 @@ class Jira(Project_Tracking):
         commons.print_msg(Jira.clazz, method, jira_url)
 
         try:
-            resp = requests.put(jira_url, put_data, headers=headers, timeout=self.http_timeout)
+            resp = transport.put(jira_url, put_data, headers=headers, timeout=self.http_timeout)
 
             if resp.status_code != 204:
                 commons.print_msg(Jira.clazz, method, "Unable to add version {version} to issue {story} \r\n "
@@ -7,6 +7,7 @@ from flow.buildconfig import BuildConfig
 from flow.projecttracking.project_tracking_abc import Project_Tracking
 
 import flow.utils.commons as commons
+import flow.utils.transport as transport
 from flow.utils.commons import Object
 
 
@@ -111,7 +112,7 @@ class Tracker(Project_Tracking):
         for story_detail in tracker_story_details:
             try:
                 commons.print_msg(Tracker.clazz, method, story_detail['url'])
-                resp = requests.get(story_detail['url'], headers=headers, timeout=self.http_timeout)
+                resp = transport.get(story_detail['url'], headers=headers, timeout=self.http_timeout)
             except requests.ConnectionError as e:
                 commons.print_msg(Tracker.clazz, method, 'Connection error. ' + str(e), 'ERROR')
                 exit(1)
@@ -163,7 +164,7 @@ class Tracker(Project_Tracking):
             commons.print_msg(Tracker.clazz, method, label_to_post.to_JSON())
 
             try:
-                resp = requests.post(tracker_url, label_to_post.to_JSON(), headers=headers, timeout=self.http_timeout)
+                resp = transport.post(tracker_url, label_to_post.to_JSON(), headers=headers, timeout=self.http_timeout)
 
                 if resp.status_code != 200:
                     commons.print_msg(Tracker.clazz, method, "Unable to tag story {story} with label {lbl} \r\n "
@@ -2,7 +2,6 @@
 # sonarmodule.py
 
 import os
-import subprocess
 import time
 
 from flow.buildconfig import BuildConfig
@@ -14,6 +13,9 @@ import flow.utils.commons as commons
 class SonarQube(Static_Quality_Analysis):
     clazz = 'SonarQube'
     config = BuildConfig
+    # seconds the sonar runner may run in total, and without printing anything
+    scan_timeout = 3600
+    scan_inactivity_timeout = 600
 
     def __init__(self, config_override=None):
         method = '__init__'
@@ -107,23 +109,23 @@ class SonarQube(Static_Quality_Analysis):
                 sonar_cmd = 'java -Dsonar.projectKey="' + self.config.sonar_project_key + '" -Dsonar.projectName="' + self.config.sonar_project_key + '" -Dsonar.projectVersion="' + self.config.version_number + '" -Dproject.home="$PWD" -jar $SONAR_HOME/' + sonar_runner_executable + ' -e -X'
             commons.print_msg(SonarQube.clazz, method, sonar_cmd)
 
-        p = subprocess.Popen(sonar_cmd.split(), shell=False, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-
-        while p.poll() is None:
-            line = p.stdout.readline().decode('utf-8').strip(' \r\n')
-
-            commons.print_msg(SonarQube.clazz, method, line)
+        execution_failures = []
 
+        def check_line(line):
             if 'EXECUTION FAILURE' in line:
                 commons.print_msg(SonarQube.clazz, method, "Failed to execute Sonar: {}".format(line), 'ERROR')
-                process_failed = True
+                execution_failures.append(line)
 
-        p_output, errs = p.communicate(timeout=120)
+        p = commons.run_command(sonar_cmd.split(), SonarQube.clazz, method, timeout=SonarQube.scan_timeout,
+                                inactivity_timeout=SonarQube.scan_inactivity_timeout, on_line=check_line)
 
-        for line in p_output.splitlines():
-            commons.print_msg(SonarQube.clazz, method, line.decode('utf-8'))
+        if len(execution_failures) > 0:
+            process_failed = True
 
-        if p.returncode != 0:
+        if p.timed_out is not None:
+            commons.print_msg(SonarQube.clazz, method, "Timed out calling sonar runner", 'ERROR')
+            process_failed = True
+        elif p.returncode != 0:
             commons.print_msg(SonarQube.clazz, method, "Failed calling sonar runner. Return code of {}"
                               .format(p.returncode),
                              'ERROR')
@@ -1,11 +1,16 @@
 #!/usr/bin/python
 #commons.py
 
+import collections
 import json
 import os
 import re
+import selectors
+import signal
 import subprocess
 import sys
+import tarfile
+import time
 from enum import Enum
 
 from pydispatch import dispatcher
@@ -64,6 +69,34 @@ def write_to_file(path, text, open_func=open, mode="a"):
         f.write(text)
 
 
+def get_setting(settings, section, option, env_var):
+    # env_var, else option in the section of settings.ini.  None when neither is set or the value is blank.
+    value = os.getenv(env_var)
+    if value is None and settings is not None and settings.has_option(section, option):
+        value = settings.get(section, option)
+
+    if not isinstance(value, str) or len(value.strip()) == 0:
+        return None
+
+    return value.strip()
+
+
+def get_int_setting(settings, section, option, env_var, default):
+    method = 'get_int_setting'
+
+    value = get_setting(settings, section, option, env_var)
+
+    if value is None:
+        return default
+
+    try:
+        return int(value)
+    except ValueError:
+        print_msg(clazz, method, "Invalid {option} {value}, using {default}".format(option=option, value=value,
+                                                                                  default=default), 'WARN')
+        return default
+
+
 def get_files_of_type_from_directory(file_type, directory):
     out = os.listdir(directory)
     out = [os.path.join(directory, element) for element in out]
@@ -82,6 +115,104 @@ def execute_command(cmd):
     return output
 
 
+class CommandResult:
+    def __init__(self, returncode, output, timed_out=None):
+        self.returncode = returncode
+        # the last lines the command wrote
+        self.output = output
+        # None, or 'timeout' or 'inactivity' when the command was killed for running or being silent too long
+        self.timed_out = timed_out
+
+
+# seconds a killed command gets to exit after SIGTERM before it is sent SIGKILL
+kill_grace_seconds = 5
+
+
+def _kill_process_group(process):
+    # the command runs in its own session, so this also reaches whatever it started
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=kill_grace_seconds)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+    except ProcessLookupError:
+        process.wait()
+
+
+def run_command(cmd, class_name, method, timeout=None, inactivity_timeout=None, on_line=None, output_lines=200,
+                env=None):
+    # Runs cmd (a list) and logs its output under class_name/method a line at a time, as it is written.
+    #
+    # timeout is a wall clock limit for the whole command and inactivity_timeout a limit on how long it may go
+    # without writing anything, both in seconds.  A command over either limit is killed along with every process
+    # it started.  on_line is called with each line.  stdin is closed, so a command can't wait on (or leave
+    # behind a broken) terminal.  Returns a CommandResult holding the last output_lines lines.
+    process = subprocess.Popen(cmd, shell=False, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT, env=env, start_new_session=True)
+
+    output = collections.deque(maxlen=output_lines)
+    timed_out = None
+    started = last_output = time.monotonic()
+    pending = b''
+
+    def emit(raw_line):
+        line = raw_line.decode('utf-8', errors='replace').strip(' \r\n')
+        print_msg(class_name, method, line)
+        output.append(line)
+        if on_line is not None:
+            on_line(line)
+
+    with selectors.DefaultSelector() as selector:
+        selector.register(process.stdout, selectors.EVENT_READ)
+
+        while True:
+            now = time.monotonic()
+            if timeout is not None and now - started >= timeout:
+                timed_out = 'timeout'
+                break
+            if inactivity_timeout is not None and now - last_output >= inactivity_timeout:
+                timed_out = 'inactivity'
+                break
+
+            deadlines = []
+            if timeout is not None:
+                deadlines.append(started + timeout)
+            if inactivity_timeout is not None:
+                deadlines.append(last_output + inactivity_timeout)
+
+            if not selector.select(min(deadlines) - now if len(deadlines) > 0 else None):
+                continue
+
+            chunk = os.read(process.stdout.fileno(), 65536)
+            if not chunk:
+                break
+
+            last_output = time.monotonic()
+            lines = (pending + chunk).split(b'\n')
+            pending = lines.pop()
+
+            for line in lines:
+                emit(line)
+
+    if pending:
+        emit(pending)
+
+    if timed_out is None:
+        # the command closed its output, it still has to exit within the wall clock limit
+        try:
+            process.wait(timeout=None if timeout is None else max(0, started + timeout - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            timed_out = 'timeout'
+
+    if timed_out is not None:
+        _kill_process_group(process)
+
+    process.stdout.close()
+
+    return CommandResult(process.returncode, list(output), timed_out)
+
+
 def verify_version(config):
     method = 'verify_version'
 
@@ -90,6 +221,54 @@ def verify_version(config):
         exit(1)
 
 
+def extract_tar_stream(fileobj, destination, strip_components=0):
+    # Extracts a (possibly compressed) tar read sequentially from fileobj, e.g. an http response body, into
+    # destination without needing the whole archive on disk first.  The first strip_components directories of
+    # every member path are dropped.  Members that would land outside of destination are refused.
+    method = 'extract_tar_stream'
+
+    destination = os.path.realpath(destination)
+    os.makedirs(destination, exist_ok=True)
+
+    def strip(name):
+        parts = [part for part in name.replace('\\', '/').split('/') if part not in ('', '.')]
+        return '/'.join(parts[strip_components:])
+
+    def inside_destination(path):
+        return os.path.realpath(os.path.join(destination, path)).startswith(destination + os.sep)
+
+    count = 0
+
+    with tarfile.open(fileobj=fileobj, mode='r|*') as tar:
+        for member in tar:
+            name = strip(member.name)
+
+            if not name:
+                continue
+
+            if os.path.isabs(member.name) or not inside_destination(name):
+                raise tarfile.TarError("Refusing to extract {} outside of {}".format(member.name, destination))
+
+            if member.islnk():
+                member.linkname = strip(member.linkname)
+                if not inside_destination(member.linkname):
+                    raise tarfile.TarError("Refusing to extract link {} outside of {}".format(member.name,
+                                                                                           destination))
+            elif member.issym():
+                if os.path.isabs(member.linkname) or not inside_destination(
+                        os.path.join(os.path.dirname(name), member.linkname)):
+                    raise tarfile.TarError("Refusing to extract link {} outside of {}".format(member.name,
+                                                                                           destination))
+
+            member.name = name
+            tar.extract(member, destination)
+            count += 1
+
+    print_msg(clazz, method, "Extracted {count} entries into {dest}".format(count=count, dest=destination))
+
+    return count
+
+
 class DeploymentState(Enum):
     failure = 'fail'
     success = 'success'
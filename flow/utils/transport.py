@@ -0,0 +1,100 @@
+#!/usr/bin/python
+# transport.py
+
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import flow.utils.commons as commons
+from flow.buildconfig import BuildConfig
+
+clazz = 'transport'
+
+# one keep-alive session per scheme://host, shared by every integration for the life of the flow run
+sessions = {}
+sessions_lock = threading.Lock()
+
+default_pool_maxsize = 10
+default_timeout = 60
+
+
+def _get_project_setting(option, default):
+    if BuildConfig.settings is None or not BuildConfig.settings.has_option('project', option):
+        return default
+
+    try:
+        return int(BuildConfig.settings.get('project', option))
+    except ValueError:
+        return default
+
+
+def get_session(url):
+    method = 'get_session'
+
+    parts = urlsplit(url)
+    host = '{scheme}://{netloc}'.format(scheme=parts.scheme, netloc=parts.netloc)
+
+    with sessions_lock:
+        if host not in sessions:
+            pool_maxsize = _get_project_setting('http_pool_maxsize', default_pool_maxsize)
+            commons.print_msg(clazz, method, "Opening http session for {host} with pool size {size}".format(
+                host=host, size=pool_maxsize))
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            sessions[host] = session
+
+        return sessions[host]
+
+
+def close_sessions():
+    with sessions_lock:
+        for session in sessions.values():
+            session.close()
+        sessions.clear()
+
+
+def forget_sessions():
+    # for a forked process: its sessions' sockets are the parent's, so they are dropped without being closed
+    global sessions_lock
+    sessions_lock = threading.Lock()
+    sessions.clear()
+
+
+def request(http_method, url, **kwargs):
+    if kwargs.get('timeout') is None:
+        kwargs['timeout'] = _get_project_setting('http_timeout_default_seconds', default_timeout)
+
+    return get_session(url).request(http_method, url, **kwargs)
+
+
+# the helpers below take the same arguments as their requests.<verb> counterparts
+
+
+def get(url, params=None, **kwargs):
+    return request('GET', url, params=params, **kwargs)
+
+
+def head(url, **kwargs):
+    kwargs.setdefault('allow_redirects', False)
+    return request('HEAD', url, **kwargs)
+
+
+def post(url, data=None, json=None, **kwargs):
+    return request('POST', url, data=data, json=json, **kwargs)
+
+
+def put(url, data=None, **kwargs):
+    return request('PUT', url, data=data, **kwargs)
+
+
+def patch(url, data=None, **kwargs):
+    return request('PATCH', url, data=data, **kwargs)
+
+
+def delete(url, **kwargs):
+    return request('DELETE', url, **kwargs)
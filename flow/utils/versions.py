@@ -0,0 +1,18 @@
+#!/usr/bin/python
+# versions.py
+
+import re
+
+# same format as GitHub.convert_semver_string_to_semver_tag_array
+semver_regex = re.compile(r'^v(\d+)\.(\d+).(\d+)(\+(\d+))?$')
+
+
+def parse_version(name):
+    # v1.2.3+4 as (1, 2, 3, 4), a release (v1.2.3) has a build of 0.  None when name isn't a version.
+    match = semver_regex.fullmatch(str(name).strip())
+
+    if not match:
+        return None
+
+    return (int(match.group(1)), int(match.group(2)), int(match.group(3)),
+            int(match.group(5)) if match.group(5) is not None else 0)
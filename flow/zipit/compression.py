@@ -0,0 +1,118 @@
+#!/usr/bin/python
+# compression.py
+
+import gzip
+import lzma
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# compression name -> file name suffixes that imply it
+compression_suffixes = {
+    'gz': ['.tar.gz', '.tgz'],
+    'xz': ['.tar.xz', '.txz'],
+    'zst': ['.tar.zst', '.tzst']
+}
+
+
+def compression_for_file_name(file_name):
+    for compression, suffixes in compression_suffixes.items():
+        if any(file_name.endswith(suffix) for suffix in suffixes):
+            return compression
+
+    return 'none'
+
+
+def available_compressions():
+    compressions = ['none', 'gz', 'xz']
+    if zstandard is not None:
+        compressions.append('zst')
+
+    return compressions
+
+
+class BlockCompressor:
+    """
+    Write only file object that compresses what is written to it in fixed size blocks on a pool of threads, and
+    writes the compressed blocks to fileobj in order.
+
+    Every block becomes a complete gzip member (or xz stream).  Both formats allow members to be concatenated, so
+    the result is an ordinary .gz/.xz file that gunzip, xz and tarfile read as one.  zlib and lzma release the GIL
+    while compressing, which is what makes the threads worth it.  At most threads * 2 blocks are held in memory.
+    """
+    block_size = 4 * 1024 * 1024
+
+    def __init__(self, fileobj, compression, level, threads):
+        self.fileobj = fileobj
+        self.threads = max(1, threads)
+
+        if compression == 'gz':
+            self.compress_block = lambda block: gzip.compress(block, compresslevel=level, mtime=0)
+        elif compression == 'xz':
+            self.compress_block = lambda block: lzma.compress(block, preset=level)
+        else:
+            raise ValueError("Block compression is not supported for {}".format(compression))
+
+        self.buffer = bytearray()
+        self.pending = []
+        self.executor = ThreadPoolExecutor(max_workers=self.threads)
+
+    def write(self, data):
+        self.buffer.extend(data)
+
+        while len(self.buffer) >= BlockCompressor.block_size:
+            self._submit(bytes(self.buffer[:BlockCompressor.block_size]))
+            del self.buffer[:BlockCompressor.block_size]
+
+        return len(data)
+
+    def _submit(self, block):
+        self.pending.append(self.executor.submit(self.compress_block, block))
+
+        while len(self.pending) > self.threads * 2:
+            self.fileobj.write(self.pending.pop(0).result())
+
+    def close(self):
+        if self.executor is None:
+            return
+
+        if len(self.buffer) > 0 or len(self.pending) == 0:
+            # an empty input still has to be a valid (empty) compressed file
+            self._submit(bytes(self.buffer))
+            self.buffer = bytearray()
+
+        for future in self.pending:
+            self.fileobj.write(future.result())
+
+        self.pending = []
+        self.executor.shutdown()
+        self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def compressed_writer(fileobj, compression, level, threads):
+    # Wraps fileobj in a writer for compression.  'none' writes straight through, zstd uses its own worker threads.
+    if compression == 'none':
+        return fileobj
+
+    if compression == 'zst':
+        if zstandard is None:
+            raise ValueError("zst compression needs the zstandard package")
+
+        return zstandard.ZstdCompressor(level=level, threads=threads).stream_writer(fileobj, closefd=False)
+
+    if threads <= 1:
+        if compression == 'gz':
+            return gzip.GzipFile(fileobj=fileobj, mode='wb', compresslevel=level, mtime=0)
+
+        return lzma.LZMAFile(fileobj, mode='wb', preset=level)
+
+    return BlockCompressor(fileobj, compression, level, threads)
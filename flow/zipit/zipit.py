@@ -1,17 +1,21 @@
 #!/usr/bin/python
 # zipit.py
 
+import os
 import tarfile
 
 import flow.utils.commons as commons
+import flow.zipit.compression as compression
 
 from flow.artifactstorage.artifactory.artifactory import Artifactory
+from flow.buildconfig import BuildConfig
 
 
 class ZipIt:
     clazz = 'ZipIt'
+    default_levels = {'gz': 6, 'xz': 6, 'zst': 3}
 
-    def __init__(self, mode, name, contents):
+    def __init__(self, mode, name, contents, compression_type=None):
         method = '__init__'
         commons.print_msg(ZipIt.clazz, method, 'begin')
 
@@ -19,20 +23,59 @@ class ZipIt:
 
         if mode == 'artifactory':
             ZipIt.zip_contents = contents
-            self._zip_it(name, contents)
+            self._zip_it(name, contents, compression_type)
             self._ship_it_artifactory(name)
 
         commons.print_msg(ZipIt.clazz, method, 'end')
 
-    def _zip_it(self, name, contents):
+    def _get_compression(self, name, compression_type):
+        # compression_type, else the setting, where 'auto' (the default) means whatever the file name says
+        method = '_get_compression'
+
+        if compression_type is None:
+            compression_type = commons.get_setting(BuildConfig.settings, 'zipit', 'compression',
+                                                   'ZIPIT_COMPRESSION') or 'auto'
+
+        if compression_type == 'auto':
+            compression_type = compression.compression_for_file_name(name)
+
+        if compression_type not in compression.available_compressions():
+            commons.print_msg(ZipIt.clazz, method, "Compression {type} is not available. Choose one of {all}".format(
+                type=compression_type, all=', '.join(compression.available_compressions())), 'ERROR')
+            exit(1)
+
+        try:
+            level = int(commons.get_setting(BuildConfig.settings, 'zipit', 'compression_level',
+                                            'ZIPIT_COMPRESSION_LEVEL') or ZipIt.default_levels.get(compression_type, 0))
+            threads = int(commons.get_setting(BuildConfig.settings, 'zipit', 'compression_threads',
+                                              'ZIPIT_COMPRESSION_THREADS') or os.cpu_count() or 1)
+        except ValueError as e:
+            commons.print_msg(ZipIt.clazz, method, "Invalid compression setting. {}".format(e), 'ERROR')
+            exit(1)
+
+        return compression_type, level, threads
+
+    def _zip_it(self, name, contents, compression_type=None):
         method = '_zip_it'
         commons.print_msg(ZipIt.clazz, method, 'begin')
 
         file_with_path = name.split('/')
 
+        compression_type, level, threads = self._get_compression(file_with_path[-1], compression_type)
+        commons.print_msg(ZipIt.clazz, method, "Creating {file} with {type} compression, level {level} on {threads} "
+                                               "threads".format(file=file_with_path[-1], type=compression_type,
+                                                                level=level, threads=threads))
+
         try:
-            with tarfile.open(file_with_path[-1], 'w') as tar:
-                tar.add(contents, name)
+            # the tar is written as a stream so it is compressed as it is created
+            with open(file_with_path[-1], 'wb') as archive:
+                writer = compression.compressed_writer(archive, compression_type, level, threads)
+                try:
+                    with tarfile.open(fileobj=writer, mode='w|') as tar:
+                        tar.add(contents, name)
+                finally:
+                    if writer is not archive:
+                        writer.close()
         except FileNotFoundError as e:
             commons.print_msg(Artifactory.clazz, method, "Could not locate files to zip. {}".format(e), 'ERROR')
             exit(1)
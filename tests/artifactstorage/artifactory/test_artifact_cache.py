@@ -0,0 +1,89 @@
+import os
+
+from flow.artifactstorage.artifactory.artifact_cache import ArtifactCache
+
+coordinates = ['release-repo', 'group', 'testproject', 'v1.0.0']
+
+
+def _artifact(tmpdir, name, content):
+    artifact = tmpdir.join(name)
+    artifact.write_binary(content)
+    return str(artifact)
+
+
+def test_put_then_get(tmpdir):
+    cache = ArtifactCache(str(tmpdir.join('cache')), 1024)
+    source = _artifact(tmpdir, 'testproject-v1.0.0.tar.gz', b'content')
+
+    cache.put(coordinates, 'sha1', 'testproject-v1.0.0.tar.gz', source)
+
+    destination = str(tmpdir.join('download.tar.gz'))
+    assert cache.get(coordinates, 'sha1', 'testproject-v1.0.0.tar.gz', destination) is True
+    with open(destination, 'rb') as downloaded:
+        assert downloaded.read() == b'content'
+
+
+def test_get_misses_other_checksum(tmpdir):
+    cache = ArtifactCache(str(tmpdir.join('cache')), 1024)
+    cache.put(coordinates, 'sha1', 'testproject-v1.0.0.tar.gz', _artifact(tmpdir, 'a.tar.gz', b'content'))
+
+    destination = str(tmpdir.join('download.tar.gz'))
+    assert cache.get(coordinates, 'othersha1', 'testproject-v1.0.0.tar.gz', destination) is False
+    assert not os.path.exists(destination)
+
+
+def test_least_recently_used_entries_are_evicted(tmpdir):
+    cache = ArtifactCache(str(tmpdir.join('cache')), 10)
+    cache.put(coordinates, 'old', 'old.tar.gz', _artifact(tmpdir, 'old.tar.gz', b'12345'))
+    cache.put(coordinates, 'used', 'used.tar.gz', _artifact(tmpdir, 'used.tar.gz', b'12345'))
+    os.utime(cache._entry_dir(coordinates, 'old'), (1, 1))
+    os.utime(cache._entry_dir(coordinates, 'used'), (2, 2))
+
+    # a hit makes 'used' the most recently used entry
+    assert cache.get(coordinates, 'used', 'used.tar.gz', str(tmpdir.join('download.tar.gz')))
+    cache.put(coordinates, 'new', 'new.tar.gz', _artifact(tmpdir, 'new.tar.gz', b'12345'))
+
+    assert not os.path.exists(cache._entry_dir(coordinates, 'old'))
+    assert os.path.exists(cache._entry_dir(coordinates, 'used'))
+    assert os.path.exists(cache._entry_dir(coordinates, 'new'))
+
+
+def test_eviction_removes_lock_file_and_empty_directories(tmpdir):
+    cache_dir = str(tmpdir.join('cache'))
+    cache = ArtifactCache(cache_dir, 5)
+    other_version = ['release-repo', 'group', 'testproject', 'v0.9.0']
+
+    with cache.locked(other_version, 'old'):
+        cache.put(other_version, 'old', 'old.tar.gz', _artifact(tmpdir, 'old.tar.gz', b'12345'))
+    os.utime(cache._entry_dir(other_version, 'old'), (1, 1))
+
+    with cache.locked(coordinates, 'new'):
+        cache.put(coordinates, 'new', 'new.tar.gz', _artifact(tmpdir, 'new.tar.gz', b'12345'))
+
+    assert not os.path.exists(cache._entry_dir(other_version, 'old') + ArtifactCache.lock_file)
+    assert not os.path.exists(os.path.join(cache_dir, *other_version))
+    assert os.path.exists(cache._entry_dir(coordinates, 'new'))
+    assert os.path.exists(cache._entry_dir(coordinates, 'new') + ArtifactCache.lock_file)
+
+
+def test_locked_entry_is_not_evicted(tmpdir):
+    cache = ArtifactCache(str(tmpdir.join('cache')), 10)
+    cache.put(coordinates, 'old', 'old.tar.gz', _artifact(tmpdir, 'old.tar.gz', b'12345'))
+    cache.put(coordinates, 'second', 'second.tar.gz', _artifact(tmpdir, 'second.tar.gz', b'12345'))
+    os.utime(cache._entry_dir(coordinates, 'old'), (1, 1))
+    os.utime(cache._entry_dir(coordinates, 'second'), (2, 2))
+
+    # another job is copying 'old' out of the cache, so the next least recently used entry goes instead
+    with cache.locked(coordinates, 'old'):
+        cache.put(coordinates, 'new', 'new.tar.gz', _artifact(tmpdir, 'new.tar.gz', b'12345'))
+
+    assert os.path.exists(cache._entry_dir(coordinates, 'old'))
+    assert not os.path.exists(cache._entry_dir(coordinates, 'second'))
+    assert os.path.exists(cache._entry_dir(coordinates, 'new'))
+
+
+def test_artifact_larger_than_cache_is_not_cached(tmpdir):
+    cache = ArtifactCache(str(tmpdir.join('cache')), 4)
+    cache.put(coordinates, 'sha1', 'big.tar.gz', _artifact(tmpdir, 'big.tar.gz', b'12345'))
+
+    assert not os.path.exists(cache._entry_dir(coordinates, 'sha1'))
@@ -1,14 +1,22 @@
+import hashlib
+import io
 import os
 import configparser
+import tarfile
+import zipfile
 from unittest.mock import MagicMock
 from unittest.mock import patch
 
 import pytest
 import responses
+import flow
 from flow.buildconfig import BuildConfig
+from requests.exceptions import ConnectionError
 from requests.exceptions import HTTPError
+from urllib3.exceptions import ProtocolError
 
-from flow.artifactstorage.artifactory.artifactory import Artifactory, ArtifactException
+from flow.artifactstorage.artifactory.artifactory import Artifactory, ArtifactException, ArtifactDownloadException, \
+    ArtifactStream
 
 mock_build_config_dict = {
     "projectInfo": {
@@ -145,6 +153,12 @@ response_body_artifactory_not_found = """
 """
 
 
+@pytest.fixture(autouse=True)
+def storage_listings_only(monkeypatch):
+    # the aql tests turn aql back on, the rest only mock storage listings
+    monkeypatch.setattr(Artifactory, 'aql_unavailable', True)
+
+
 # noinspection PyUnresolvedReferences
 @responses.activate
 def test_get_urls_of_artifacts(monkeypatch):
@@ -167,9 +181,9 @@ def test_get_urls_of_artifacts(monkeypatch):
 
     urls = art.get_urls_of_artifacts()
 
-    assert len(responses.calls) == 2
+    # one listing of the version folder serves every extension
+    assert len(responses.calls) == 1
     assert 'Authorization' not in responses.calls[0].request.headers
-    assert 'Authorization' not in responses.calls[1].request.headers
     assert urls == ["https://testdomain/artifactory/release-repo/group/testproject/v1.0.0/testproject.bob",
                     "https://testdomain/artifactory/release-repo/group/testproject/v1.0.0/testproject.vcl"]
 
@@ -177,11 +191,12 @@ def test_get_urls_of_artifacts(monkeypatch):
     monkeypatch.setenv('ARTIFACTORY_USER', 'fake_user')
     monkeypatch.setenv('ARTIFACTORY_TOKEN', artifactory_token)
 
+    # listings are kept per instance, forget it to list again with the token
+    art.version_listings.clear()
     urls = art.get_urls_of_artifacts()
 
-    assert len(responses.calls) == 4
-    assert responses.calls[2].request.headers['Authorization'] == 'Bearer ' + artifactory_token
-    assert responses.calls[3].request.headers['Authorization'] == 'Bearer ' + artifactory_token
+    assert len(responses.calls) == 2
+    assert responses.calls[1].request.headers['Authorization'] == 'Bearer ' + artifactory_token
     assert urls == ["https://testdomain/artifactory/release-repo/group/testproject/v1.0.0/testproject.bob", "https://testdomain/artifactory/release-repo/group/testproject/v1.0.0/testproject.vcl"]
 
 
@@ -216,6 +231,7 @@ def test_get_artifact_url(monkeypatch):
     artifactory_token = 'fake_token_b'
     monkeypatch.setenv('ARTIFACTORY_TOKEN', artifactory_token)
 
+    art.version_listings.clear()
     url = art.get_artifact_url()
     assert len(responses.calls) == 2
     assert responses.calls[1].request.headers['X-Api-Key'] == artifactory_token
@@ -255,6 +271,7 @@ def test_get_artifact_with_include_pom(monkeypatch):
     artifactory_token = 'fake_token_c'
     monkeypatch.setenv('ARTIFACTORY_TOKEN', artifactory_token)
 
+    art.version_listings.clear()
     url = art.get_artifact_url()
     assert len(responses.calls) == 2
     assert responses.calls[1].request.headers['Authorization'] == 'Basic ZmFrZV91c2VyOmZha2VfdG9rZW5fYw=='
@@ -475,3 +492,594 @@ def test_init_missing_artifactory():
         mock_printmsg_fn.assert_called_with('Artifactory', '__init__', "The build config associated with artifactory is missing key 'artifact'", 'ERROR')
 
 
+
+
+def _publish_config(checksum_publish='true'):
+    _b = MagicMock(BuildConfig)
+    _b.build_env_info = mock_build_config_dict['environments']['unittest']
+    _b.json_config = mock_build_config_dict
+    _b.project_name = mock_build_config_dict['projectInfo']['name']
+    _b.version_number = 'v1.0.0'
+    _b.artifact_extension = 'tar.gz'
+    _b.artifact_extensions = None
+    parser = configparser.ConfigParser()
+    parser.add_section('artifactory')
+    parser.set('artifactory', 'checksum_publish', checksum_publish)
+    _b.settings = parser
+    return _b
+
+
+def _shipped_settings():
+    settings = configparser.ConfigParser()
+    settings.read(os.path.join(os.path.dirname(flow.__file__), 'settings.ini'))
+    return settings
+
+
+def test_publish_workers_default_matches_settings_ini(monkeypatch):
+    monkeypatch.delenv('ARTIFACTORY_PUBLISH_WORKERS', raising=False)
+    _b = _publish_config()
+    _b.settings = None
+    without_settings = Artifactory(config_override=_b)._get_publish_workers()
+
+    _b.settings = _shipped_settings()
+    assert Artifactory(config_override=_b)._get_publish_workers() == without_settings == 4
+
+
+def test_download_segments_default_matches_settings_ini(monkeypatch):
+    monkeypatch.delenv('ARTIFACTORY_DOWNLOAD_SEGMENTS', raising=False)
+    _b = _publish_config()
+    _b.settings = None
+    without_settings = Artifactory(config_override=_b)._get_download_segments()
+
+    _b.settings = _shipped_settings()
+    assert Artifactory(config_override=_b)._get_download_segments() == without_settings == 4
+
+
+def test_download_and_extract_workers_defaults_match_settings_ini(monkeypatch):
+    monkeypatch.delenv('ARTIFACTORY_DOWNLOAD_WORKERS', raising=False)
+    monkeypatch.delenv('ARTIFACTORY_EXTRACT_WORKERS', raising=False)
+    _b = _publish_config()
+    _b.settings = None
+    art = Artifactory(config_override=_b)
+    without_settings = (art._get_download_workers(), art._get_extract_workers())
+
+    _b.settings = _shipped_settings()
+    assert (art._get_download_workers(), art._get_extract_workers()) == without_settings == (4, 2)
+
+
+publish_url = "https://testdomain/artifactory/release-repo/group/testproject/v1.0.0/testproject-v1.0.0.tar.gz"
+artifact_content = b'artifact content'
+artifact_sha1 = hashlib.sha1(artifact_content).hexdigest()
+
+
+# noinspection PyUnresolvedReferences
+@responses.activate
+def test_publish_skips_identical_artifact(tmpdir):
+    artifact = tmpdir.join('testproject-v1.0.0.tar.gz')
+    artifact.write_binary(artifact_content)
+
+    responses.add(responses.HEAD, publish_url, status=200, headers={'X-Checksum-Sha1': artifact_sha1})
+
+    art = Artifactory(config_override=_publish_config())
+    art.publish(str(artifact), 'testproject-v1.0.0.tar.gz')
+
+    assert [call.request.method for call in responses.calls] == ['HEAD']
+
+
+# noinspection PyUnresolvedReferences
+@responses.activate
+def test_publish_checksum_deploy_uploads_nothing(tmpdir):
+    artifact = tmpdir.join('testproject-v1.0.0.tar.gz')
+    artifact.write_binary(artifact_content)
+
+    responses.add(responses.HEAD, publish_url, status=404)
+    responses.add(responses.PUT, publish_url, status=201, body='{}')
+
+    art = Artifactory(config_override=_publish_config())
+    art.publish(str(artifact), 'testproject-v1.0.0.tar.gz')
+
+    assert [call.request.method for call in responses.calls] == ['HEAD', 'PUT']
+    put_request = responses.calls[1].request
+    assert put_request.headers['X-Checksum-Deploy'] == 'true'
+    assert put_request.headers['X-Checksum-Sha1'] == artifact_sha1
+    assert put_request.headers['X-Checksum-Sha256'] == hashlib.sha256(artifact_content).hexdigest()
+    assert not put_request.body
+
+
+# noinspection PyUnresolvedReferences
+@responses.activate
+def test_publish_uploads_when_checksum_unknown(tmpdir):
+    artifact = tmpdir.join('testproject-v1.0.0.tar.gz')
+    artifact.write_binary(artifact_content)
+
+    responses.add(responses.HEAD, publish_url, status=200, headers={'X-Checksum-Sha1': 'different'})
+    responses.add(responses.DELETE, publish_url, status=204)
+    responses.add(responses.PUT, publish_url, status=404, body='{"errors": []}')
+    responses.add(responses.PUT, publish_url, status=201, body='{}')
+
+    art = Artifactory(config_override=_publish_config())
+    art.publish(str(artifact), 'testproject-v1.0.0.tar.gz')
+
+    assert [call.request.method for call in responses.calls] == ['HEAD', 'DELETE', 'PUT', 'PUT']
+    upload_request = responses.calls[3].request
+    assert 'X-Checksum-Deploy' not in upload_request.headers
+    assert upload_request.headers['X-Checksum-Sha1'] == artifact_sha1
+
+
+# noinspection PyUnresolvedReferences
+@responses.activate
+def test_publish_without_checksum_publish(tmpdir):
+    artifact = tmpdir.join('testproject-v1.0.0.tar.gz')
+    artifact.write_binary(artifact_content)
+
+    responses.add(responses.HEAD, publish_url, status=404)
+    responses.add(responses.PUT, publish_url, status=201, body='{}')
+
+    art = Artifactory(config_override=_publish_config(checksum_publish='false'))
+    art.publish(str(artifact), 'testproject-v1.0.0.tar.gz')
+
+    assert [call.request.method for call in responses.calls] == ['HEAD', 'PUT']
+    assert 'X-Checksum-Sha1' not in responses.calls[1].request.headers
+
+
+# noinspection PyUnresolvedReferences
+@responses.activate
+def test_publish_build_artifact_reports_failed_upload_after_all_finish(monkeypatch, tmpdir):
+    monkeypatch.setattr(Artifactory, 'artifactory_files', [])
+    monkeypatch.setattr(Artifactory, 'artifactory_extensions', [])
+    monkeypatch.setenv('ARTIFACT_BUILD_DIRECTORY', str(tmpdir))
+    monkeypatch.setenv('ARTIFACTORY_PUBLISH_WORKERS', '2')
+    tmpdir.join('testproject-v1.0.0.jar').write_binary(b'jar')
+    tmpdir.join('testproject-v1.0.0.war').write_binary(b'war')
+
+    _b = _publish_config(checksum_publish='false')
+    _b.artifact_extension = None
+    _b.artifact_extensions = ['jar', 'war']
+
+    home_url = "https://testdomain/artifactory/release-repo/group/testproject/v1.0.0/"
+    responses.add(responses.HEAD, home_url + 'testproject-v1.0.0.jar', status=404)
+    responses.add(responses.HEAD, home_url + 'testproject-v1.0.0.war', status=404)
+    responses.add(responses.PUT, home_url + 'testproject-v1.0.0.jar', status=500, body='boom')
+    responses.add(responses.PUT, home_url + 'testproject-v1.0.0.war', status=201, body='{}')
+
+    art = Artifactory(config_override=_b)
+
+    with patch('flow.utils.commons.print_msg') as mock_printmsg_fn:
+        with pytest.raises(SystemExit):
+            art.publish_build_artifact()
+
+        mock_printmsg_fn.assert_any_call('Artifactory', '_publish_files', 'Failed publishing testproject-v1.0.0.jar',
+                                         'ERROR')
+
+    put_urls = sorted(call.request.url for call in responses.calls if call.request.method == 'PUT')
+    assert put_urls == [home_url + 'testproject-v1.0.0.jar', home_url + 'testproject-v1.0.0.war']
+
+
+# noinspection PyUnresolvedReferences
+@responses.activate
+def test_publish_large_artifact_retries_interrupted_upload(monkeypatch, tmpdir):
+    monkeypatch.setenv('ARTIFACTORY_LARGE_UPLOAD_THRESHOLD_MB', '0')
+    monkeypatch.setattr('flow.artifactstorage.artifactory.artifactory.time.sleep', lambda seconds: None)
+    artifact = tmpdir.join('testproject-v1.0.0.tar.gz')
+    artifact.write_binary(artifact_content)
+
+    responses.add(responses.HEAD, publish_url, status=404)
+    responses.add(responses.PUT, publish_url, status=404, body='{"errors": []}')
+    responses.add(responses.PUT, publish_url, body=ConnectionError('Broken pipe'))
+    responses.add(responses.HEAD, publish_url, status=404)
+    responses.add(responses.PUT, publish_url, status=201, body='{}')
+
+    art = Artifactory(config_override=_publish_config())
+    art.publish(str(artifact), 'testproject-v1.0.0.tar.gz')
+
+    assert [call.request.method for call in responses.calls] == ['HEAD', 'PUT', 'PUT', 'HEAD', 'PUT']
+    assert responses.calls[4].request.headers['Content-Length'] == str(len(artifact_content))
+
+
+# noinspection PyUnresolvedReferences
+@responses.activate
+def test_publish_large_artifact_interrupted_but_completed_on_server(monkeypatch, tmpdir):
+    monkeypatch.setenv('ARTIFACTORY_LARGE_UPLOAD_THRESHOLD_MB', '0')
+    monkeypatch.setattr('flow.artifactstorage.artifactory.artifactory.time.sleep', lambda seconds: None)
+    artifact = tmpdir.join('testproject-v1.0.0.tar.gz')
+    artifact.write_binary(artifact_content)
+
+    responses.add(responses.HEAD, publish_url, status=404)
+    responses.add(responses.PUT, publish_url, status=404, body='{"errors": []}')
+    responses.add(responses.PUT, publish_url, status=502, body='Bad Gateway')
+    responses.add(responses.HEAD, publish_url, status=200, headers={'X-Checksum-Sha1': artifact_sha1})
+
+    art = Artifactory(config_override=_publish_config())
+    with patch('flow.utils.commons.print_msg') as mock_printmsg_fn:
+        art.publish(str(artifact), 'testproject-v1.0.0.tar.gz')
+
+    assert [call.request.method for call in responses.calls] == ['HEAD', 'PUT', 'PUT', 'HEAD']
+    mock_printmsg_fn.assert_any_call('Artifactory', 'publish', "Published {} by an interrupted "
+                                                               "upload".format(publish_url))
+
+
+class _InterruptedBody(io.RawIOBase):
+    # hands out the first part of the content and then drops the connection
+    def __init__(self, content):
+        self.content = content
+        self.sent = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.sent:
+            raise ProtocolError('Connection broken: IncompleteRead')
+        self.sent = True
+        buffer[:len(self.content)] = self.content
+        return len(self.content)
+
+
+def _range_callback(request):
+    start, end = request.headers['Range'][len('bytes='):].split('-')
+    end = int(end) if end else len(artifact_content) - 1
+    return 206, {}, artifact_content[int(start):end + 1]
+
+
+# noinspection PyUnresolvedReferences
+@responses.activate
+def test_download_artifact_resumes_interrupted_download(monkeypatch, tmpdir):
+    monkeypatch.setattr('flow.artifactstorage.artifactory.artifactory.time.sleep', lambda seconds: None)
+    monkeypatch.setattr(Artifactory, 'download_chunk_size', 6)
+    download_path = str(tmpdir.join('testproject-v1.0.0.tar.gz'))
+    interrupted_body = io.BufferedReader(_InterruptedBody(artifact_content[:6]))
+
+    responses.add(responses.HEAD, publish_url, status=200, headers={'Content-Length': str(len(artifact_content)),
+                                                                    'Accept-Ranges': 'bytes'})
+    responses.add(responses.GET, publish_url, status=200, body=interrupted_body, auto_calculate_content_length=False)
+    responses.add_callback(responses.GET, publish_url, callback=_range_callback)
+
+    art = Artifactory(config_override=_publish_config())
+    art.download_artifact(publish_url, download_path)
+
+    assert 'Range' not in responses.calls[1].request.headers
+    assert responses.calls[2].request.headers['Range'] == 'bytes=6-'
+    with open(download_path, 'rb') as downloaded:
+        assert downloaded.read() == artifact_content
+
+
+# noinspection PyUnresolvedReferences
+@responses.activate
+def test_download_artifact_in_concurrent_ranges(monkeypatch, tmpdir):
+    monkeypatch.setenv('ARTIFACTORY_DOWNLOAD_SEGMENTS', '3')
+    monkeypatch.setenv('ARTIFACTORY_PARALLEL_DOWNLOAD_THRESHOLD_MB', '0')
+    download_path = str(tmpdir.join('testproject-v1.0.0.tar.gz'))
+
+    responses.add(responses.HEAD, publish_url, status=200, headers={'Content-Length': str(len(artifact_content)),
+                                                                    'Accept-Ranges': 'bytes'})
+    responses.add_callback(responses.GET, publish_url, callback=_range_callback)
+
+    art = Artifactory(config_override=_publish_config())
+    art.download_artifact(publish_url, download_path)
+
+    ranges = sorted(call.request.headers['Range'] for call in responses.calls if call.request.method == 'GET')
+    assert ranges == ['bytes=0-5', 'bytes=12-15', 'bytes=6-11']
+    with open(download_path, 'rb') as downloaded:
+        assert downloaded.read() == artifact_content
+
+
+# noinspection PyUnresolvedReferences
+@responses.activate
+def test_download_artifact_failure_raises(monkeypatch, tmpdir):
+    responses.add(responses.HEAD, publish_url, status=404)
+    responses.add(responses.GET, publish_url, status=404)
+
+    art = Artifactory(config_override=_publish_config())
+
+    with pytest.raises(ArtifactDownloadException):
+        art.download_artifact(publish_url, str(tmpdir.join('testproject-v1.0.0.tar.gz')))
+
+
+def _cache_config(tmpdir):
+    _b = _publish_config()
+    _b.settings.set('artifactory', 'cache_dir', str(tmpdir.join('cache')))
+    return _b
+
+
+# noinspection PyUnresolvedReferences
+@responses.activate
+def test_published_artifact_is_downloaded_from_cache(tmpdir):
+    artifact = tmpdir.join('testproject-v1.0.0.tar.gz')
+    artifact.write_binary(artifact_content)
+    download_dir = tmpdir.mkdir('download')
+
+    responses.add(responses.HEAD, publish_url, status=200, headers={'X-Checksum-Sha1': artifact_sha1})
+
+    art = Artifactory(config_override=_cache_config(tmpdir))
+    art.publish(str(artifact), 'testproject-v1.0.0.tar.gz')
+    art._download_artifact_through_cache(publish_url, str(download_dir.join('testproject-v1.0.0.tar.gz')),
+                                         'testproject-v1.0.0.tar.gz')
+
+    assert [call.request.method for call in responses.calls] == ['HEAD', 'HEAD']
+    assert download_dir.join('testproject-v1.0.0.tar.gz').read_binary() == artifact_content
+
+
+# noinspection PyUnresolvedReferences
+@responses.activate
+def test_downloaded_artifact_is_cached(tmpdir):
+    first_path = str(tmpdir.join('first.tar.gz'))
+    second_path = str(tmpdir.join('second.tar.gz'))
+
+    responses.add(responses.HEAD, publish_url, status=200, headers={'X-Checksum-Sha1': artifact_sha1})
+    responses.add(responses.GET, publish_url, status=200, body=artifact_content)
+
+    art = Artifactory(config_override=_cache_config(tmpdir))
+    art._download_artifact_through_cache(publish_url, first_path, 'testproject-v1.0.0.tar.gz')
+    art._download_artifact_through_cache(publish_url, second_path, 'testproject-v1.0.0.tar.gz')
+
+    assert len([call for call in responses.calls if call.request.method == 'GET']) == 1
+    with open(second_path, 'rb') as downloaded:
+        assert downloaded.read() == artifact_content
+
+
+# noinspection PyUnresolvedReferences
+@responses.activate
+def test_get_artifact_url_matches_multi_part_extension(monkeypatch):
+    monkeypatch.setattr(Artifactory, 'artifactory_extensions', [])
+    _b = _publish_config()
+    _b.artifact_extension = None
+    _b.artifact_extensions = ['tar.gz', 'gz', 'jar']
+    art = Artifactory(config_override=_b)
+
+    responses.add(responses.GET, "https://testdomain/artifactory/api/storage/release-repo/group/testproject/v1.0.0",
+                  status=200, json={'children': [{'uri': '/testproject-v1.0.0.tar.gz', 'folder': False},
+                                                 {'uri': '/testproject-v1.0.0.jar', 'folder': False}]})
+
+    home_url = "https://testdomain/artifactory/release-repo/group/testproject/v1.0.0"
+    assert art.get_urls_of_artifacts() == [home_url + '/testproject-v1.0.0.tar.gz',
+                                           home_url + '/testproject-v1.0.0.tar.gz',
+                                           home_url + '/testproject-v1.0.0.jar']
+    assert len(responses.calls) == 1
+
+
+def _tar_gz_of(tmpdir, name, content):
+    source = tmpdir.join(name)
+    source.write_binary(content)
+    archive = tmpdir.join(name + '.tar.gz')
+    with tarfile.open(str(archive), 'w:gz') as tar:
+        tar.add(str(source), arcname=name)
+    return archive.read_binary()
+
+
+# noinspection PyUnresolvedReferences
+@responses.activate
+def test_download_and_extract_artifacts_concurrently(monkeypatch, tmpdir):
+    monkeypatch.setattr(Artifactory, 'artifactory_extensions', [])
+    monkeypatch.setenv('ARTIFACTORY_DOWNLOAD_WORKERS', '2')
+    monkeypatch.setenv('ARTIFACTORY_EXTRACT_WORKERS', '2')
+    download_dir = tmpdir.mkdir('download')
+
+    _b = _publish_config()
+    _b.artifact_extension = None
+    _b.artifact_extensions = ['tar.gz', 'jar']
+
+    home_url = "https://testdomain/artifactory/release-repo/group/testproject/v1.0.0/"
+    responses.add(responses.GET, "https://testdomain/artifactory/api/storage/release-repo/group/testproject/v1.0.0",
+                  status=200, json={'children': [{'uri': '/testproject-v1.0.0.tar.gz', 'folder': False},
+                                                 {'uri': '/testproject-v1.0.0.jar', 'folder': False}]})
+    responses.add(responses.HEAD, home_url + 'testproject-v1.0.0.tar.gz', status=404)
+    responses.add(responses.HEAD, home_url + 'testproject-v1.0.0.jar', status=404)
+    responses.add(responses.GET, home_url + 'testproject-v1.0.0.tar.gz', status=200,
+                  body=_tar_gz_of(tmpdir, 'app.txt', b'app'))
+    responses.add(responses.GET, home_url + 'testproject-v1.0.0.jar', status=200, body=b'jar')
+
+    art = Artifactory(config_override=_b)
+    art.download_and_extract_artifacts_locally(str(download_dir) + '/')
+
+    assert download_dir.join('app.txt').read_binary() == b'app'
+    assert not download_dir.join('testproject-v1.0.0.tar.gz').exists()
+    assert download_dir.join('testproject-v1.0.0.jar').read_binary() == b'jar'
+    assert len([call for call in responses.calls if '/api/storage/' in call.request.url]) == 1
+
+
+# noinspection PyUnresolvedReferences
+@responses.activate
+def test_download_and_extract_artifacts_concurrently_reports_failures_at_the_end(monkeypatch, tmpdir):
+    monkeypatch.setattr(Artifactory, 'artifactory_extensions', [])
+    monkeypatch.setenv('ARTIFACTORY_DOWNLOAD_WORKERS', '2')
+    download_dir = tmpdir.mkdir('download')
+
+    _b = _publish_config()
+    _b.artifact_extension = None
+    _b.artifact_extensions = ['war', 'jar']
+
+    home_url = "https://testdomain/artifactory/release-repo/group/testproject/v1.0.0/"
+    responses.add(responses.GET, "https://testdomain/artifactory/api/storage/release-repo/group/testproject/v1.0.0",
+                  status=200, json={'children': [{'uri': '/testproject-v1.0.0.jar', 'folder': False}]})
+    responses.add(responses.HEAD, home_url + 'testproject-v1.0.0.jar', status=404)
+    responses.add(responses.GET, home_url + 'testproject-v1.0.0.jar', status=200, body=b'jar')
+
+    art = Artifactory(config_override=_b)
+
+    with patch('flow.utils.commons.print_msg') as mock_printmsg_fn:
+        with pytest.raises(SystemExit):
+            art.download_and_extract_artifacts_locally(str(download_dir) + '/')
+
+        mock_printmsg_fn.assert_called_with('Artifactory', '_download_and_extract_concurrently',
+                                            'Failed downloading or extracting war', 'ERROR')
+
+    assert download_dir.join('testproject-v1.0.0.jar').read_binary() == b'jar'
+
+
+def _stream_config(extension):
+    _b = _publish_config()
+    _b.settings.set('artifactory', 'stream_extract', 'true')
+    _b.artifact_extension = extension
+    return _b
+
+
+# noinspection PyUnresolvedReferences
+@responses.activate
+def test_artifact_stream_resumes_interrupted_download(monkeypatch):
+    monkeypatch.setattr('flow.artifactstorage.artifactory.artifactory.time.sleep', lambda seconds: None)
+
+    responses.add(responses.GET, publish_url, status=200, body=io.BufferedReader(_InterruptedBody(artifact_content[:6])),
+                  auto_calculate_content_length=False)
+    responses.add_callback(responses.GET, publish_url, callback=_range_callback)
+
+    with ArtifactStream(publish_url, {}, None, 60, 3) as stream:
+        assert stream.read(6) == artifact_content[:6]
+        assert stream.read() == artifact_content[6:]
+
+    assert responses.calls[1].request.headers['Range'] == 'bytes=6-'
+
+
+# noinspection PyUnresolvedReferences
+@responses.activate
+def test_stream_extract_tar(monkeypatch, tmpdir):
+    monkeypatch.setattr(Artifactory, 'artifactory_extensions', [])
+    download_dir = tmpdir.mkdir('download')
+
+    responses.add(responses.GET, "https://testdomain/artifactory/api/storage/release-repo/group/testproject/v1.0.0",
+                  status=200, json={'children': [{'uri': '/testproject-v1.0.0.tar.gz', 'folder': False}]})
+    responses.add(responses.GET, publish_url, status=200, body=_tar_gz_of(tmpdir, 'app.txt', b'app'))
+
+    art = Artifactory(config_override=_stream_config('tar.gz'))
+    art.download_and_extract_artifacts_locally(str(download_dir) + '/')
+
+    assert download_dir.join('app.txt').read_binary() == b'app'
+    assert download_dir.listdir() == [download_dir.join('app.txt')]
+
+
+# noinspection PyUnresolvedReferences
+@responses.activate
+def test_stream_extract_zip(monkeypatch, tmpdir):
+    monkeypatch.setattr(Artifactory, 'artifactory_extensions', [])
+    download_dir = tmpdir.mkdir('download')
+    zip_url = publish_url.replace('.tar.gz', '.zip')
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as z:
+        z.writestr('app.txt', b'app')
+
+    responses.add(responses.GET, "https://testdomain/artifactory/api/storage/release-repo/group/testproject/v1.0.0",
+                  status=200, json={'children': [{'uri': '/testproject-v1.0.0.zip', 'folder': False}]})
+    responses.add(responses.GET, zip_url, status=200, body=archive.getvalue())
+
+    art = Artifactory(config_override=_stream_config('zip'))
+    art.download_and_extract_artifacts_locally(str(download_dir) + '/')
+
+    assert download_dir.join('app.txt').read_binary() == b'app'
+    assert download_dir.listdir() == [download_dir.join('app.txt')]
+
+
+aql_url = "https://testdomain/artifactory/api/search/aql"
+
+
+def _aql_result(version, name, sha1='sha1', modified='2024-01-01T00:00:00.000Z'):
+    return {'repo': 'release-repo', 'path': 'group/testproject/' + version, 'name': name, 'size': 10,
+            'actual_sha1': sha1, 'sha256': 'sha256', 'modified': modified}
+
+
+# noinspection PyUnresolvedReferences
+@responses.activate
+def test_find_artifact_versions_in_one_query(monkeypatch):
+    monkeypatch.setattr(Artifactory, 'aql_unavailable', False)
+    responses.add(responses.POST, aql_url, status=200, json={'results': [
+        _aql_result('v1.1.0', 'testproject-v1.1.0.tar.gz', sha1='abc')]})
+
+    art = Artifactory(config_override=_publish_config())
+    artifacts = art.find_artifact_versions(name_pattern='*.tar.gz', modified_since='2023-12-01T00:00:00Z')
+
+    assert len(responses.calls) == 1
+    query = responses.calls[0].request.body
+    assert query.startswith('items.find(')
+    assert '"path": {"$match": "group/testproject/*"}' in query
+    assert '"name": {"$match": "*.tar.gz"}' in query
+    assert '"modified": {"$gt": "2023-12-01T00:00:00Z"}' in query
+    assert responses.calls[0].request.headers['Content-type'] == 'text/plain'
+    assert artifacts == [{'version': 'v1.1.0', 'name': 'testproject-v1.1.0.tar.gz',
+                          'url': 'https://testdomain/artifactory/release-repo/group/testproject/v1.1.0/'
+                                 'testproject-v1.1.0.tar.gz',
+                          'size': 10, 'sha1': 'abc', 'sha256': 'sha256', 'modified': '2024-01-01T00:00:00.000Z'}]
+
+
+# noinspection PyUnresolvedReferences
+@responses.activate
+def test_get_latest_version_from_base(monkeypatch):
+    monkeypatch.setattr(Artifactory, 'aql_unavailable', False)
+    responses.add(responses.POST, aql_url, status=200, json={'results': [
+        _aql_result('v1.0.0+2', 'testproject-v1.0.0+2.tar.gz'),
+        _aql_result('v1.1.0+1', 'testproject-v1.1.0+1.tar.gz'),
+        _aql_result('v1.0.0+10', 'testproject-v1.0.0+10.tar.gz'),
+        _aql_result('v1.0.0+10', 'testproject-v1.0.0+10.pom'),
+        _aql_result('v1.0.0', 'testproject-v1.0.0.tar.gz')]})
+
+    art = Artifactory(config_override=_publish_config())
+
+    assert art.get_all_versions() == ['v1.1.0+1', 'v1.0.0+10', 'v1.0.0+2', 'v1.0.0']
+    assert art.get_latest_version_from_base('v1.0.0') == 'v1.0.0+10'
+    assert art.get_latest_version_from_base('v2.0.0') is None
+
+
+# noinspection PyUnresolvedReferences
+@responses.activate
+def test_aql_search_failure(monkeypatch):
+    monkeypatch.setattr(Artifactory, 'aql_unavailable', False)
+    responses.add(responses.POST, aql_url, status=400, body='Failed to parse query')
+
+    art = Artifactory(config_override=_publish_config())
+
+    with pytest.raises(ArtifactException):
+        art.find_artifact_versions()
+
+
+# noinspection PyUnresolvedReferences
+@responses.activate
+def test_artifact_url_found_with_aql(monkeypatch):
+    monkeypatch.setattr(Artifactory, 'aql_unavailable', False)
+    responses.add(responses.POST, aql_url, status=200, json={'results': [
+        _aql_result('v1.0.0', 'testproject-v1.0.0.tar.gz', sha1='abc'),
+        _aql_result('v1.0.0', 'testproject-v1.0.0.pom', sha1='def')]})
+
+    art = Artifactory(config_override=_publish_config())
+    url = art._get_artifact_url('tar.gz')
+
+    # the version folder is looked up with one aql search, no storage listing
+    assert len(responses.calls) == 1
+    assert '"path": {"$match": "group/testproject/v1.0.0"}' in responses.calls[0].request.body
+    assert url == 'https://testdomain/artifactory/release-repo/group/testproject/v1.0.0/testproject-v1.0.0.tar.gz'
+    assert art._get_artifact_url('pom') == \
+        'https://testdomain/artifactory/release-repo/group/testproject/v1.0.0/testproject-v1.0.0.pom'
+    assert len(responses.calls) == 1
+    # and the artifact cache can use the checksum without asking for it
+    assert art.artifact_checksums[url] == 'abc'
+
+
+# noinspection PyUnresolvedReferences
+@responses.activate
+def test_artifact_url_falls_back_to_storage_listing_without_aql(monkeypatch):
+    monkeypatch.setattr(Artifactory, 'aql_unavailable', False)
+    responses.add(responses.POST, aql_url, status=403, body='Forbidden')
+    responses.add(responses.GET, "https://testdomain/artifactory/api/storage/release-repo/group/testproject/v1.0.0",
+                  body=response_body_artifactory, status=200, content_type="application/json")
+
+    art = Artifactory(config_override=_publish_config())
+
+    assert art._get_artifact_url('bob') == \
+        'https://testdomain/artifactory/release-repo/group/testproject/v1.0.0/testproject.bob'
+    assert [call.request.method for call in responses.calls] == ['POST', 'GET']
+    assert Artifactory.aql_unavailable is True
+
+
+# noinspection PyUnresolvedReferences
+@responses.activate
+def test_cached_download_uses_aql_checksum(monkeypatch, tmpdir):
+    monkeypatch.setattr(Artifactory, 'aql_unavailable', False)
+    responses.add(responses.POST, aql_url, status=200, json={'results': [
+        _aql_result('v1.0.0', 'testproject-v1.0.0.tar.gz', sha1=artifact_sha1)]})
+    responses.add(responses.GET, publish_url, status=200, body=artifact_content)
+
+    art = Artifactory(config_override=_cache_config(tmpdir))
+    art._download_artifact_through_cache(art._get_artifact_url('tar.gz'), str(tmpdir.join('first.tar.gz')),
+                                         'testproject-v1.0.0.tar.gz')
+    art._download_artifact_through_cache(publish_url, str(tmpdir.join('second.tar.gz')), 'testproject-v1.0.0.tar.gz')
+
+    # the only HEAD is the download's range probe, the checksum came from aql and the second download is a hit
+    assert [call.request.method for call in responses.calls] == ['POST', 'HEAD', 'GET']
+    assert tmpdir.join('second.tar.gz').read_binary() == artifact_content
@@ -1,13 +1,18 @@
+import functools
 import os
 import subprocess
+import threading
+import time
 from unittest.mock import MagicMock
 from unittest.mock import patch
 from subprocess import TimeoutExpired
 
 import pytest
+from flow.cloud.cloudfoundry.app_inventory import AppInventory
 from flow.cloud.cloudfoundry.cloudfoundry import CloudFoundry
 
 from flow.buildconfig import BuildConfig
+import flow.utils.commons as commons
 
 mock_build_config_dict = {
     "projectInfo": {
@@ -97,10 +102,39 @@ mock_build_config_missing_org_dict = {
     }
 }
 
-mock_started_apps_already_started = 'CI-HelloWorld-v2.9.0+1'
+mock_started_apps_already_started = '''Getting apps in org ci / space development as user...
+OK
+
+name                     requested state   instances   memory   disk   urls
+CI-HelloWorld-v2.9.0+1   started           1/1         1G       1G     ci-helloworld.apps-np.fake.com
+'''
 mock_list_of_existing_apps = [ 'CI-HelloWorld-v2.9.0+1'.encode(), 'CI-HelloWorld-v2.7.0'.encode(), 'CI-HelloWorld-v2.8.0+12'.encode(), 'CI-HelloWorld-v1.15.2'.encode()]
 mock_routes_domains_output = 'CI-HelloWorld apps-np.fake.com'
 
+mock_cf_apps_output = '''Getting apps in org ci / space development as user...
+OK
+
+name                     requested state   instances   memory   disk   urls
+CI-HelloWorld-v2.9.0+1   started           1/1         1G       1G     ci-helloworld.apps-np.fake.com
+CI-HelloWorld-v2.8.0+1   stopped           0/1         1G       1G     ci-helloworld-v2.apps-np.fake.com
+CI-HelloWorld-v2.7.0+1   stopped           0/1         1G       1G
+Other-v1.0.0             started           1/1         1G       1G     other.apps-np.fake.com
+'''
+
+mock_cf_routes_output = '''Getting routes for org ci / space development as user ...
+
+space         host               domain             port   path   type   apps                                            service
+development   ci-helloworld      apps-np.fake.com                        CI-HelloWorld-v2.9.0+1
+development   ci-helloworld-v2   apps-np.fake.com                        CI-HelloWorld-v2.8.0+1,CI-HelloWorld-v2.9.0+1
+development   other              apps-np.fake.com                        Other-v1.0.0
+'''
+
+
+@pytest.fixture(autouse=True)
+def reset_inventory(monkeypatch):
+    monkeypatch.setattr(CloudFoundry, 'inventory', None)
+
+
 def test_verify_required_attributes_missing_user(monkeypatch):
     if os.getenv('DEPLOYMENT_USER'):
         monkeypatch.delenv('DEPLOYMENT_USER')
@@ -250,7 +284,7 @@ def test_get_started_apps_already_started_failed_cmd():
 
                     with patch.object(_cf, '_cf_logout'):
                         _cf._get_started_apps('true')
-        mock_printmsg_fn.assert_any_call('CloudFoundry', '_get_started_apps', "Failed calling cf apps | grep CI-HelloWorld*-v\\d*\\.\\d*\\.\\d* | grep started | awk '{print $1}'. Return code of 1", 'ERROR')
+        mock_printmsg_fn.assert_any_call('CloudFoundry', '_load_inventory', "Failed calling cf apps. Return code of 1", 'ERROR')
 
 
 
@@ -402,8 +436,7 @@ def test_determine_push_location_called_by_cf_push():
     with patch('flow.utils.commons.print_msg') as mock_printmsg_fn:
         with patch('os.listdir', return_value=['file1.jar', 'file2.war', 'file3.abc']):
             with patch('os.path.isfile', return_value=True):
-                with patch.object(subprocess, 'Popen') as mocked_popen:
-                    mocked_popen.return_value.returncode = 0
+                with patch('flow.utils.commons.run_command', return_value=commons.CommandResult(0, [])):
                     _b = MagicMock(BuildConfig)
                     _b.artifact_extension = 'war'
                     _b.push_location = 'fake_push_dir'
@@ -781,4 +814,181 @@ def test_start_stop_delete_app_with_timeout():
     mock_printmsg_fn.assert_any_call('CloudFoundry', '_start_stop_delete_app', command_string)
     mock_printmsg_fn.assert_any_call('CloudFoundry', '_start_stop_delete_app', error_string, 'ERROR')
     assert mocked_popen.return_value.communicate.call_count == 2
-    
\ No newline at end of file
+    
+
+def _mock_inventory():
+    inventory = AppInventory('CI-HelloWorld')
+    inventory.load_cf_apps(mock_cf_apps_output.encode())
+    inventory.load_cf_routes(mock_cf_routes_output.encode())
+
+    return inventory
+
+
+def test_app_inventory_parses_cf_apps_and_routes():
+    inventory = _mock_inventory()
+
+    assert inventory.app_names('started') == ['CI-HelloWorld-v2.9.0+1']
+    assert inventory.app_names('stopped') == ['CI-HelloWorld-v2.8.0+1', 'CI-HelloWorld-v2.7.0+1']
+    assert inventory.route_lines('CI-HelloWorld-v2.9.0+1') == b'ci-helloworld apps-np.fake.com\n' \
+                                                               b'ci-helloworld-v2 apps-np.fake.com'
+    assert inventory.route_lines('CI-HelloWorld-v2.7.0+1') == b''
+
+
+def test_app_inventory_records_changes():
+    inventory = _mock_inventory()
+
+    inventory.unmap_route('CI-HelloWorld-v2.8.0+1', 'ci-helloworld-v2', 'apps-np.fake.com')
+    inventory.map_route('CI-HelloWorld-v2.8.0+1', 'ci-helloworld', 'apps-np.fake.com')
+    inventory.set_state('CI-HelloWorld-v2.8.0+1', 'started')
+    inventory.remove_app('CI-HelloWorld-v2.7.0+1')
+    inventory.add_pushed_app('CI-HelloWorld-v3.0.0+1')
+
+    assert inventory.route_lines('CI-HelloWorld-v2.8.0+1') == b'ci-helloworld apps-np.fake.com'
+    assert inventory.app_names('started') == ['CI-HelloWorld-v2.9.0+1', 'CI-HelloWorld-v2.8.0+1',
+                                              'CI-HelloWorld-v3.0.0+1']
+    assert inventory.app_names('stopped') == []
+    assert inventory.has_routes('CI-HelloWorld-v3.0.0+1') is False
+
+
+def test_load_inventory_lists_space_once():
+    with patch('flow.utils.commons.print_msg'):
+        with patch.object(subprocess, 'Popen') as mocked_popen:
+            mocked_popen.return_value.returncode = 0
+            mocked_popen.return_value.communicate.side_effect = [(mock_cf_apps_output.encode(), None),
+                                                                 (mock_cf_routes_output.encode(), None)]
+            _b = MagicMock(BuildConfig)
+            _b.project_name = 'CI-HelloWorld'
+            _b.version_number = 'v3.0.0+1'
+            _cf = CloudFoundry(_b)
+
+            _cf._get_stopped_apps()
+            _cf._get_started_apps()
+            routes, domains = _cf._split_app_routes_to_list(_cf._fetch_app_routes('CI-HelloWorld-v2.8.0+1'))
+
+    assert mocked_popen.call_count == 2
+    assert CloudFoundry.stopped_apps == b'CI-HelloWorld-v2.8.0+1\nCI-HelloWorld-v2.7.0+1'
+    assert CloudFoundry.started_apps == b'CI-HelloWorld-v2.9.0+1'
+    assert routes == ['ci-helloworld-v2']
+    assert domains == ['apps-np.fake.com']
+
+
+def test_modify_route_and_app_action_update_inventory(monkeypatch):
+    monkeypatch.setattr(CloudFoundry, 'inventory', _mock_inventory())
+
+    with patch('flow.utils.commons.print_msg'):
+        with patch.object(subprocess, 'Popen') as mocked_popen:
+            mocked_popen.return_value.returncode = 0
+            mocked_popen.return_value.communicate.return_value = (b'OK', None)
+            _cf = CloudFoundry(MagicMock(BuildConfig))
+
+            _cf._modify_route_for_app('ci-helloworld-v2', 'CI-HelloWorld-v2.8.0+1', 'apps-np.fake.com', 'unmap')
+            _cf._start_stop_delete_app('CI-HelloWorld-v2.8.0+1', 'delete')
+
+    assert 'CI-HelloWorld-v2.8.0+1' not in CloudFoundry.inventory.apps
+    assert CloudFoundry.inventory.routes[('ci-helloworld-v2', 'apps-np.fake.com')]['destinations'] == \
+        {'CI-HelloWorld-v2.9.0+1': None}
+
+
+def test_run_concurrently_bounds_workers_and_collects_failures(monkeypatch):
+    monkeypatch.setenv('CF_PARALLEL_OPERATIONS', '2')
+    lock = threading.Lock()
+    running = []
+    peak = []
+
+    def task(name):
+        with lock:
+            running.append(name)
+            peak.append(len(running))
+        time.sleep(0.05)
+        with lock:
+            running.remove(name)
+        return name.endswith('bad')
+
+    with patch('flow.utils.commons.print_msg'):
+        _cf = CloudFoundry(MagicMock(BuildConfig))
+        failed = _cf._run_concurrently([(name, functools.partial(task, name))
+                                        for name in ['a', 'b-bad', 'c', 'd', 'e-bad']])
+
+    assert failed == ['b-bad', 'e-bad']
+    assert max(peak) == 2
+
+
+def test_unmap_modify_app_state_versions_unmaps_before_delete_and_reports_failures(monkeypatch):
+    calls = []
+    lock = threading.Lock()
+
+    def modify_route(route, app, domain, action):
+        with lock:
+            calls.append((action, app))
+        return app == 'CI-HelloWorld-v2.7.0+1'
+
+    def app_action(app, action):
+        with lock:
+            calls.append((action, app))
+        return False
+
+    monkeypatch.setattr(CloudFoundry, 'cf_domain', 'apps-np.fake.com')
+
+    with patch('flow.utils.commons.print_msg') as mock_printmsg_fn:
+        _cf = CloudFoundry(MagicMock(BuildConfig))
+
+        with patch.object(_cf, '_fetch_app_routes', return_value=mock_routes_domains_output.encode()), \
+                patch.object(_cf, '_modify_route_for_app', side_effect=modify_route), \
+                patch.object(_cf, '_start_stop_delete_app', side_effect=app_action), \
+                patch.object(_cf, '_cf_logout'), \
+                patch('os.system'):
+            with pytest.raises(SystemExit):
+                _cf._unmap_modify_app_state_versions(['CI-HelloWorld-v2.8.0+1', 'CI-HelloWorld-v2.7.0+1',
+                                                      'CI-HelloWorld-v2.6.0+1'], 'delete')
+
+    for app in ['CI-HelloWorld-v2.8.0+1', 'CI-HelloWorld-v2.6.0+1']:
+        assert calls.index(('unmap', app)) < calls.index(('delete', app))
+    assert ('delete', 'CI-HelloWorld-v2.7.0+1') not in calls
+    mock_printmsg_fn.assert_any_call('CloudFoundry', '_unmap_modify_app_state_versions',
+                                     'Failed unmapping routes from CI-HelloWorld-v2.7.0+1', 'ERROR')
+
+
+def test_cf_login_rejected_credentials():
+    with patch('flow.utils.commons.print_msg') as mock_printmsg_fn:
+        with patch('flow.utils.commons.run_command',
+                   return_value=commons.CommandResult(1, ['Authenticating...', 'Credentials were rejected, please '
+                                                                               'try again.'])):
+            _cf = CloudFoundry(MagicMock(BuildConfig))
+            CloudFoundry.cf_user = 'DUMMY'
+
+            with pytest.raises(SystemExit):
+                _cf._cf_login()
+
+    mock_printmsg_fn.assert_any_call('CloudFoundry', 'cf_login', 'Make sure that your credentials are correct for '
+                                                                'DUMMY', 'ERROR')
+    mock_printmsg_fn.assert_any_call('CloudFoundry', 'cf_login', 'Failed calling cf login. Return code of 1. Make '
+                                                                'sure the user DUMMY has proper permission to deploy.',
+                                     'ERROR')
+
+
+def test_cf_push_timeout_deletes_failed_app():
+    with patch('flow.utils.commons.print_msg') as mock_printmsg_fn:
+        with patch('flow.utils.commons.run_command',
+                   return_value=commons.CommandResult(-15, ['Staging app...'], 'inactivity')):
+            _b = MagicMock(BuildConfig)
+            _b.artifact_extension = None
+            _b.push_location = 'fordeployment'
+            _b.project_name = 'CI-HelloWorld'
+            _b.version_number = 'v2.9.0+1'
+            _cf = CloudFoundry(_b)
+
+            with patch.object(_cf, '_start_stop_delete_app') as mock_delete, patch.object(_cf, '_cf_logout'):
+                with pytest.raises(SystemExit):
+                    _cf._cf_push('fake_manifest.yml', True)
+
+    mock_delete.assert_called_once_with('CI-HelloWorld-v2.9.0+1', 'delete')
+    mock_printmsg_fn.assert_any_call('CloudFoundry', '_cf_push', 'Timed out calling cf push CI-HelloWorld-v2.9.0+1 -p '
+                                                                 'fordeployment -f fake_manifest.yml  ', 'ERROR')
+
+
+def test_parallel_operations_default_to_one_for_the_cli():
+    _b = MagicMock(BuildConfig)
+    _b.settings = None
+
+    with patch('flow.utils.commons.print_msg'):
+        assert CloudFoundry(_b)._get_parallel_operations() == 1
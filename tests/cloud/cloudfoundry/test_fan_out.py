@@ -0,0 +1,119 @@
+import json
+import os
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import pytest
+from flow.cloud.cloudfoundry.cloudfoundry import CloudFoundry
+from flow.cloud.cloudfoundry.fan_out import CloudFoundryFanOut
+
+from flow.buildconfig import BuildConfig
+
+
+class FakeDriver:
+    # records what each target process was given in results_dir, and fails the targets marked to fail
+
+    def __init__(self, config, results_dir):
+        self.config = config
+        self.results_dir = results_dir
+
+    def deploy(self, force_deploy=False, manifest=None, delete_on_fail=False):
+        cf_config = self.config.build_env_info['cf']
+
+        with open(os.path.join(self.results_dir, cf_config['org']), 'w') as result:
+            json.dump({'cf': cf_config, 'cf_home': os.environ['CF_HOME'], 'manifest': manifest}, result)
+
+        if cf_config.get('fail'):
+            exit(1)
+
+
+def _mock_config(targets, policy=None):
+    _b = MagicMock(BuildConfig)
+    _b.build_env_info = {'cf': {'domain': 'apps.fake.com', 'space': 'production', 'targets': targets}}
+    if policy is not None:
+        _b.build_env_info['cf']['policy'] = policy
+
+    return _b
+
+
+def _fan_out(_b, results_dir):
+    return CloudFoundryFanOut(create_driver=lambda: FakeDriver(_b, str(results_dir)), config_override=_b)
+
+
+def test_deploys_every_target_with_its_own_cf_home(tmpdir):
+    _b = _mock_config([{'name': 'east', 'apiEndpoint': 'api.east.fake.com', 'org': 'east-org'},
+                       {'apiEndpoint': 'api.west.fake.com', 'org': 'west-org', 'space': 'dr'}])
+
+    with patch('flow.utils.commons.print_msg') as mock_printmsg_fn, \
+            patch.object(CloudFoundry, 'download_cf_cli') as mock_download:
+        _fan_out(_b, tmpdir).deploy(manifest='production.manifest.yml')
+
+    east = json.loads(tmpdir.join('east-org').read())
+    west = json.loads(tmpdir.join('west-org').read())
+
+    assert east['cf'] == {'domain': 'apps.fake.com', 'space': 'production', 'apiEndpoint': 'api.east.fake.com',
+                          'org': 'east-org'}
+    assert west['cf']['space'] == 'dr'
+    assert east['manifest'] == 'production.manifest.yml'
+    assert east['cf_home'] != west['cf_home']
+    assert not os.path.exists(east['cf_home'])
+    mock_download.assert_called_once_with()
+    mock_printmsg_fn.assert_any_call('CloudFoundryFanOut', 'deploy', 'east: SUCCEEDED')
+    mock_printmsg_fn.assert_any_call('CloudFoundryFanOut', 'deploy', 'api.west.fake.com/west-org/dr: SUCCEEDED')
+
+
+def test_all_policy_fails_on_any_failed_target(tmpdir):
+    _b = _mock_config([{'name': 'east', 'apiEndpoint': 'api.east.fake.com', 'org': 'east-org'},
+                       {'name': 'west', 'apiEndpoint': 'api.west.fake.com', 'org': 'west-org', 'fail': True}])
+
+    with patch('flow.utils.commons.print_msg') as mock_printmsg_fn, patch.object(CloudFoundry, 'download_cf_cli'):
+        with pytest.raises(SystemExit):
+            _fan_out(_b, tmpdir).deploy()
+
+    assert tmpdir.join('east-org').check()
+    mock_printmsg_fn.assert_any_call('CloudFoundryFanOut', 'deploy', 'west: FAILED with exit code 1', 'WARN')
+    mock_printmsg_fn.assert_any_call('CloudFoundryFanOut', 'deploy', 'Failed the all policy. Failed targets: west',
+                                     'ERROR')
+
+
+def test_quorum_policy_tolerates_a_minority_of_failed_targets(tmpdir):
+    _b = _mock_config([{'name': 'east', 'apiEndpoint': 'api.east.fake.com', 'org': 'east-org'},
+                       {'name': 'central', 'apiEndpoint': 'api.central.fake.com', 'org': 'central-org'},
+                       {'name': 'west', 'apiEndpoint': 'api.west.fake.com', 'org': 'west-org', 'fail': True}],
+                      policy='quorum')
+
+    with patch('flow.utils.commons.print_msg') as mock_printmsg_fn, patch.object(CloudFoundry, 'download_cf_cli'):
+        _fan_out(_b, tmpdir).deploy()
+
+    mock_printmsg_fn.assert_any_call('CloudFoundryFanOut', 'deploy', '2 of 3 Cloud Foundry targets succeeded')
+
+    _b = _mock_config([{'name': 'east', 'apiEndpoint': 'api.east.fake.com', 'org': 'east-org'},
+                       {'name': 'west', 'apiEndpoint': 'api.west.fake.com', 'org': 'west-org', 'fail': True}],
+                      policy='quorum')
+
+    with patch('flow.utils.commons.print_msg'), patch.object(CloudFoundry, 'download_cf_cli'):
+        with pytest.raises(SystemExit):
+            _fan_out(_b, tmpdir).deploy()
+
+
+def test_unknown_policy(tmpdir):
+    _b = _mock_config([{'name': 'east', 'apiEndpoint': 'api.east.fake.com', 'org': 'east-org'}], policy='most')
+
+    with patch('flow.utils.commons.print_msg') as mock_printmsg_fn:
+        with pytest.raises(SystemExit):
+            _fan_out(_b, tmpdir).deploy()
+
+    mock_printmsg_fn.assert_any_call('CloudFoundryFanOut', '_get_policy', 'Cloud Foundry target policy was most: it '
+                                                                          'must be one of all, quorum', 'ERROR')
+
+
+def test_duplicate_target_names(tmpdir):
+    _b = _mock_config([{'name': 'east', 'apiEndpoint': 'api.east.fake.com', 'org': 'east-org'},
+                       {'name': 'east', 'apiEndpoint': 'api.west.fake.com', 'org': 'west-org'}])
+
+    with patch('flow.utils.commons.print_msg') as mock_printmsg_fn:
+        with pytest.raises(SystemExit):
+            _fan_out(_b, tmpdir).deploy()
+
+    mock_printmsg_fn.assert_any_call('CloudFoundryFanOut', '_get_targets', 'Cloud Foundry target east is listed '
+                                                                           'more than once', 'ERROR')
@@ -0,0 +1,315 @@
+import json
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import pytest
+import responses
+from flow.cloud.cloudfoundry.cloudfoundry import CloudFoundry
+from flow.cloud.cloudfoundryv3.cloud_controller import CloudControllerClient
+from flow.cloud.cloudfoundryv3.cloud_controller import CloudControllerException
+from flow.cloud.cloudfoundryv3.cloudfoundryv3 import CloudFoundryV3
+
+from flow.buildconfig import BuildConfig
+
+api_url = 'https://api.run-np.fake.com'
+uaa_url = 'https://login.run-np.fake.com'
+
+mock_root = {
+    'links': {
+        'cloud_controller_v3': {'href': api_url + '/v3', 'meta': {'version': '3.99.0'}},
+        'login': {'href': uaa_url},
+        'uaa': {'href': 'https://uaa.run-np.fake.com'}
+    }
+}
+
+domain = {'guid': 'domain-guid', 'name': 'apps-np.fake.com'}
+
+
+@pytest.fixture(autouse=True)
+def reset_class_state(monkeypatch):
+    monkeypatch.setattr(CloudControllerClient, 'tokens', {})
+    monkeypatch.setattr(CloudControllerClient, 'job_poll_interval', 0)
+    monkeypatch.setattr(CloudFoundryV3, 'cli_logged_in', False)
+    monkeypatch.setattr(CloudFoundryV3, 'space_guid', 'space-guid')
+    monkeypatch.setattr(CloudFoundryV3, 'client', CloudControllerClient('api.run-np.fake.com', 'user', 'pwd'))
+    monkeypatch.setattr(CloudFoundry, 'cf_domain', 'apps-np.fake.com')
+    monkeypatch.setattr(CloudFoundry, 'inventory', None)
+
+
+def _mock_auth():
+    responses.add(responses.GET, api_url + '/', json=mock_root)
+    responses.add(responses.POST, uaa_url + '/oauth/token', json={'access_token': 'token-1', 'expires_in': 600})
+
+
+def _app(name, state, guid=None):
+    return {'guid': guid or name + '-guid', 'name': name, 'state': state}
+
+
+def _route(guid, host, destinations):
+    return {'guid': guid, 'host': host, 'destinations': destinations,
+            'relationships': {'domain': {'data': {'guid': domain['guid']}}}}
+
+
+def _page(resources, next_href=None, included=None):
+    page = {'pagination': {'next': {'href': next_href} if next_href else None}, 'resources': resources}
+    if included is not None:
+        page['included'] = included
+
+    return page
+
+
+def _mock_config():
+    _b = MagicMock(BuildConfig)
+    _b.project_name = 'CI-HelloWorld'
+    _b.version_number = 'v2.9.0+1'
+    _b.settings = None
+
+    return _b
+
+
+@responses.activate
+def test_client_caches_token_between_clients():
+    _mock_auth()
+    responses.add(responses.GET, api_url + '/v3/apps', json=_page([]))
+
+    CloudControllerClient('api.run-np.fake.com', 'user', 'pwd').list_apps('space-guid')
+    CloudControllerClient('https://api.run-np.fake.com/', 'user', 'pwd').list_apps('space-guid')
+
+    token_calls = [call for call in responses.calls if call.request.url.endswith('/oauth/token')]
+    assert len(token_calls) == 1
+    assert 'grant_type=password' in token_calls[0].request.body
+    assert responses.calls[-1].request.headers['Authorization'] == 'bearer token-1'
+
+
+@responses.activate
+def test_client_refreshes_rejected_token():
+    responses.add(responses.GET, api_url + '/', json=mock_root)
+    responses.add(responses.POST, uaa_url + '/oauth/token', json={'access_token': 'token-1', 'expires_in': 600})
+    responses.add(responses.POST, uaa_url + '/oauth/token', json={'access_token': 'token-2', 'expires_in': 600})
+    responses.add(responses.GET, api_url + '/v3/apps', status=401)
+    responses.add(responses.GET, api_url + '/v3/apps', json=_page([_app('CI-HelloWorld-v1.0.0+1', 'STARTED')]))
+
+    apps = CloudFoundryV3.client.list_apps('space-guid')
+
+    assert [app['name'] for app in apps] == ['CI-HelloWorld-v1.0.0+1']
+    assert responses.calls[-1].request.headers['Authorization'] == 'bearer token-2'
+
+
+@responses.activate
+def test_client_bad_credentials():
+    responses.add(responses.GET, api_url + '/', json=mock_root)
+    responses.add(responses.POST, uaa_url + '/oauth/token', status=401, body='Bad credentials')
+
+    with pytest.raises(CloudControllerException) as e:
+        CloudFoundryV3.client.list_apps('space-guid')
+
+    assert 'Make sure that your credentials are correct for user' in str(e.value)
+
+
+@responses.activate
+def test_client_get_all_follows_pagination():
+    _mock_auth()
+    responses.add(responses.GET, api_url + '/v3/routes',
+                  json=_page([_route('route-1', 'ci-helloworld', [])], next_href=api_url + '/v3/routes?page=2',
+                             included={'domains': [domain]}))
+    responses.add(responses.GET, api_url + '/v3/routes',
+                  json=_page([_route('route-2', 'ci-helloworld-v2', [])], included={'domains': [domain]}))
+
+    routes = CloudFoundryV3.client.list_routes('space-guid')
+
+    assert [route['guid'] for route in routes] == ['route-1', 'route-2']
+    assert all(route['domain_name'] == 'apps-np.fake.com' for route in routes)
+    assert 'page=2' in responses.calls[-1].request.url
+
+
+@responses.activate
+def test_client_delete_app_waits_for_job():
+    _mock_auth()
+    responses.add(responses.DELETE, api_url + '/v3/apps/app-guid', status=202,
+                  headers={'Location': api_url + '/v3/jobs/job-guid'})
+    responses.add(responses.GET, api_url + '/v3/jobs/job-guid', json={'state': 'PROCESSING'})
+    responses.add(responses.GET, api_url + '/v3/jobs/job-guid', json={'state': 'FAILED', 'operation': 'app.delete',
+                                                                      'errors': ['boom']})
+
+    with pytest.raises(CloudControllerException) as e:
+        CloudFoundryV3.client.delete_app('app-guid')
+
+    assert 'Job app.delete failed' in str(e.value)
+
+
+@responses.activate
+def test_get_started_apps_already_started():
+    _mock_auth()
+    responses.add(responses.GET, api_url + '/v3/apps', json=_page([_app('CI-HelloWorld-v2.9.0+1', 'STARTED'),
+                                                                   _app('CI-HelloWorld-v2.8.0+1', 'STOPPED'),
+                                                                   _app('Other-v2.9.0+1', 'STARTED')]))
+    responses.add(responses.GET, api_url + '/v3/routes', json=_page([], included={'domains': []}))
+
+    with patch('flow.utils.commons.print_msg') as mock_printmsg_fn:
+        with pytest.raises(SystemExit):
+            CloudFoundryV3(_mock_config())._get_started_apps()
+
+    assert CloudFoundry.started_apps == b'CI-HelloWorld-v2.9.0+1'
+    mock_printmsg_fn.assert_any_call('CloudFoundry', '_get_started_apps', "App version CI-HelloWorld-v2.9.0+1 "
+                                                                          "already exists and is running. Cannot "
+                                                                          "perform zero-downtime deployment.  To "
+                                                                          "override, set force flag = 'true'",
+                                     'ERROR')
+
+
+@responses.activate
+def test_get_stopped_apps():
+    _mock_auth()
+    responses.add(responses.GET, api_url + '/v3/apps', json=_page([_app('CI-HelloWorld-v2.9.0+1', 'STARTED'),
+                                                                   _app('CI-HelloWorld-v2.8.0+1', 'STOPPED'),
+                                                                   _app('CI-HelloWorld-v2.7.0+1', 'STOPPED')]))
+    responses.add(responses.GET, api_url + '/v3/routes', json=_page([], included={'domains': []}))
+
+    CloudFoundryV3(_mock_config())._get_stopped_apps()
+
+    assert CloudFoundry.stopped_apps == b'CI-HelloWorld-v2.8.0+1\nCI-HelloWorld-v2.7.0+1'
+
+
+@responses.activate
+def test_fetch_app_routes():
+    _mock_auth()
+    responses.add(responses.GET, api_url + '/v3/apps', json=_page([_app('CI-HelloWorld-v2.9.0+1', 'STARTED')]))
+    responses.add(responses.GET, api_url + '/v3/routes',
+                  json=_page([_route('route-1', 'ci-helloworld', []), _route('route-2', 'ci-helloworld-v2', [])],
+                             included={'domains': [domain]}))
+
+    _cf = CloudFoundryV3(_mock_config())
+    routes, domains = _cf._split_app_routes_to_list(_cf._fetch_app_routes('CI-HelloWorld-v2.9.0+1'))
+
+    assert routes == ['ci-helloworld', 'ci-helloworld-v2']
+    assert domains == ['apps-np.fake.com', 'apps-np.fake.com']
+    assert 'app_guids=CI-HelloWorld-v2.9.0%2B1-guid' in responses.calls[-1].request.url
+
+
+@responses.activate
+def test_modify_route_for_app_unmap():
+    _mock_auth()
+    responses.add(responses.GET, api_url + '/v3/apps', json=_page([_app('CI-HelloWorld-v2.9.0+1', 'STARTED')]))
+    responses.add(responses.GET, api_url + '/v3/routes',
+                  json=_page([_route('route-1', 'ci-helloworld',
+                                     [{'guid': 'dest-1', 'app': {'guid': 'other-guid'}},
+                                      {'guid': 'dest-2', 'app': {'guid': 'CI-HelloWorld-v2.9.0+1-guid'}}])],
+                             included={'domains': [domain]}))
+    responses.add(responses.DELETE, api_url + '/v3/routes/route-1/destinations/dest-2', status=204)
+
+    failed = CloudFoundryV3(_mock_config())._modify_route_for_app('ci-helloworld', 'CI-HelloWorld-v2.9.0+1',
+                                                                  'apps-np.fake.com', 'unmap')
+
+    assert failed is False
+    assert responses.calls[-1].request.method == 'DELETE'
+
+
+@responses.activate
+def test_modify_route_for_app_map_missing_route():
+    _mock_auth()
+    responses.add(responses.GET, api_url + '/v3/apps', json=_page([_app('CI-HelloWorld-v2.9.0+1', 'STARTED')]))
+    responses.add(responses.GET, api_url + '/v3/routes', json=_page([], included={'domains': []}))
+
+    with patch('flow.utils.commons.print_msg') as mock_printmsg_fn:
+        failed = CloudFoundryV3(_mock_config())._modify_route_for_app('ci-helloworld', 'CI-HelloWorld-v2.9.0+1',
+                                                                      'apps-np.fake.com', 'map')
+
+    assert failed is True
+    mock_printmsg_fn.assert_any_call('CloudFoundryV3', '_modify_route_for_app', 'Failed to map route '
+                                                                                'ci-helloworld.apps-np.fake.com for '
+                                                                                'CI-HelloWorld-v2.9.0+1. Route '
+                                                                                'ci-helloworld.apps-np.fake.com not '
+                                                                                'found', 'ERROR')
+
+
+@responses.activate
+def test_start_stop_delete_app_stop():
+    _mock_auth()
+    responses.add(responses.GET, api_url + '/v3/apps', json=_page([_app('CI-HelloWorld-v2.9.0+1', 'STARTED')]))
+    responses.add(responses.POST, api_url + '/v3/apps/CI-HelloWorld-v2.9.0+1-guid/actions/stop',
+                  json=_app('CI-HelloWorld-v2.9.0+1', 'STOPPED'))
+
+    failed = CloudFoundryV3(_mock_config())._start_stop_delete_app('CI-HelloWorld-v2.9.0+1', 'stop')
+
+    assert failed is False
+    assert responses.calls[-1].request.url.endswith('/actions/stop')
+
+
+@responses.activate
+def test_stop_old_app_servers_scales_down_previous_versions():
+    _mock_auth()
+    responses.add(responses.GET, api_url + '/v3/apps', json=_page([_app('CI-HelloWorld-v2.8.0+1', 'STARTED')]))
+    responses.add(responses.POST, api_url + '/v3/apps/CI-HelloWorld-v2.8.0+1-guid/processes/web/actions/scale',
+                  json={})
+    responses.add(responses.POST, api_url + '/v3/apps/CI-HelloWorld-v2.8.0+1-guid/actions/stop', json={})
+
+    CloudFoundry.started_apps = b'CI-HelloWorld-v2.9.0+1\nCI-HelloWorld-v2.8.0+1'
+    CloudFoundryV3(_mock_config())._stop_old_app_servers()
+
+    scale_calls = [call for call in responses.calls if call.request.url.endswith('/actions/scale')]
+    assert len(scale_calls) == 1
+    assert json.loads(scale_calls[0].request.body) == {'instances': 1}
+    assert responses.calls[-1].request.url.endswith('/CI-HelloWorld-v2.8.0+1-guid/actions/stop')
+
+
+def test_cf_logout_skipped_without_cli_login():
+    with patch('subprocess.Popen') as mocked_popen:
+        CloudFoundryV3(_mock_config())._cf_logout()
+
+    mocked_popen.assert_not_called()
+
+
+def test_rollback_does_not_use_cli():
+    _cf = CloudFoundryV3(_mock_config())
+
+    with patch.object(_cf, '_verify_required_attributes'), \
+            patch.object(_cf, '_cf_login_check'), \
+            patch.object(_cf, '_check_cf_version'), \
+            patch.object(_cf, '_load_inventory'), \
+            patch.object(_cf, '_get_stopped_apps'), \
+            patch.object(_cf, '_get_started_apps'), \
+            patch.object(_cf, '_map_and_start_stopped_server'), \
+            patch.object(_cf, '_unmap_modify_app_state_versions') as mock_unmap, \
+            patch.object(_cf, 'download_cf_cli') as mock_download, \
+            patch.object(_cf, '_cf_login') as mock_login:
+        CloudFoundry.started_apps = b'CI-HelloWorld-v2.9.0+1'
+        _cf.rollback_to_previous()
+
+    mock_download.assert_not_called()
+    mock_login.assert_not_called()
+    mock_unmap.assert_called_once_with(['CI-HelloWorld-v2.9.0+1'], 'stop')
+
+
+@responses.activate
+def test_route_changes_use_and_update_inventory():
+    _mock_auth()
+    responses.add(responses.GET, api_url + '/v3/apps', json=_page([_app('CI-HelloWorld-v2.9.0+1', 'STARTED'),
+                                                                   _app('CI-HelloWorld-v2.8.0+1', 'STOPPED')]))
+    responses.add(responses.GET, api_url + '/v3/routes',
+                  json=_page([_route('route-1', 'ci-helloworld',
+                                     [{'guid': 'dest-1', 'app': {'guid': 'CI-HelloWorld-v2.9.0+1-guid'}}]),
+                              _route('route-2', 'ci-helloworld-v2', [])],
+                             included={'domains': [domain]}))
+    responses.add(responses.POST, api_url + '/v3/routes/route-1/destinations',
+                  json={'destinations': [{'guid': 'dest-1', 'app': {'guid': 'CI-HelloWorld-v2.9.0+1-guid'}},
+                                         {'guid': 'dest-2', 'app': {'guid': 'CI-HelloWorld-v2.8.0+1-guid'}}]})
+    responses.add(responses.DELETE, api_url + '/v3/routes/route-1/destinations/dest-1', status=204)
+    responses.add(responses.POST, api_url + '/v3/apps/CI-HelloWorld-v2.9.0+1-guid/actions/stop', json={})
+
+    _cf = CloudFoundryV3(_mock_config())
+    _cf._load_inventory()
+    listing_calls = len(responses.calls)
+
+    assert _cf._modify_route_for_app('ci-helloworld', 'CI-HelloWorld-v2.8.0+1', 'apps-np.fake.com', 'map') is False
+    _cf._unmap_modify_app_state_versions(['CI-HelloWorld-v2.9.0+1'], 'stop')
+
+    # no listing after the inventory was taken: the map, the unmap and the stop only
+    assert [call.request.method for call in responses.calls[listing_calls:]] == ['POST', 'DELETE', 'POST']
+    assert CloudFoundry.inventory.app_names('stopped') == ['CI-HelloWorld-v2.9.0+1', 'CI-HelloWorld-v2.8.0+1']
+    assert CloudFoundry.inventory.route_lines('CI-HelloWorld-v2.8.0+1') == b'ci-helloworld apps-np.fake.com'
+    assert CloudFoundry.inventory.route_lines('CI-HelloWorld-v2.9.0+1') == b''
+
+
+def test_parallel_operations_default_to_four_for_the_api():
+    with patch('flow.utils.commons.print_msg'):
+        assert CloudFoundryV3(_mock_config())._get_parallel_operations() == 4
@@ -1,10 +1,10 @@
 import os
 from unittest.mock import patch
 import pytest
-import subprocess
 from flow.cloud.gcappengine.gcappengine import GCAppEngine
 from unittest.mock import MagicMock
 from flow.buildconfig import BuildConfig
+import flow.utils.commons as commons
 
 mock_build_config_dict = {
     "projectInfo": {
@@ -71,9 +71,7 @@ def test_no_promote(monkeypatch):
     _b.version_number = 'v1.0.0'
 
     with patch('flow.utils.commons.print_msg') as mock_printmsg_fn:
-        with patch.object(subprocess, 'Popen') as mocked_popen:
-            mocked_popen.return_value.returncode = 0
-            mocked_popen.return_value.communicate.return_value = ("EVERYTHING IS AWESOME", 'FAKE_RETURN')
+        with patch('flow.utils.commons.run_command', return_value=commons.CommandResult(0, ['EVERYTHING IS AWESOME'])):
             _gcAppEngine = GCAppEngine(config_override=_b)
             _gcAppEngine._gcloud_deploy('dummy.yml', promote=False)
 
@@ -92,9 +90,7 @@ def test_promote(monkeypatch):
     _b.version_number = 'v1.0.0'
 
     with patch('flow.utils.commons.print_msg') as mock_printmsg_fn:
-        with patch.object(subprocess, 'Popen') as mocked_popen:
-            mocked_popen.return_value.returncode = 0
-            mocked_popen.return_value.communicate.return_value = ("EVERYTHING IS AWESOME", 'FAKE_RETURN')
+        with patch('flow.utils.commons.run_command', return_value=commons.CommandResult(0, ['EVERYTHING IS AWESOME'])):
             _gcAppEngine = GCAppEngine(config_override=_b)
             _gcAppEngine._gcloud_deploy('dummy.yml', promote=True)
 
@@ -1,11 +1,15 @@
+import configparser
 import datetime
+import io
 import json
 import os
+import tarfile
 from unittest.mock import MagicMock
 from unittest.mock import patch
 
 import pytest
 import responses
+import flow
 from flow.coderepo.github.github import GitHub
 
 from flow.buildconfig import BuildConfig
@@ -378,6 +382,7 @@ def test_fetch_commit_history():
     with open(current_test_directory + "/github_commit_history_output.txt", 'r') as myfile:
         captured_commit_history_data=json.loads(myfile.read())
     _github.get_all_commits_from_github = MagicMock(return_value=captured_commit_history_data)
+    _github._get_compare_commits = MagicMock(return_value=None)
     _github.get_all_tags_and_shas_from_github = MagicMock(return_value=[("v1.0.0", "c968da6")])
     commits_array = _github.get_all_git_commit_history_between_provided_tags([1, 0, 0, 0])
     print(str(commits_array))
@@ -390,6 +395,7 @@ def test_fetch_commit_history_multiline():
     with open(current_test_directory + "/github_commit_history_output_multiline.txt", 'r') as myfile:
         captured_commit_history_data=json.loads(myfile.read())
     _github.get_all_commits_from_github = MagicMock(return_value=captured_commit_history_data)
+    _github._get_compare_commits = MagicMock(return_value=None)
     _github.get_all_tags_and_shas_from_github = MagicMock(return_value=[("v1.0.0", "4a3ddfb")])
     commits_array = _github.get_all_git_commit_history_between_provided_tags([1, 0, 0, 0])
     print(str(commits_array))
@@ -1122,4 +1128,259 @@ def test_filter_out_calver_long_year_tags(monkeypatch):
     assert filtered_tags[-1][0] == 'v21.66.0'
     #assert all tags start with a 2 digit year
     for tag in filtered_tags:
-        assert len(str(_github.convert_semver_string_to_semver_tag_array(tag[0])[0])) == 2
\ No newline at end of file
+        assert len(str(_github.convert_semver_string_to_semver_tag_array(tag[0])[0])) == 2
+
+def _reset_github_listings():
+    GitHub.url = 'https://fakegithub.com/api/v3/repos'
+    GitHub.org = 'Org-GitHub'
+    GitHub.repo = 'Repo-GitHub'
+    GitHub.token = None
+    GitHub.all_tags_and_shas = []
+    GitHub.all_commits = []
+    GitHub.found_all_tags = False
+    GitHub.found_all_commits = False
+    GitHub.page_cache = None
+    GitHub.rate_limiters = {}
+    GitHub.version_index = None
+    GitHub.tag_index = None
+    GitHub.commit_index = None
+
+
+# noinspection PyUnresolvedReferences
+@responses.activate
+def test_get_all_tags_and_shas_from_github_revalidates_cache(monkeypatch, tmpdir):
+    monkeypatch.setenv('GITHUB_CACHE_DIR', str(tmpdir))
+    _reset_github_listings()
+
+    tags_url = 'https://fakegithub.com/api/v3/repos/Org-GitHub/Repo-GitHub/tags?per_page=100&page=1'
+    responses.add(responses.GET, tags_url, status=200, headers={'ETag': '"tags-etag"'},
+                  json=[{'name': 'v1.0.0+1', 'commit': {'sha': 'abc123'}},
+                        {'name': 'v1.0.0', 'commit': {'sha': 'def456'}}])
+
+    _github = GitHub(verify_repo=False)
+    assert _github.get_all_tags_and_shas_from_github() == [('v1.0.0+1', 'abc123'), ('v1.0.0', 'def456')]
+    assert 'If-None-Match' not in responses.calls[0].request.headers
+
+    # a new run starts with empty in memory lists, but the listing is revalidated from the on disk cache
+    _reset_github_listings()
+    responses.replace(responses.GET, tags_url, status=304)
+
+    _github = GitHub(verify_repo=False)
+    assert _github.get_all_tags_and_shas_from_github() == [('v1.0.0+1', 'abc123'), ('v1.0.0', 'def456')]
+    assert responses.calls[1].request.headers['If-None-Match'] == '"tags-etag"'
+    assert len(responses.calls) == 2
+
+
+# noinspection PyUnresolvedReferences
+@responses.activate
+def test_get_all_commits_from_github_uses_cached_next_page(monkeypatch, tmpdir):
+    monkeypatch.setenv('GITHUB_CACHE_DIR', str(tmpdir))
+    _reset_github_listings()
+
+    _b = MagicMock(BuildConfig)
+    _b.build_env_info = mock_build_config_dict['environments']['develop']
+
+    page_1 = 'https://fakegithub.com/api/v3/repos/Org-GitHub/Repo-GitHub/commits?per_page=100&page=1&sha=develop'
+    page_2 = 'https://fakegithub.com/api/v3/repos/Org-GitHub/Repo-GitHub/commits?per_page=100&page=2&sha=develop'
+    responses.add(responses.GET, page_1, status=200,
+                  headers={'ETag': '"page-1"', 'Link': '<' + page_2 + '>; rel="next"'},
+                  json=[{'sha': 'sha2', 'commit': {'message': 'second', 'author': {}}}])
+    responses.add(responses.GET, page_2, status=200, headers={'ETag': '"page-2"'},
+                  json=[{'sha': 'sha1', 'commit': {'message': 'first', 'author': {}}}])
+
+    _github = GitHub(config_override=_b, verify_repo=False)
+    first_run = _github.get_all_commits_from_github()
+
+    _reset_github_listings()
+    responses.replace(responses.GET, page_1, status=304)
+    responses.replace(responses.GET, page_2, status=304)
+
+    _github = GitHub(config_override=_b, verify_repo=False)
+    second_run = _github.get_all_commits_from_github()
+
+    assert first_run == second_run == [{'sha': 'sha2', 'commit': {'message': 'second'}},
+                                       {'sha': 'sha1', 'commit': {'message': 'first'}}]
+    assert [call.request.url for call in responses.calls] == [page_1, page_2, page_1, page_2]
+    assert responses.calls[3].request.headers['If-None-Match'] == '"page-2"'
+
+
+# noinspection PyUnresolvedReferences
+@responses.activate
+def test_get_all_git_commit_history_between_provided_tags_uses_compare(monkeypatch):
+    monkeypatch.delenv('GITHUB_CACHE_DIR', raising=False)
+    _reset_github_listings()
+
+    _b = MagicMock(BuildConfig)
+    _b.build_env_info = mock_build_config_dict['environments']['develop']
+
+    compare_url = 'https://fakegithub.com/api/v3/repos/Org-GitHub/Repo-GitHub/compare/sha1...develop'
+    responses.add(responses.GET, compare_url + '?per_page=100&page=1', status=200,
+                  headers={'Link': '<' + compare_url + '?per_page=100&page=2>; rel="next"'},
+                  json={'status': 'ahead', 'total_commits': 3,
+                        'commits': [{'sha': 'sha2000', 'commit': {'message': 'second'}},
+                                    {'sha': 'sha3000', 'commit': {'message': 'third'}}]})
+    responses.add(responses.GET, compare_url + '?per_page=100&page=2', status=200,
+                  json={'status': 'ahead', 'total_commits': 3,
+                        'commits': [{'sha': 'sha4000', 'commit': {'message': 'fourth'}}]})
+
+    _github = GitHub(config_override=_b, verify_repo=False)
+    _github.get_all_tags_and_shas_from_github = MagicMock(return_value=[('v1.0.0', 'sha1')])
+    _github.get_all_commits_from_github = MagicMock(side_effect=AssertionError('branch history should not be walked'))
+
+    commits = _github.get_all_git_commit_history_between_provided_tags([1, 0, 0, 0])
+
+    assert commits == ['sha4000 fourth', 'sha3000 third', 'sha2000 second']
+    assert len(responses.calls) == 2
+
+
+# noinspection PyUnresolvedReferences
+@responses.activate
+def test_get_all_git_commit_history_between_provided_tags_compare_diverged(monkeypatch):
+    monkeypatch.delenv('GITHUB_CACHE_DIR', raising=False)
+    _reset_github_listings()
+
+    _b = MagicMock(BuildConfig)
+    _b.build_env_info = mock_build_config_dict['environments']['develop']
+
+    responses.add(responses.GET,
+                  'https://fakegithub.com/api/v3/repos/Org-GitHub/Repo-GitHub/compare/sha1...develop',
+                  status=200, json={'status': 'diverged', 'total_commits': 1, 'commits': []})
+
+    _github = GitHub(config_override=_b, verify_repo=False)
+    _github.get_all_tags_and_shas_from_github = MagicMock(return_value=[('v1.0.0', 'sha1')])
+    _github.get_all_commits_from_github = MagicMock(side_effect=AssertionError('branch history should not be walked'))
+
+    assert _github.get_all_git_commit_history_between_provided_tags([1, 0, 0, 0]) == []
+
+
+# noinspection PyUnresolvedReferences
+@responses.activate
+def test_get_all_git_commit_history_between_provided_tags_compare_falls_back(monkeypatch):
+    monkeypatch.delenv('GITHUB_CACHE_DIR', raising=False)
+    _reset_github_listings()
+
+    _b = MagicMock(BuildConfig)
+    _b.build_env_info = mock_build_config_dict['environments']['develop']
+
+    responses.add(responses.GET,
+                  'https://fakegithub.com/api/v3/repos/Org-GitHub/Repo-GitHub/compare/sha1...develop',
+                  status=404)
+
+    _github = GitHub(config_override=_b, verify_repo=False)
+    _github.get_all_tags_and_shas_from_github = MagicMock(return_value=[('v1.0.0', 'sha1')])
+    _github.get_all_commits_from_github = MagicMock(return_value=[{'sha': 'sha2', 'commit': {'message': 'second'}},
+                                                                  {'sha': 'sha1', 'commit': {'message': 'first'}}])
+
+    assert _github.get_all_git_commit_history_between_provided_tags([1, 0, 0, 0]) == ['sha2 second']
+    _github.get_all_commits_from_github.assert_called_once_with('sha1')
+
+
+# noinspection PyUnresolvedReferences
+@responses.activate
+def test_get_all_commits_from_github_fetches_remaining_pages_concurrently(monkeypatch):
+    monkeypatch.setenv('GITHUB_PAGE_CONCURRENCY', '3')
+    _reset_github_listings()
+
+    _b = MagicMock(BuildConfig)
+    _b.build_env_info = mock_build_config_dict['environments']['develop']
+    _b.settings = None
+
+    page_url = 'https://fakegithub.com/api/v3/repos/Org-GitHub/Repo-GitHub/commits?per_page=100&page={}&sha=develop'
+    responses.add(responses.GET, page_url.format(1), status=200,
+                  headers={'Link': '<' + page_url.format(2) + '>; rel="next", <' + page_url.format(4) + '>; rel="last"'},
+                  json=[{'sha': 'sha4', 'commit': {'message': 'fourth'}}])
+    for page in range(2, 5):
+        responses.add(responses.GET, page_url.format(page), status=200,
+                      json=[{'sha': 'sha' + str(5 - page), 'commit': {'message': 'page ' + str(page)}}])
+
+    _github = GitHub(config_override=_b, verify_repo=False)
+    commits = _github.get_all_commits_from_github()
+
+    assert [commit['sha'] for commit in commits] == ['sha4', 'sha3', 'sha2', 'sha1']
+    assert GitHub.found_all_commits is True
+    assert len(responses.calls) == 4
+
+
+def test_page_concurrency_default_matches_settings_ini(monkeypatch):
+    monkeypatch.delenv('GITHUB_PAGE_CONCURRENCY', raising=False)
+    settings = configparser.ConfigParser()
+    settings.read(os.path.join(os.path.dirname(flow.__file__), 'settings.ini'))
+
+    _b = MagicMock(BuildConfig)
+    _b.build_env_info = mock_build_config_dict['environments']['develop']
+    _b.settings = None
+    without_settings = GitHub(config_override=_b, verify_repo=False)._get_page_concurrency()
+
+    _b.settings = settings
+    assert GitHub(config_override=_b, verify_repo=False)._get_page_concurrency() == without_settings == 4
+
+
+# noinspection PyUnresolvedReferences
+@responses.activate
+def test_get_all_tags_and_shas_from_github_concurrent_pages_stop_at_needed_tag(monkeypatch):
+    monkeypatch.setenv('GITHUB_PAGE_CONCURRENCY', '2')
+    _reset_github_listings()
+
+    page_url = 'https://fakegithub.com/api/v3/repos/Org-GitHub/Repo-GitHub/tags?per_page=100&page={}'
+    responses.add(responses.GET, page_url.format(1), status=200,
+                  headers={'Link': '<' + page_url.format(2) + '>; rel="next", <' + page_url.format(5) + '>; rel="last"'},
+                  json=[{'name': 'v1.0.3', 'commit': {'sha': 'sha4'}}])
+    for page in range(2, 6):
+        responses.add(responses.GET, page_url.format(page), status=200,
+                      json=[{'name': 'v1.0.' + str(4 - page), 'commit': {'sha': 'sha' + str(5 - page)}}])
+
+    _github = GitHub(verify_repo=False)
+    tags = _github.get_all_tags_and_shas_from_github(need_tag='v1.0.2')
+
+    assert tags == [('v1.0.3', 'sha4'), ('v1.0.2', 'sha3')]
+    assert GitHub.found_all_tags is False
+    requested = [call.request.url for call in responses.calls]
+    assert page_url.format(4) not in requested
+    assert page_url.format(5) not in requested
+
+
+# noinspection PyUnresolvedReferences
+@responses.activate
+def test_get_all_tags_and_shas_from_github_retries_after_rate_limit(monkeypatch):
+    _reset_github_listings()
+    monkeypatch.setattr('flow.coderepo.github.github_rate_limit.time.sleep', lambda seconds: None)
+
+    tags_url = 'https://fakegithub.com/api/v3/repos/Org-GitHub/Repo-GitHub/tags?per_page=100&page=1'
+    responses.add(responses.GET, tags_url, status=403, headers={'Retry-After': '2', 'X-RateLimit-Remaining': '10'})
+    responses.add(responses.GET, tags_url, status=200, headers={'X-RateLimit-Remaining': '9'},
+                  json=[{'name': 'v1.0.0', 'commit': {'sha': 'def456'}}])
+
+    _github = GitHub(verify_repo=False)
+
+    assert _github.get_all_tags_and_shas_from_github() == [('v1.0.0', 'def456')]
+    assert len(responses.calls) == 2
+    assert GitHub.rate_limiters['core'].remaining == 9
+
+
+# noinspection PyUnresolvedReferences
+@responses.activate
+def test_download_code_at_version_streams_into_push_location(tmpdir):
+    _reset_github_listings()
+
+    _b = MagicMock(BuildConfig)
+    _b.push_location = str(tmpdir)
+    _b.version_number = 'v1.0.0'
+    _b.settings = None
+
+    tarball = io.BytesIO()
+    with tarfile.open(fileobj=tarball, mode='w:gz') as tar:
+        info = tarfile.TarInfo('Org-GitHub-Repo-GitHub-abc123/manifest.yml')
+        info.size = len(b'applications: []')
+        tar.addfile(info, io.BytesIO(b'applications: []'))
+
+    tarball_url = 'https://fakegithub.com/api/v3/repos/Org-GitHub/Repo-GitHub/tarball/v1.0.0'
+    responses.add(responses.GET, tarball_url, status=200, body=tarball.getvalue(),
+                  content_type='application/x-gzip')
+
+    _github = GitHub(config_override=_b, verify_repo=False)
+    _github._get_artifact_url = MagicMock(return_value=tarball_url)
+    _github.download_code_at_version()
+
+    assert tmpdir.join('manifest.yml').read() == 'applications: []'
+    assert not tmpdir.join('unzipped').exists()
+    assert not tmpdir.join('v1.0.0.tar.gz').exists()
@@ -0,0 +1,65 @@
+import json
+import os
+from unittest.mock import patch
+
+import flow.coderepo.github.github_cache as github_cache
+from flow.coderepo.github.github_cache import GitHubCache
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+def _cache(tmpdir, **kwargs):
+    with patch('flow.utils.commons.print_msg'):
+        return GitHubCache(str(tmpdir), 'https://fakegithub.com/api/v3/repos', 'Org-GitHub', 'Repo-GitHub', **kwargs)
+
+
+def test_save_keeps_most_recently_used_pages(monkeypatch, tmpdir):
+    clock = FakeClock(1000)
+    monkeypatch.setattr(github_cache, 'time', clock)
+    cache = _cache(tmpdir, max_entries=2)
+
+    for page in ['page-1', 'page-2', 'page-3']:
+        clock.now += 1
+        cache.put(page, '"etag"', None, {}, [])
+
+    clock.now += 1
+    cache.get('page-1')
+    cache.save()
+
+    with open(cache.cache_file) as saved:
+        assert sorted(json.load(saved)['pages']) == ['page-1', 'page-3']
+
+
+def test_save_drops_pages_and_files_unused_for_max_age(monkeypatch, tmpdir):
+    clock = FakeClock(1000)
+    monkeypatch.setattr(github_cache, 'time', clock)
+    stale_file = tmpdir.join('other-repo.json')
+    stale_file.write('{}')
+    os.utime(str(stale_file), (0, 0))
+    cache = _cache(tmpdir, max_age_days=1)
+
+    cache.put('old-page', '"etag"', None, {}, [])
+    clock.now += 2 * 24 * 60 * 60
+    cache.put('new-page', '"etag"', None, {}, [])
+    cache.save()
+
+    with open(cache.cache_file) as saved:
+        assert list(json.load(saved)['pages']) == ['new-page']
+    assert not stale_file.check()
+
+
+def test_failed_save_removes_temp_file(tmpdir):
+    cache = _cache(tmpdir)
+    cache.put('page-1', '"etag"', None, {}, [object()])
+
+    with patch('flow.utils.commons.print_msg') as mock_printmsg_fn:
+        cache.save()
+
+    assert tmpdir.listdir() == []
+    assert mock_printmsg_fn.call_args[0][3] == 'WARN'
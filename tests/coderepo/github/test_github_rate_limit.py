@@ -0,0 +1,188 @@
+from email.utils import formatdate
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import pytest
+import responses
+
+import flow.coderepo.github.github_rate_limit as github_rate_limit
+from flow.coderepo.github.github import GitHub
+from flow.coderepo.github.github_rate_limit import GitHubRateLimiter
+
+from flow.buildconfig import BuildConfig
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+        self.slept = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def _response(status_code=200, remaining=None, reset=None, retry_after=None):
+    resp = MagicMock()
+    resp.status_code = status_code
+    resp.headers = {'X-RateLimit-Limit': '5000'}
+    if remaining is not None:
+        resp.headers['X-RateLimit-Remaining'] = str(remaining)
+    if reset is not None:
+        resp.headers['X-RateLimit-Reset'] = str(reset)
+    if retry_after is not None:
+        resp.headers['Retry-After'] = str(retry_after)
+    return resp
+
+
+def test_no_wait_with_plenty_of_budget(monkeypatch):
+    clock = FakeClock(1000)
+    monkeypatch.setattr(github_rate_limit, 'time', clock)
+
+    limiter = GitHubRateLimiter(pace_below=100)
+    assert limiter.after_response(_response(remaining=4000, reset=4600)) is None
+    limiter.before_request()
+
+    assert clock.slept == []
+
+
+def test_waits_for_reset_when_budget_used_up(monkeypatch):
+    clock = FakeClock(1000)
+    monkeypatch.setattr(github_rate_limit, 'time', clock)
+
+    limiter = GitHubRateLimiter()
+    assert limiter.after_response(_response(status_code=403, remaining=0, reset=1030)) == 31
+    limiter.before_request()
+
+    assert clock.slept == [31]
+
+    # once the window resets the budget is unknown again and calls are not held back
+    limiter.before_request()
+    assert clock.slept == [31]
+
+
+def test_paces_calls_when_budget_is_low(monkeypatch):
+    clock = FakeClock(1000)
+    monkeypatch.setattr(github_rate_limit, 'time', clock)
+
+    limiter = GitHubRateLimiter(pace_below=100)
+    limiter.after_response(_response(remaining=10, reset=1100))
+
+    limiter.before_request()
+    limiter.before_request()
+
+    # the 100 seconds left in the window are shared by the 10 remaining calls
+    assert clock.slept == [pytest.approx(10)]
+
+
+def test_secondary_limit_retry_after(monkeypatch):
+    clock = FakeClock(1000)
+    monkeypatch.setattr(github_rate_limit, 'time', clock)
+
+    limiter = GitHubRateLimiter()
+    assert limiter.after_response(_response(status_code=429, retry_after=20)) == 20
+    limiter.before_request()
+
+    assert clock.slept == [20]
+
+
+def test_secondary_limit_retry_after_http_date(monkeypatch):
+    clock = FakeClock(1000)
+    monkeypatch.setattr(github_rate_limit, 'time', clock)
+
+    limiter = GitHubRateLimiter()
+    assert limiter.after_response(_response(status_code=429, retry_after=formatdate(1045, usegmt=True))) == 45
+    limiter.before_request()
+
+    assert clock.slept == [45]
+
+
+def test_unreadable_retry_after_waits_for_reset(monkeypatch):
+    monkeypatch.setattr(github_rate_limit, 'time', FakeClock(1000))
+
+    limiter = GitHubRateLimiter()
+
+    assert limiter.after_response(_response(status_code=403, remaining=10, reset=1030, retry_after='soon')) == 31
+
+
+def test_plain_forbidden_is_not_retried(monkeypatch):
+    monkeypatch.setattr(github_rate_limit, 'time', FakeClock(1000))
+
+    limiter = GitHubRateLimiter()
+
+    assert limiter.after_response(_response(status_code=403, remaining=4000, reset=4600)) is None
+
+
+def test_wait_longer_than_max_wait_exits(monkeypatch):
+    monkeypatch.setattr(github_rate_limit, 'time', FakeClock(1000))
+
+    limiter = GitHubRateLimiter(max_wait=60)
+    limiter.after_response(_response(status_code=403, remaining=0, reset=4600))
+
+    with patch('flow.utils.commons.print_msg') as mock_printmsg_fn:
+        with pytest.raises(SystemExit):
+            limiter.before_request()
+
+        assert mock_printmsg_fn.call_args[0][3] == 'ERROR'
+
+
+def test_remaining_budget_reported_as_metric(monkeypatch):
+    monkeypatch.setattr(github_rate_limit, 'time', FakeClock(1000))
+    metrics = MagicMock()
+    monkeypatch.setattr(GitHubRateLimiter, 'metrics', metrics)
+
+    limiter = GitHubRateLimiter()
+    limiter.after_response(_response(remaining=4321, reset=4600))
+    limiter.after_response(_response(remaining=4320, reset=4600))
+
+    metrics.write_gauge.assert_called_once_with('github.rate_limit.core.remaining', 4321)
+
+
+def test_invalid_rate_limit_settings_use_defaults(monkeypatch):
+    monkeypatch.setenv('GITHUB_RATE_LIMIT_PACE_BELOW', 'lots')
+    monkeypatch.setenv('GITHUB_RATE_LIMIT_MAX_WAIT_SECONDS', '90')
+    monkeypatch.setattr(GitHub, 'rate_limiters', {})
+
+    _b = MagicMock(BuildConfig)
+    _b.settings = None
+
+    with patch('flow.utils.commons.print_msg') as mock_printmsg_fn:
+        limiter = GitHub(config_override=_b, verify_repo=False)._get_rate_limiter()
+
+    assert limiter.pace_below == 100
+    assert limiter.max_wait == 90
+    mock_printmsg_fn.assert_any_call('commons', 'get_int_setting', 'Invalid rate_limit_pace_below lots, using 100',
+                                     'WARN')
+
+
+# noinspection PyUnresolvedReferences
+@responses.activate
+def test_rest_and_graphql_have_separate_budgets(monkeypatch):
+    clock = FakeClock(1000)
+    monkeypatch.setattr(github_rate_limit, 'time', clock)
+    monkeypatch.setattr(GitHub, 'rate_limiters', {})
+
+    _b = MagicMock(BuildConfig)
+    _b.settings = None
+    _github = GitHub(config_override=_b, verify_repo=False)
+
+    responses.add(responses.POST, 'https://fakegithub.com/api/graphql', status=200, json={},
+                  headers={'X-RateLimit-Resource': 'graphql', 'X-RateLimit-Remaining': '0',
+                           'X-RateLimit-Reset': '1030'})
+    responses.add(responses.GET, 'https://fakegithub.com/api/v3/repos/Org-GitHub/Repo-GitHub', status=200, json={},
+                  headers={'X-RateLimit-Resource': 'core', 'X-RateLimit-Remaining': '4000',
+                           'X-RateLimit-Reset': '4600'})
+
+    _github._github_request('POST', 'https://fakegithub.com/api/graphql', resource='graphql')
+    _github._github_request('GET', 'https://fakegithub.com/api/v3/repos/Org-GitHub/Repo-GitHub')
+
+    # the used up graphql budget doesn't hold back rest calls
+    assert clock.slept == []
+    assert GitHub.rate_limiters['graphql'].remaining == 0
+    assert GitHub.rate_limiters['core'].remaining == 4000
+
+    GitHub.rate_limiters['graphql'].before_request()
+    assert clock.slept == [31]
@@ -0,0 +1,95 @@
+from flow.coderepo.github.indexes import CommitIndex
+from flow.coderepo.github.indexes import TagIndex
+from flow.coderepo.github.indexes import VersionIndex
+
+
+def _tags(*names):
+    return [(name, 'sha-' + name) for name in names]
+
+
+def test_version_index_views():
+    tags = _tags('v1.0.0+2', 'v1.1.0', 'not-a-version', 'v1.0.0', 'v0.9.0+7', 'v1.0.0+10')
+
+    index = VersionIndex()
+    skipped = index.add(tags)
+
+    assert skipped == ['not-a-version']
+    assert index.sorted_descending() == [[1, 1, 0, 0], [1, 0, 0, 10], [1, 0, 0, 2], [1, 0, 0, 0], [0, 9, 0, 7]]
+    assert index.highest() == [1, 1, 0, 0]
+    assert index.highest_release() == [1, 1, 0, 0]
+    assert index.highest_snapshot() == [1, 0, 0, 10]
+
+
+def test_version_index_highest_from_base():
+    index = VersionIndex()
+    index.add(_tags('v1.0.0+2', 'v1.1.0', 'v1.0.0', 'v1.0.0+10', 'v2.0.0'))
+
+    assert index.highest_from_base([1, 0, 0, 0]) == [1, 0, 0, 10]
+    assert index.highest_from_base([1, 1, 0, 0]) == [1, 1, 0, 0]
+    assert index.highest_from_base([1, 2, 0, 0]) is None
+    assert index.contains([1, 0, 0, 2])
+    assert not index.contains([1, 0, 0, 3])
+
+
+def test_version_index_adds_new_pages_incrementally():
+    tags = _tags('v1.0.0+1', 'v1.0.0')
+    index = VersionIndex()
+    index.add(tags)
+
+    tags.extend(_tags('v0.9.0', 'v1.0.1+1'))
+    assert index.covers(tags)
+    index.add(tags)
+
+    assert index.consumed == 4
+    assert index.highest() == [1, 0, 1, 1]
+    assert index.highest_release() == [1, 0, 0, 0]
+
+    # a different tag list starts over
+    index.add(_tags('v3.0.0'))
+    assert index.sorted_descending() == [[3, 0, 0, 0]]
+
+
+def test_version_index_short_year_only():
+    index = VersionIndex(short_year_only=True)
+    index.add(_tags('v2021.65.2+1', 'v21.66.0', 'v21.68.0+1'))
+
+    assert index.sorted_descending() == [[21, 68, 0, 1], [21, 66, 0, 0]]
+
+
+def test_tag_index_lookups():
+    tags = _tags('v1.1.0+1', 'v1.1.0', 'v1.0.0+2', 'v1.0.0+1', 'v1.0.0')
+
+    index = TagIndex()
+    index.update(tags)
+
+    assert index.sha('v1.0.0+2') == 'sha-v1.0.0+2'
+    assert index.sha('v9.9.9') is None
+    assert index.first(snapshot=True) == 'v1.1.0+1'
+    assert index.first(snapshot=False) == 'v1.1.0'
+    assert index.next_after('v1.1.0+1', snapshot=True) == 'v1.0.0+2'
+    assert index.next_after('v1.1.0', snapshot=False) == 'v1.0.0'
+    assert index.next_after('v1.0.0', snapshot=False) is None
+    assert index.has_tags(need_snapshot=3, need_release=2)
+    assert not index.has_tags(need_release=3)
+    assert index.has_tags(need_tag='v1.0.0', need_base=True)
+    assert not index.has_tags(need_tag='v1.2.0', need_base=True)
+
+
+def test_tag_index_empty_list_is_never_enough():
+    index = TagIndex()
+    index.update([])
+
+    assert not index.has_tags()
+
+
+def test_commit_index_positions_follow_new_pages():
+    commits = [{'sha': 'sha3'}, {'sha': 'sha2'}]
+
+    index = CommitIndex()
+    index.update(commits)
+    assert index.position('sha2') == 1
+    assert not index.contains('sha1')
+
+    commits.append({'sha': 'sha1'})
+    index.update(commits)
+    assert index.position('sha1') == 2
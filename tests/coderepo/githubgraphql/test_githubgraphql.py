@@ -0,0 +1,233 @@
+import json
+from unittest.mock import MagicMock
+from unittest.mock import patch
+
+import pytest
+import responses
+from flow.coderepo.github.github import GitHub
+from flow.coderepo.githubgraphql.githubgraphql import GitHubGraphQL
+
+from flow.buildconfig import BuildConfig
+
+mock_build_config_dict = {
+    "projectInfo": {
+        "name": "MyProjectName",
+        "language": "java",
+        "versionStrategy": "tracker"
+    },
+    "github": {
+        "org": "Org-GitHub",
+        "repo": "Repo-GitHub",
+        "URL": "https://fakegithub.com/api/v3/repos",
+        "apiType": "graphql"
+    },
+    "environments": {
+        "develop": {
+            "artifactCategory": "snapshot",
+            "associatedBranchName": "develop"
+        }
+    }
+}
+
+graphql_url = 'https://fakegithub.com/api/graphql'
+
+
+def _mock_config():
+    _b = MagicMock(BuildConfig)
+    _b.json_config = mock_build_config_dict
+    _b.build_env_info = mock_build_config_dict['environments']['develop']
+    _b.version_strategy = 'tracker'
+    _b.settings = None
+    return _b
+
+
+def _reset_github_listings(token='fake-token'):
+    GitHub.url = 'https://fakegithub.com/api/v3/repos'
+    GitHub.org = 'Org-GitHub'
+    GitHub.repo = 'Repo-GitHub'
+    GitHub.token = token
+    GitHub.all_tags_and_shas = []
+    GitHub.all_commits = []
+    GitHub.found_all_tags = False
+    GitHub.found_all_commits = False
+    GitHub.page_cache = None
+    GitHub.rate_limiters = {}
+    GitHub.version_index = None
+    GitHub.tag_index = None
+    GitHub.commit_index = None
+    GitHub.local_git = None
+    GitHub.local_git_checked = False
+    GitHubGraphQL.tags_cursor = None
+    GitHubGraphQL.history_cursor = None
+    GitHubGraphQL.tags_fetched = False
+    GitHubGraphQL.history_fetched = False
+
+
+def _tags_page(tags, has_next=False, cursor='tags-cursor'):
+    return {'pageInfo': {'hasNextPage': has_next, 'endCursor': cursor}, 'nodes': tags}
+
+
+def _history_page(commits, has_next=False, cursor='history-cursor'):
+    return {'target': {'history': {'pageInfo': {'hasNextPage': has_next, 'endCursor': cursor}, 'nodes': commits}}}
+
+
+def _sent_variables(call):
+    return json.loads(call.request.body)['variables']
+
+
+def test_graphql_url_derived_from_rest_url():
+    _reset_github_listings()
+    _github = GitHubGraphQL(config_override=_mock_config(), verify_repo=False)
+
+    assert _github._get_graphql_url() == graphql_url
+
+    GitHub.url = 'https://api.github.com/repos'
+    assert _github._get_graphql_url() == 'https://api.github.com/graphql'
+
+
+@responses.activate
+def test_verify_repo_existence_fetches_tags_and_history_in_one_request():
+    _reset_github_listings()
+    _github = GitHubGraphQL(config_override=_mock_config(), verify_repo=False)
+
+    responses.add(responses.POST, graphql_url, status=200, json={'data': {'repository': {
+        'refs': _tags_page([
+            {'name': 'v1.1.0', 'target': {'oid': 'tagobject', 'target': {'oid': 'sha3'}}},
+            {'name': 'v1.0.0+1', 'target': {'oid': 'sha2'}},
+            {'name': 'v1.0.0', 'target': {'oid': 'sha1'}}
+        ]),
+        'ref': _history_page([
+            {'oid': 'sha3', 'message': 'third [#3]'},
+            {'oid': 'sha2', 'message': 'second [#2]'},
+            {'oid': 'sha1', 'message': 'first [#1]'}
+        ])
+    }}})
+
+    _github._verify_repo_existence(GitHub.url, GitHub.org, GitHub.repo)
+
+    tags = _github.get_all_tags_and_shas_from_github()
+    commits = _github.get_all_commits_from_github('sha1')
+
+    assert len(responses.calls) == 1
+    variables = _sent_variables(responses.calls[0])
+    assert variables['withTags'] is True
+    assert variables['withHistory'] is True
+    assert variables['branch'] == 'refs/heads/develop'
+    assert responses.calls[0].request.headers['Authorization'] == 'bearer fake-token'
+
+    assert tags == [('v1.1.0', 'sha3'), ('v1.0.0+1', 'sha2'), ('v1.0.0', 'sha1')]
+    assert [commit['sha'] for commit in commits] == ['sha3', 'sha2', 'sha1']
+    assert commits[0]['commit']['message'] == 'third [#3]'
+
+
+@responses.activate
+def test_get_all_tags_pages_with_cursor_until_last_page():
+    _reset_github_listings()
+    _github = GitHubGraphQL(config_override=_mock_config(), verify_repo=False)
+
+    responses.add(responses.POST, graphql_url, status=200, json={'data': {'repository': {
+        'refs': _tags_page([{'name': 'v1.0.1', 'target': {'oid': 'sha2'}}], has_next=True, cursor='page1'),
+        'ref': _history_page([{'oid': 'sha2', 'message': 'second'}], has_next=True)
+    }}})
+    responses.add(responses.POST, graphql_url, status=200, json={'data': {'repository': {
+        'refs': _tags_page([{'name': 'v1.0.0', 'target': {'oid': 'sha1'}}], has_next=True, cursor='page2')
+    }}})
+    responses.add(responses.POST, graphql_url, status=200, json={'data': {'repository': {
+        'refs': _tags_page([{'name': 'v0.9.0', 'target': {'oid': 'sha0'}}], cursor='page3')
+    }}})
+
+    _github._verify_repo_existence(GitHub.url, GitHub.org, GitHub.repo)
+    tags = _github.get_all_tags_and_shas_from_github(need_tag='v1.0.0')
+
+    assert len(responses.calls) == 3
+    variables = _sent_variables(responses.calls[1])
+    assert variables['tagsAfter'] == 'page1'
+    assert variables['withHistory'] is False
+    assert _sent_variables(responses.calls[2])['tagsAfter'] == 'page2'
+    assert tags == [('v1.0.1', 'sha2'), ('v1.0.0', 'sha1'), ('v0.9.0', 'sha0')]
+    assert GitHub.found_all_tags is True
+
+
+# the rest tags listing returns the highest version first, graphql can only order by name or commit date
+version_ordered_tags = [('v1.10.0+1', 'sha4'), ('v1.10.0', 'sha4'), ('v1.9.0+2', 'sha3'), ('v1.9.0+1', 'sha2'),
+                        ('v1.9.0', 'sha1')]
+name_ordered_tags = sorted(version_ordered_tags, reverse=True)
+
+
+def _last_and_previous_tags(_github):
+    return _github.get_git_last_tag(), _github.get_git_previous_tag()
+
+
+@responses.activate
+@pytest.mark.parametrize('artifact_category', ['snapshot', 'release'])
+def test_graphql_picks_the_same_last_and_previous_tag_as_rest(artifact_category):
+    _b = _mock_config()
+    _b.artifact_category = artifact_category
+
+    _reset_github_listings()
+    responses.add(responses.GET, 'https://fakegithub.com/api/v3/repos/Org-GitHub/Repo-GitHub/tags?per_page=100&page=1',
+                  status=200, json=[{'name': name, 'commit': {'sha': sha}} for name, sha in version_ordered_tags])
+    rest_tags = _last_and_previous_tags(GitHub(config_override=_b, verify_repo=False))
+
+    _reset_github_listings()
+    responses.add(responses.POST, graphql_url, status=200, json={'data': {'repository': {
+        'refs': _tags_page([{'name': name, 'target': {'oid': sha}} for name, sha in name_ordered_tags[:3]],
+                           has_next=True),
+        'ref': _history_page([{'oid': 'sha4', 'message': 'fourth'}])
+    }}})
+    responses.add(responses.POST, graphql_url, status=200, json={'data': {'repository': {
+        'refs': _tags_page([{'name': name, 'target': {'oid': sha}} for name, sha in name_ordered_tags[3:]])
+    }}})
+    graphql_tags = _last_and_previous_tags(GitHubGraphQL(config_override=_b, verify_repo=False))
+
+    assert graphql_tags == rest_tags
+    assert rest_tags == (('v1.10.0+1', 'v1.9.0+2') if artifact_category == 'snapshot' else ('v1.10.0', 'v1.9.0'))
+    assert GitHub.all_tags_and_shas == version_ordered_tags
+
+
+@responses.activate
+def test_missing_branch_has_no_history():
+    _reset_github_listings()
+    _github = GitHubGraphQL(config_override=_mock_config(), verify_repo=False)
+
+    responses.add(responses.POST, graphql_url, status=200, json={'data': {'repository': {
+        'refs': _tags_page([]),
+        'ref': None
+    }}})
+
+    _github._verify_repo_existence(GitHub.url, GitHub.org, GitHub.repo)
+
+    assert _github.get_all_commits_from_github() == []
+    assert len(responses.calls) == 1
+
+
+@responses.activate
+def test_graphql_errors_exit():
+    _reset_github_listings()
+    _github = GitHubGraphQL(config_override=_mock_config(), verify_repo=False)
+
+    responses.add(responses.POST, graphql_url, status=200, json={'data': {'repository': None}, 'errors': [
+        {'type': 'NOT_FOUND', 'message': "Could not resolve to a Repository with the name 'Repo-GitHub'."}]})
+
+    with patch('flow.utils.commons.print_msg') as mock_printmsg_fn:
+        with pytest.raises(SystemExit):
+            _github._verify_repo_existence(GitHub.url, GitHub.org, GitHub.repo)
+
+        assert mock_printmsg_fn.call_args[0][3] == 'ERROR'
+
+
+@responses.activate
+def test_no_token_falls_back_to_rest():
+    _reset_github_listings(token=None)
+    _github = GitHubGraphQL(config_override=_mock_config(), verify_repo=False)
+
+    responses.add(responses.GET, 'https://fakegithub.com/api/v3/repos/Org-GitHub/Repo-GitHub', status=200,
+                  json={})
+    responses.add(responses.GET, 'https://fakegithub.com/api/v3/repos/Org-GitHub/Repo-GitHub/tags?per_page=100&page=1',
+                  status=200, json=[{'name': 'v1.0.0', 'commit': {'sha': 'sha1'}}])
+
+    _github._verify_repo_existence(GitHub.url, GitHub.org, GitHub.repo)
+    tags = _github.get_all_tags_and_shas_from_github()
+
+    assert tags == [('v1.0.0', 'sha1')]
+    assert all(call.request.method == 'GET' for call in responses.calls)
@@ -0,0 +1,133 @@
+import subprocess
+from unittest.mock import MagicMock
+
+import pytest
+from flow.coderepo.github.github import GitHub
+from flow.coderepo.localgit.localgit import LocalGit
+
+from flow.buildconfig import BuildConfig
+
+
+def _git(repo_dir, *args):
+    return subprocess.check_output(['git', '-C', repo_dir, '-c', 'user.name=flow', '-c', 'user.email=flow@fake.com']
+                                   + list(args)).decode('utf-8').strip()
+
+
+@pytest.fixture
+def local_repo(tmpdir):
+    # a clone of a bare origin at .../Org-GitHub/Repo-GitHub.git, so that tags can be fetched without a network
+    origin_dir = str(tmpdir.join('Org-GitHub', 'Repo-GitHub.git'))
+    repo_dir = str(tmpdir.mkdir('checkout'))
+    subprocess.check_call(['git', 'init', '-q', '--bare', origin_dir])
+    _git(repo_dir, 'init', '-q', '-b', 'develop')
+    _git(repo_dir, 'remote', 'add', 'origin', origin_dir)
+
+    shas = {}
+    for version in ['v1.0.0', 'v1.0.0+1', 'v1.0.0+2', 'v1.1.0']:
+        _git(repo_dir, 'commit', '-q', '--allow-empty', '-m', 'commit for ' + version + '\n\nlonger description')
+        shas[version] = _git(repo_dir, 'rev-parse', 'HEAD')
+        if version == 'v1.1.0':
+            _git(repo_dir, 'tag', '-a', version, '-m', 'annotated release')
+        else:
+            _git(repo_dir, 'tag', version)
+
+    _git(repo_dir, 'commit', '-q', '--allow-empty', '-m', 'untagged work')
+    shas['HEAD'] = _git(repo_dir, 'rev-parse', 'HEAD')
+    _git(repo_dir, 'push', '-q', '--tags', 'origin', 'develop')
+
+    return repo_dir, shas
+
+
+def test_is_clone_of(local_repo):
+    repo_dir, _ = local_repo
+    _local_git = LocalGit(repo_dir)
+
+    assert _local_git.is_clone_of('Org-GitHub', 'Repo-GitHub') is True
+    assert _local_git.is_clone_of('Org-GitHub', 'Other-Repo') is False
+
+
+def test_is_clone_of_outside_checkout(tmpdir):
+    _local_git = LocalGit(str(tmpdir))
+
+    assert _local_git.is_clone_of('Org-GitHub', 'Repo-GitHub') is False
+
+
+def test_get_all_tags_and_shas_newest_first_and_peeled(local_repo):
+    repo_dir, shas = local_repo
+    _local_git = LocalGit(repo_dir)
+
+    tags = _local_git.get_all_tags_and_shas()
+
+    assert tags == [('v1.1.0', shas['v1.1.0']),
+                    ('v1.0.0+2', shas['v1.0.0+2']),
+                    ('v1.0.0+1', shas['v1.0.0+1']),
+                    ('v1.0.0', shas['v1.0.0'])]
+
+
+def test_fetch_tags_drops_local_only_tags(local_repo):
+    repo_dir, shas = local_repo
+    _git(repo_dir, 'tag', 'v9.9.9')
+    _local_git = LocalGit(repo_dir)
+
+    assert _local_git.fetch_tags() is True
+    assert ('v9.9.9', shas['HEAD']) not in _local_git.get_all_tags_and_shas()
+
+
+def test_fetch_tags_unreachable_origin(local_repo):
+    repo_dir, _ = local_repo
+    _git(repo_dir, 'remote', 'set-url', 'origin', repo_dir + '/missing/Org-GitHub/Repo-GitHub.git')
+
+    assert LocalGit(repo_dir).fetch_tags() is False
+
+
+def test_get_commits_range(local_repo):
+    repo_dir, shas = local_repo
+    _local_git = LocalGit(repo_dir)
+
+    commits = _local_git.get_commits(shas['v1.1.0'], shas['v1.0.0+1'])
+
+    assert commits == [{'sha': shas['v1.1.0'], 'commit': {'message': 'commit for v1.1.0\n\nlonger description'}},
+                       {'sha': shas['v1.0.0+2'], 'commit': {'message': 'commit for v1.0.0+2\n\nlonger description'}}]
+    assert _local_git.resolve_branch('develop') == shas['HEAD']
+    assert _local_git.resolve_branch('feature/unknown') is None
+    assert _local_git.is_ancestor(shas['v1.0.0'], shas['HEAD']) is True
+    assert _local_git.is_ancestor(shas['HEAD'], shas['v1.0.0']) is False
+
+
+def _mock_github(repo_dir, monkeypatch):
+    monkeypatch.chdir(repo_dir)
+    monkeypatch.setenv('GITHUB_USE_LOCAL_GIT', 'true')
+    monkeypatch.setattr(GitHub, 'org', 'Org-GitHub')
+    monkeypatch.setattr(GitHub, 'repo', 'Repo-GitHub')
+    monkeypatch.setattr(GitHub, 'all_tags_and_shas', [])
+    monkeypatch.setattr(GitHub, 'found_all_tags', False)
+    monkeypatch.setattr(GitHub, 'local_git', None)
+    monkeypatch.setattr(GitHub, 'local_git_checked', False)
+
+    _b = MagicMock(BuildConfig)
+    _b.build_env_info = {'associatedBranchName': 'develop'}
+    _b.version_strategy = 'tracker'
+
+    return GitHub(config_override=_b, verify_repo=False)
+
+
+def test_github_reads_history_from_local_checkout(local_repo, monkeypatch):
+    repo_dir, shas = local_repo
+    _github = _mock_github(repo_dir, monkeypatch)
+    # any call to the github api would fail, there is no url configured
+    _github._get_github_page = MagicMock(side_effect=AssertionError('github api should not be called'))
+
+    assert _github.get_highest_semver_tag() == [1, 1, 0, 0]
+
+    commits = _github.get_all_git_commit_history_between_provided_tags([1, 0, 0, 2])
+
+    assert commits == [shas['HEAD'][0:7] + ' untagged work',
+                       shas['v1.1.0'][0:7] + ' commit for v1.1.0\n\nlonger description']
+
+
+def test_github_falls_back_to_api_when_fetch_fails(local_repo, monkeypatch):
+    repo_dir, _ = local_repo
+    _git(repo_dir, 'remote', 'set-url', 'origin', repo_dir + '/missing/Org-GitHub/Repo-GitHub.git')
+    _github = _mock_github(repo_dir, monkeypatch)
+
+    assert _github._get_local_git() is None
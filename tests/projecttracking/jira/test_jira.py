@@ -293,7 +293,7 @@ def test_no_initialize_object(monkeypatch):
     parser.add_section('jira')
     parser.set('jira', 'url', 'http://happy.happy.joy.joy')
     _b.settings = parser
-    with patch('requests.get') as mock_request:
+    with patch('flow.utils.transport.get') as mock_request:
         basic_auth = base64.b64encode("{0}:{1}".format('flow_tester@homedepot.com', 'fake_token').encode('ascii')).decode('ascii')
         headers = {'Content-type': 'application/json', 'Accept': 'application/json', 'Authorization': 'Basic {0}'.format(basic_auth)}
         timeout = 30
@@ -321,7 +321,7 @@ def test_get_details_for_all_stories(monkeypatch):
     parser.add_section('jira')
     parser.set('jira', 'url', 'http://happy.happy.joy.joy')
     _b.settings = parser
-    with patch('requests.get') as mock_request:
+    with patch('flow.utils.transport.get') as mock_request:
         basic_auth = base64.b64encode("{0}:{1}".format('flow_tester@homedepot.com', 'fake_token').encode('ascii')).decode('ascii')
         headers = {'Content-type': 'application/json', 'Accept': 'application/json', 'Authorization': 'Basic {0}'.format(basic_auth)}
         timeout = 30
@@ -357,7 +357,7 @@ def test_get_details_for_all_stories_for_multiple_projects(monkeypatch):
     parser.add_section('jira')
     parser.set('jira', 'url', 'http://happy.happy.joy.joy')
     _b.settings = parser
-    with patch('requests.get') as mock_request:
+    with patch('flow.utils.transport.get') as mock_request:
         basic_auth = base64.b64encode("{0}:{1}".format('flow_tester@homedepot.com', 'fake_token').encode('ascii')).decode('ascii')
         headers = {'Content-type': 'application/json', 'Accept': 'application/json', 'Authorization': 'Basic {0}'.format(basic_auth)}
         timeout = 30
@@ -395,7 +395,7 @@ def test_tag_stories_in_commit(monkeypatch):
     parser.add_section('jira')
     parser.set('jira', 'url', 'http://happy.happy.joy.joy')
     _b.settings = parser
-    with patch('requests.get') as mock_get_request, patch('requests.post') as mock_post_request, patch('requests.put') as mock_put_request:
+    with patch('flow.utils.transport.get') as mock_get_request, patch('flow.utils.transport.post') as mock_post_request, patch('flow.utils.transport.put') as mock_put_request:
         basic_auth = base64.b64encode("{0}:{1}".format('flow_tester@homedepot.com', 'fake_token').encode('ascii')).decode('ascii')
         headers = {'Content-type': 'application/json', 'Accept': 'application/json', 'Authorization': 'Basic {0}'.format(basic_auth)}
         timeout = 30
@@ -461,7 +461,7 @@ def test_tag_stories_in_commit_with_existing_version(monkeypatch):
     parser.add_section('jira')
     parser.set('jira', 'url', 'http://happy.happy.joy.joy')
     _b.settings = parser
-    with patch('requests.get') as mock_get_request, patch('requests.post') as mock_post_request, patch('requests.put') as mock_put_request:
+    with patch('flow.utils.transport.get') as mock_get_request, patch('flow.utils.transport.post') as mock_post_request, patch('flow.utils.transport.put') as mock_put_request:
         basic_auth = base64.b64encode("{0}:{1}".format('flow_tester@homedepot.com', 'fake_token').encode('ascii')).decode('ascii')
         headers = {'Content-type': 'application/json', 'Accept': 'application/json', 'Authorization': 'Basic {0}'.format(basic_auth)}
         timeout = 30
@@ -523,7 +523,7 @@ def test_tag_stories_in_commit_for_multiple_projects(monkeypatch):
     parser.add_section('jira')
     parser.set('jira', 'url', 'http://happy.happy.joy.joy')
     _b.settings = parser
-    with patch('requests.get') as mock_get_request, patch('requests.post') as mock_post_request, patch('requests.put') as mock_put_request:
+    with patch('flow.utils.transport.get') as mock_get_request, patch('flow.utils.transport.post') as mock_post_request, patch('flow.utils.transport.put') as mock_put_request:
         basic_auth = base64.b64encode("{0}:{1}".format('flow_tester@homedepot.com', 'fake_token').encode('ascii')).decode('ascii')
         headers = {'Content-type': 'application/json', 'Accept': 'application/json', 'Authorization': 'Basic {0}'.format(basic_auth)}
         timeout = 30
@@ -611,7 +611,7 @@ def test_tag_stories_in_commit_for_multiple_projects_when_version_exists_on_one_
     parser.add_section('jira')
     parser.set('jira', 'url', 'http://happy.happy.joy.joy')
     _b.settings = parser
-    with patch('requests.get') as mock_get_request, patch('requests.post') as mock_post_request, patch('requests.put') as mock_put_request:
+    with patch('flow.utils.transport.get') as mock_get_request, patch('flow.utils.transport.post') as mock_post_request, patch('flow.utils.transport.put') as mock_put_request:
         basic_auth = base64.b64encode("{0}:{1}".format('flow_tester@homedepot.com', 'fake_token').encode('ascii')).decode('ascii')
         headers = {'Content-type': 'application/json', 'Accept': 'application/json', 'Authorization': 'Basic {0}'.format(basic_auth)}
         timeout = 30
@@ -693,7 +693,7 @@ def test_story_bump_bug(monkeypatch):
     parser.add_section('jira')
     parser.set('jira', 'url', 'http://happy.happy.joy.joy')
     _b.settings = parser
-    with patch('requests.get') as mock_request:
+    with patch('flow.utils.transport.get') as mock_request:
         mock_request.side_effect = mock_get_multiple_project_ids_response
         _jira = Jira(config_override=_b)
             
@@ -718,7 +718,7 @@ def test_story_bump_minor(monkeypatch):
     parser.add_section('jira')
     parser.set('jira', 'url', 'http://happy.happy.joy.joy')
     _b.settings = parser
-    with patch('requests.get') as mock_request:
+    with patch('flow.utils.transport.get') as mock_request:
         mock_request.side_effect = mock_get_multiple_project_ids_response
         _jira = Jira(config_override=_b)
 
@@ -743,7 +743,7 @@ def test_story_bump_major(monkeypatch):
     parser.add_section('jira')
     parser.set('jira', 'url', 'http://happy.happy.joy.joy')
     _b.settings = parser
-    with patch('requests.get') as mock_request:
+    with patch('flow.utils.transport.get') as mock_request:
         mock_request.side_effect = mock_get_multiple_project_ids_response
         _jira = Jira(config_override=_b)
 
@@ -893,7 +893,7 @@ def test_extract_story_id_with_empty_list(monkeypatch):
     parser.set('jira', 'url', 'http://happy.happy.joy.joy')
     _b.settings = parser
 
-    with patch('requests.get') as mock_request:
+    with patch('flow.utils.transport.get') as mock_request:
         mock_request.side_effect = mock_get_multiple_project_ids_response
         _jira = Jira(config_override=_b)
         story_list = _jira.extract_story_id_from_commit_messages([])
@@ -918,7 +918,7 @@ def test_extract_story_id_with_two_stories(monkeypatch):
     parser.set('jira', 'url', 'http://happy.happy.joy.joy')
     _b.settings = parser
 
-    with patch('requests.get') as mock_request:
+    with patch('flow.utils.transport.get') as mock_request:
         mock_request.side_effect = mock_get_multiple_project_ids_response
         _jira = Jira(config_override=_b)
         story_list = _jira.extract_story_id_from_commit_messages(commit_example)
@@ -943,7 +943,7 @@ def test_extract_story_id_with_nested_brackets(monkeypatch):
     parser.set('jira', 'url', 'http://happy.happy.joy.joy')
     _b.settings = parser
 
-    with patch('requests.get') as mock_request:
+    with patch('flow.utils.transport.get') as mock_request:
         mock_request.side_effect = mock_get_multiple_project_ids_response
         _jira = Jira(config_override=_b)
         story_list = _jira.extract_story_id_from_commit_messages(commit_example_nested_brackets)
@@ -970,7 +970,7 @@ def test_extract_story_id_with_multiple_per_brackets(monkeypatch):
     parser.set('jira', 'url', 'http://happy.happy.joy.joy')
     _b.settings = parser
 
-    with patch('requests.get') as mock_request:
+    with patch('flow.utils.transport.get') as mock_request:
         mock_request.side_effect = mock_get_multiple_project_ids_response
         _jira = Jira(config_override=_b)
         story_list = _jira.extract_story_id_from_commit_messages(commit_example_multiple_per_brackets)
@@ -998,7 +998,7 @@ def test_extract_story_id_with_dedup(monkeypatch):
     parser.set('jira', 'url', 'http://happy.happy.joy.joy')
     _b.settings = parser
 
-    with patch('requests.get') as mock_request:
+    with patch('flow.utils.transport.get') as mock_request:
         mock_request.side_effect = mock_get_multiple_project_ids_response
         _jira = Jira(config_override=_b)
         story_list = _jira.extract_story_id_from_commit_messages(commit_example_dedup)
@@ -1017,7 +1017,7 @@ def test_flatten_story_details_with_None_story_details(monkeypatch):
     parser.set('jira', 'url', 'http://happy.happy.joy.joy')
     _b.settings = parser
 
-    with patch('requests.get') as mock_request:
+    with patch('flow.utils.transport.get') as mock_request:
         mock_request.side_effect = mock_get_multiple_project_ids_response
         _jira = Jira(config_override=_b)
 
@@ -1036,7 +1036,7 @@ def test_flatten_story_details_with_empty_story_details(monkeypatch):
     parser.set('jira', 'url', 'http://happy.happy.joy.joy')
     _b.settings = parser
 
-    with patch('requests.get') as mock_request:
+    with patch('flow.utils.transport.get') as mock_request:
         mock_request.side_effect = mock_get_multiple_project_ids_response
         _jira = Jira(config_override=_b)
 
@@ -1074,7 +1074,7 @@ def test_flatten_story_details_with_story_details(monkeypatch):
         }
     ]
 
-    with patch('requests.get') as mock_request:
+    with patch('flow.utils.transport.get') as mock_request:
         mock_request.side_effect = mock_get_multiple_project_ids_response
         _jira = Jira(config_override=_b)
 
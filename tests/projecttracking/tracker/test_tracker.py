@@ -177,7 +177,7 @@ def test_get_details_for_all_stories(monkeypatch):
     parser.add_section('tracker')
     parser.set('tracker', 'url', 'http://happy.happy.joy.joy')
     _b.settings = parser
-    with patch('requests.get') as mock_request:
+    with patch('flow.utils.transport.get') as mock_request:
         headers = {'Content-type': 'application/json', 'Accept': 'application/json', 'X-TrackerToken': 'fake_token'}
         timeout = 30
         current_test_directory = os.path.dirname(os.path.realpath(__file__))
@@ -205,7 +205,7 @@ def test_get_details_for_all_stories_for_multiple_projects(monkeypatch):
     parser.add_section('tracker')
     parser.set('tracker', 'url', 'http://happy.happy.joy.joy')
     _b.settings = parser
-    with patch('requests.get') as mock_request:
+    with patch('flow.utils.transport.get') as mock_request:
         headers = {'Content-type': 'application/json', 'Accept': 'application/json', 'X-TrackerToken': 'fake_token'}
         timeout = 30
         current_test_directory = os.path.dirname(os.path.realpath(__file__))
@@ -240,7 +240,7 @@ def test_tag_stories_in_commit(monkeypatch):
     parser.add_section('tracker')
     parser.set('tracker', 'url', 'http://happy.happy.joy.joy')
     _b.settings = parser
-    with patch('requests.post') as mock_request:
+    with patch('flow.utils.transport.post') as mock_request:
         headers = {'Content-type': 'application/json', 'Accept': 'application/json', 'X-TrackerToken': 'fake_token'}
         timeout = 30
         label = {
@@ -271,7 +271,7 @@ def test_tag_stories_in_commit_for_multiple_projects(monkeypatch):
     parser.add_section('tracker')
     parser.set('tracker', 'url', 'http://happy.happy.joy.joy')
     _b.settings = parser
-    with patch('requests.post') as mock_request:
+    with patch('flow.utils.transport.post') as mock_request:
         headers = {'Content-type': 'application/json', 'Accept': 'application/json', 'X-TrackerToken': 'fake_token'}
         timeout = 30
         label = {
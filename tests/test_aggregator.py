@@ -1162,3 +1162,58 @@ def test_aggregator_github_outputs_getversion():
 #             flow.aggregator.call_github_getversion(_github, file_path='somefilepath', open_func=_open_mock)
 # 
 #     print('Mock Call Stack\n{}'.format(str(_github.method_calls)))
+
+
+def test_create_github_uses_graphql_when_configured():
+    _b = MagicMock(BuildConfig)
+    _b.json_config = {'github': {'org': 'Org-GitHub', 'repo': 'Repo-GitHub', 'apiType': 'graphql'}}
+
+    with patch('flow.aggregator.GitHubGraphQL') as mock_graphql, patch('flow.aggregator.GitHub') as mock_rest:
+        flow.aggregator.create_github(_b)
+
+        mock_graphql.assert_called_once_with()
+        mock_rest.assert_not_called()
+
+    _b.json_config = {'github': {'org': 'Org-GitHub', 'repo': 'Repo-GitHub'}}
+
+    with patch('flow.aggregator.GitHubGraphQL') as mock_graphql, patch('flow.aggregator.GitHub') as mock_rest:
+        flow.aggregator.create_github(_b)
+
+        mock_rest.assert_called_once_with()
+        mock_graphql.assert_not_called()
+
+
+def test_create_cloudfoundry_uses_api_driver_when_configured():
+    _b = MagicMock(BuildConfig)
+    _b.build_env_info = {'cf': {'apiEndpoint': 'api.run-np.fake.com', 'driver': 'api'}}
+
+    with patch('flow.aggregator.CloudFoundryV3') as mock_v3, patch('flow.aggregator.CloudFoundry') as mock_cli:
+        flow.aggregator.create_cloudfoundry(_b)
+
+        mock_v3.assert_called_once_with()
+        mock_cli.assert_not_called()
+
+    _b.build_env_info = {'cf': {'apiEndpoint': 'api.run-np.fake.com'}}
+
+    with patch('flow.aggregator.CloudFoundryV3') as mock_v3, patch('flow.aggregator.CloudFoundry') as mock_cli:
+        flow.aggregator.create_cloudfoundry(_b)
+
+        mock_cli.assert_called_once_with()
+        mock_v3.assert_not_called()
+
+
+def test_create_cloudfoundry_fans_out_to_listed_targets():
+    _b = MagicMock(BuildConfig)
+    _b.build_env_info = {'cf': {'driver': 'api', 'targets': [{'apiEndpoint': 'api.east.fake.com'},
+                                                             {'apiEndpoint': 'api.west.fake.com'}]}}
+
+    with patch('flow.aggregator.CloudFoundryFanOut') as mock_fan_out, \
+            patch('flow.aggregator.CloudFoundryV3') as mock_v3:
+        flow.aggregator.create_cloudfoundry(_b)
+
+        create_driver = mock_fan_out.call_args[1]['create_driver']
+        # the target's own cf section is in place when a target process creates its driver
+        _b.build_env_info = {'cf': {'driver': 'api', 'apiEndpoint': 'api.east.fake.com'}}
+        create_driver()
+
+        mock_v3.assert_called_once_with()
@@ -1,6 +1,14 @@
+import configparser
+import io
+import os
+import sys
+import tarfile
+import time
 from unittest.mock import mock_open
 from unittest.mock import patch
 
+import pytest
+
 import flow.utils.commons as commons
 
 def test_write_to_file():
@@ -11,3 +19,121 @@ def test_write_to_file():
     open_mock.assert_called_once_with("somefilepath", "a")
     file_mock = open_mock()
     file_mock.write.assert_called_once_with("test_write_to_file")
+
+
+def test_get_setting_environment_wins_over_settings(monkeypatch):
+    settings = configparser.ConfigParser()
+    settings.read_string('[github]\ncache_dir = ~/.flow/cache\npage_concurrency = 4\nblank =\n')
+
+    assert commons.get_setting(settings, 'github', 'cache_dir', 'FLOW_TEST_CACHE_DIR') == '~/.flow/cache'
+    assert commons.get_setting(settings, 'github', 'blank', 'FLOW_TEST_BLANK') is None
+    assert commons.get_setting(None, 'github', 'cache_dir', 'FLOW_TEST_CACHE_DIR') is None
+
+    monkeypatch.setenv('FLOW_TEST_CACHE_DIR', ' /tmp/cache ')
+    assert commons.get_setting(settings, 'github', 'cache_dir', 'FLOW_TEST_CACHE_DIR') == '/tmp/cache'
+
+
+def test_get_int_setting_falls_back_to_default(monkeypatch):
+    settings = configparser.ConfigParser()
+    settings.read_string('[github]\npage_concurrency = 4\n')
+
+    assert commons.get_int_setting(settings, 'github', 'page_concurrency', 'FLOW_TEST_PAGES', 1) == 4
+    assert commons.get_int_setting(settings, 'github', 'missing', 'FLOW_TEST_MISSING', 7) == 7
+
+    monkeypatch.setenv('FLOW_TEST_PAGES', 'four')
+    with patch('flow.utils.commons.print_msg') as mock_printmsg_fn:
+        assert commons.get_int_setting(settings, 'github', 'page_concurrency', 'FLOW_TEST_PAGES', 1) == 1
+
+    mock_printmsg_fn.assert_called_once_with('commons', 'get_int_setting', 'Invalid page_concurrency four, using 1',
+                                             'WARN')
+
+
+def _tar_bytes(members, mode='w:gz'):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode=mode) as tar:
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    buffer.seek(0)
+    return buffer
+
+
+def test_extract_tar_stream_strips_parent_directory(tmpdir):
+    archive = _tar_bytes([('org-repo-abc123/manifest.yml', b'applications: []'),
+                          ('org-repo-abc123/src/app.py', b'print("hi")')])
+
+    count = commons.extract_tar_stream(archive, str(tmpdir), strip_components=1)
+
+    assert count == 2
+    assert tmpdir.join('manifest.yml').read() == 'applications: []'
+    assert tmpdir.join('src', 'app.py').read() == 'print("hi")'
+
+
+def test_extract_tar_stream_refuses_paths_outside_destination(tmpdir):
+    archive = _tar_bytes([('top/../../escaped.txt', b'nope')])
+
+    with pytest.raises(tarfile.TarError):
+        commons.extract_tar_stream(archive, str(tmpdir.join('dest')), strip_components=1)
+
+    assert not tmpdir.join('escaped.txt').exists()
+
+
+def _python(script):
+    return [sys.executable, '-c', script]
+
+
+def test_run_command_streams_lines_and_keeps_the_last_ones():
+    lines = []
+
+    with patch('flow.utils.commons.print_msg') as mock_printmsg_fn:
+        result = commons.run_command(_python('import sys, time\n'
+                                             'for i in range(5):\n'
+                                             '    print("line", i, flush=True)\n'
+                                             'sys.stdout.write("no newline")\n'
+                                             'sys.exit(3)'),
+                                     'Test', 'method', timeout=10, on_line=lines.append, output_lines=2)
+
+    assert result.returncode == 3
+    assert result.timed_out is None
+    assert result.output == ['line 4', 'no newline']
+    assert lines == ['line 0', 'line 1', 'line 2', 'line 3', 'line 4', 'no newline']
+    mock_printmsg_fn.assert_any_call('Test', 'method', 'line 0')
+
+
+def test_run_command_enforces_wall_clock_timeout_on_a_chatty_command():
+    started = time.monotonic()
+
+    with patch('flow.utils.commons.print_msg'):
+        result = commons.run_command(_python('import time\n'
+                                             'while True:\n'
+                                             '    print("still going", flush=True)\n'
+                                             '    time.sleep(0.05)'),
+                                     'Test', 'method', timeout=0.5, inactivity_timeout=5)
+
+    assert result.timed_out == 'timeout'
+    assert result.returncode != 0
+    assert time.monotonic() - started < 5
+
+
+def test_run_command_kills_silent_command_and_its_children():
+    with patch('flow.utils.commons.print_msg'):
+        result = commons.run_command(_python('import subprocess, sys\n'
+                                             'child = subprocess.Popen([sys.executable, "-c", '
+                                             '"import time; time.sleep(60)"])\n'
+                                             'print(child.pid, flush=True)\n'
+                                             'child.wait()'),
+                                     'Test', 'method', inactivity_timeout=0.5)
+
+    assert result.timed_out == 'inactivity'
+
+    child_pid = int(result.output[0])
+    # reaped by its parent's exit, or at least killed
+    for _ in range(50):
+        try:
+            os.kill(child_pid, 0)
+        except ProcessLookupError:
+            break
+        time.sleep(0.1)
+    else:
+        pytest.fail("child {} was left running".format(child_pid))
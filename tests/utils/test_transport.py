@@ -0,0 +1,65 @@
+import configparser
+
+import responses
+
+import flow.utils.transport as transport
+from flow.buildconfig import BuildConfig
+
+
+def _settings(timeout='60', pool_maxsize='10'):
+    parser = configparser.ConfigParser()
+    parser.add_section('project')
+    parser.set('project', 'http_timeout_default_seconds', timeout)
+    parser.set('project', 'http_pool_maxsize', pool_maxsize)
+    return parser
+
+
+def test_one_session_per_host(monkeypatch):
+    monkeypatch.setattr(BuildConfig, 'settings', _settings(pool_maxsize='4'))
+    transport.close_sessions()
+
+    first = transport.get_session('https://fakegithub.com/api/v3/repos/Org/Repo/tags')
+    second = transport.get_session('https://fakegithub.com/api/v3/repos/Org/Repo/commits')
+    other = transport.get_session('https://fakejira.com/rest/api/3/issue/ABC-1')
+
+    assert first is second
+    assert first is not other
+    assert first.get_adapter('https://fakegithub.com')._pool_maxsize == 4
+
+    transport.close_sessions()
+
+
+@responses.activate
+def test_default_timeout_comes_from_settings(monkeypatch):
+    monkeypatch.setattr(BuildConfig, 'settings', _settings(timeout='15'))
+    transport.close_sessions()
+
+    responses.add(responses.GET, 'https://fakegithub.com/thing', status=200)
+    responses.add(responses.POST, 'https://fakegithub.com/thing', status=201)
+
+    sent = []
+    session = transport.get_session('https://fakegithub.com/thing')
+    original_send = session.send
+
+    def recording_send(prepared, **kwargs):
+        sent.append(kwargs.get('timeout'))
+        return original_send(prepared, **kwargs)
+
+    monkeypatch.setattr(session, 'send', recording_send)
+
+    assert transport.get('https://fakegithub.com/thing').status_code == 200
+    assert transport.post('https://fakegithub.com/thing', '{}', timeout=5).status_code == 201
+    assert sent == [15, 5]
+
+    transport.close_sessions()
+
+
+def test_missing_settings_use_defaults(monkeypatch):
+    monkeypatch.setattr(BuildConfig, 'settings', None)
+    transport.close_sessions()
+
+    session = transport.get_session('https://fakegithub.com')
+
+    assert session.get_adapter('https://fakegithub.com')._pool_maxsize == transport.default_pool_maxsize
+
+    transport.close_sessions()
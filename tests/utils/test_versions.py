@@ -0,0 +1,8 @@
+from flow.utils.versions import parse_version
+
+
+def test_parse_version():
+    assert parse_version('v1.2.3') == (1, 2, 3, 0)
+    assert parse_version(' v1.2.3+45 ') == (1, 2, 3, 45)
+    assert parse_version('v1.2') is None
+    assert parse_version('release-1.2.3') is None
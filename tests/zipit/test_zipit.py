@@ -0,0 +1,74 @@
+import gzip
+import io
+import lzma
+import tarfile
+
+import pytest
+
+import flow.zipit.compression as compression
+from flow.buildconfig import BuildConfig
+from flow.zipit.compression import BlockCompressor
+from flow.zipit.zipit import ZipIt
+
+
+def test_compression_for_file_name():
+    assert compression.compression_for_file_name('app.tar.gz') == 'gz'
+    assert compression.compression_for_file_name('app.tgz') == 'gz'
+    assert compression.compression_for_file_name('app.tar.xz') == 'xz'
+    assert compression.compression_for_file_name('app.tar.zst') == 'zst'
+    assert compression.compression_for_file_name('app.tar') == 'none'
+
+
+@pytest.mark.parametrize('compression_type, decompress', [('gz', gzip.decompress), ('xz', lzma.decompress)])
+def test_block_compressor_output_is_one_readable_file(monkeypatch, compression_type, decompress):
+    monkeypatch.setattr(BlockCompressor, 'block_size', 1000)
+    content = bytes(range(256)) * 50
+
+    compressed = io.BytesIO()
+    with BlockCompressor(compressed, compression_type, 6, 3) as writer:
+        writer.write(content[:3000])
+        writer.write(content[3000:])
+
+    assert decompress(compressed.getvalue()) == content
+
+
+def test_block_compressor_empty_input_is_valid():
+    compressed = io.BytesIO()
+    BlockCompressor(compressed, 'gz', 6, 2).close()
+
+    assert gzip.decompress(compressed.getvalue()) == b''
+
+
+def _zip_it(monkeypatch, tmpdir, zip_name, compression_type=None, threads='2'):
+    monkeypatch.setattr(BuildConfig, 'settings', None)
+    monkeypatch.setenv('ZIPIT_COMPRESSION_THREADS', threads)
+    monkeypatch.chdir(tmpdir)
+    contents = tmpdir.mkdir('contents')
+    contents.join('app.txt').write_binary(b'app' * 1000)
+
+    ZipIt('none', zip_name, str(contents))._zip_it(zip_name, str(contents), compression_type)
+
+    return str(tmpdir.join(zip_name))
+
+
+@pytest.mark.parametrize('threads', ['1', '2'])
+def test_zip_it_compresses_by_file_name(monkeypatch, tmpdir, threads):
+    archive = _zip_it(monkeypatch, tmpdir, 'app.tar.gz', threads=threads)
+
+    with open(archive, 'rb') as compressed:
+        assert compressed.read(2) == b'\x1f\x8b'
+
+    with tarfile.open(archive) as tar:
+        assert tar.extractfile('app.tar.gz/app.txt').read() == b'app' * 1000
+
+
+def test_zip_it_explicit_compression_wins(monkeypatch, tmpdir):
+    archive = _zip_it(monkeypatch, tmpdir, 'app.tar', compression_type='xz')
+
+    with tarfile.open(archive, 'r:xz') as tar:
+        assert tar.extractfile('app.tar/app.txt').read() == b'app' * 1000
+
+
+def test_zip_it_unknown_compression_exits(monkeypatch, tmpdir):
+    with pytest.raises(SystemExit):
+        _zip_it(monkeypatch, tmpdir, 'app.tar', compression_type='rar')